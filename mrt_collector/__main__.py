@@ -1,20 +1,44 @@
 import argparse
+from datetime import datetime
 from multiprocessing import cpu_count
+from pathlib import Path
 
 from .analyzers import atomic_export_analyzer
-from .collection_path_handler import handle_path
-from .datetime_handler import handle_datetime
+from .batch_collector import BatchMRTCollector
+from .collection_path_handler import handle_path, parse_custom_path
+from .datetime_handler import handle_datetime, handle_datetime_range
 from .mrt_collector import MRTCollector
+from .parse_filter import ParseFilter
 
 
 def main():
     parser = argparse.ArgumentParser(prog="MRT Collector")
 
-    parser.add_argument(
+    times = parser.add_mutually_exclusive_group(required=True)
+    times.add_argument(
         "-dt",
         "--datetime",
         help="Datetime in mm/dd/yyyy/hh format (24-hour)",
-        required=True
+    )
+
+    # for collecting many times in one run, i.e. a week of dumps
+    times.add_argument(
+        "--from",
+        dest="from_datetime",
+        help="First datetime of a batch in mm/dd/yyyy/hh format (24-hour)",
+    )
+
+    parser.add_argument(
+        "--to",
+        dest="to_datetime",
+        help="Last datetime of a batch in mm/dd/yyyy/hh format (24-hour)",
+    )
+
+    parser.add_argument(
+        "--every",
+        type=int,
+        default=8,
+        help="Hours between the datetimes of a batch (a multiple of 8)",
     )
 
     # for use with running with limited files, mostly for debugging
@@ -38,10 +62,63 @@ def main():
         help="Set a custom path to place data"
     )
 
+    parser.add_argument(
+        "-st",
+        "--stream",
+        action="store_true",
+        help="Pipes downloads straight into the parser without saving raw files",
+    )
+
+    parser.add_argument(
+        "-kr",
+        "--keep_raw",
+        action="store_true",
+        help="When streaming, also saves raw files",
+    )
+
+    parser.add_argument(
+        "-sl",
+        "--slim",
+        action="store_true",
+        help="Only keeps the rows and columns of the atomic aggregate analysis"
+        " when parsing (use a separate --path from full runs)",
+    )
+
+    parser.add_argument(
+        "-c",
+        "--compress",
+        choices=("gzip", "zstd"),
+        default="",
+        help="Compresses parsed files (zstd needs the zstandard package)",
+    )
+
+    parser.add_argument(
+        "-pq",
+        "--parquet",
+        action="store_true",
+        help="Also converts parsed files to Parquet (needs the pyarrow package)",
+    )
+
     args = parser.parse_args()
 
     limit_files_to = 0 if args.limit_files is None else args.limit_files
 
+    if args.to_datetime and not args.from_datetime:
+        parser.error("--to requires --from")
+    if args.from_datetime:
+        if not args.to_datetime:
+            parser.error("--from requires --to")
+        if args.every <= 0 or args.every % 8 != 0:
+            parser.error("--every must be a positive multiple of 8")
+        try:
+            dl_times = handle_datetime_range(
+                args.from_datetime, args.to_datetime, args.every
+            )
+        except (ValueError, argparse.ArgumentTypeError) as e:
+            parser.error(str(e))
+        run_batch(args, dl_times, limit_files_to)
+        return
+
     dl_time = handle_datetime(args.datetime)
 
     output_path = handle_path(
@@ -60,11 +137,53 @@ def main():
         dl_time=dl_time,
         cpus=1 if args.single_process else cpu_count(),
         base_dir=output_path,
+        stream_parse=args.stream,
+        keep_raw=args.keep_raw,
+        parse_filter=parse_filter(args),
+        parsed_compression=args.compress,
+        parquet=args.parquet,
     )
 
     mrt_files = collector.run(limit_files_to=limit_files_to)
-    atomic_analyzer = atomic_export_analyzer.AtomicExportAnalyzer(output_path)
+    atomic_analyzer = atomic_export_analyzer.AtomicExportAnalyzer(
+        output_path, cpus=collector.cpus, vectorized=args.parquet
+    )
     atomic_analyzer.run(mrt_files)
 
+
+def parse_filter(args: argparse.Namespace) -> ParseFilter | None:
+    """Returns the filter to parse with, if any"""
+
+    if args.slim:
+        return atomic_export_analyzer.AtomicExportAnalyzer.PARSE_FILTER
+    return None
+
+
+def run_batch(
+    args: argparse.Namespace, dl_times: tuple[datetime, ...], limit_files_to: int
+) -> None:
+    """Collects every time in dl_times (from --from to --to) in a single run"""
+
+    collector = BatchMRTCollector(
+        dl_times=dl_times,
+        root=parse_custom_path(args.path) if args.path else Path.home(),
+        cpus=1 if args.single_process else cpu_count(),
+        stream_parse=args.stream,
+        keep_raw=args.keep_raw,
+        parse_filter=parse_filter(args),
+        parsed_compression=args.compress,
+        parquet=args.parquet,
+    )
+
+    mrt_files_by_time = collector.run(limit_files_to=limit_files_to)
+    for dl_time, mrt_files in mrt_files_by_time.items():
+        atomic_analyzer = atomic_export_analyzer.AtomicExportAnalyzer(
+            collector.collectors[dl_time].base_dir,
+            cpus=collector.cpus,
+            vectorized=args.parquet,
+        )
+        atomic_analyzer.run(mrt_files)
+
+
 if __name__ == "__main__":
     main()
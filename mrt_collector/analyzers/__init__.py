@@ -1,7 +1,13 @@
+from .analysis_engine import AnalysisEngine
+from .atomic_export_analyzer import AtomicExportAnalyzer
 from .bgp_export_analyzer import BGPExportAnalyzer
 from .mh_export_analyzer import MHExportAnalyzer
+from .psv_analyzer import PSVAnalyzer
 
 __all__ = [
+    "AnalysisEngine",
+    "AtomicExportAnalyzer",
     "BGPExportAnalyzer",
     "MHExportAnalyzer",
+    "PSVAnalyzer",
 ]
@@ -0,0 +1,89 @@
+from collections.abc import Callable, Iterable
+from itertools import islice
+from typing import Any
+
+from tqdm import tqdm
+
+from mrt_collector.mrt_collector import sort_mrt_files_by_parsed_file_size
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.psv_tokenizer import fields_getter, iter_psv_fields
+
+from .psv_analyzer import PSVAnalyzer
+
+
+class AnalysisEngine:
+    """Runs several analyzers in a single pass over parsed MRTs
+
+    Each PSV is read once, for the columns any of the analyzers need, and
+    every batch of rows is handed to every analyzer (projected down to
+    just its COLUMNS). So running three analyses costs about one scan
+    rather than three.
+    """
+
+    def __init__(
+        self,
+        analyzers: Iterable[PSVAnalyzer],
+        batch_size: int = 2**16,
+    ) -> None:
+        self.analyzers: tuple[PSVAnalyzer, ...] = tuple(analyzers)
+        self.batch_size: int = batch_size
+        # Every column needed by an analyzer, in the order first needed
+        self.columns: tuple[str, ...] = tuple(
+            dict.fromkeys(x for analyzer in self.analyzers for x in analyzer.COLUMNS)
+        )
+
+    def run(self, mrt_files: tuple[MRTFile, ...]) -> None:
+        """Feeds every analyzer the rows of mrt_files, then finishes them"""
+
+        self.read(mrt_files)
+        for analyzer in self.analyzers:
+            analyzer.finish()
+
+    def read(
+        self,
+        mrt_files: tuple[MRTFile, ...],
+        desc: str = "Analyzing parsed MRTs",
+    ) -> None:
+        """Starts every analyzer, then feeds them the rows of mrt_files"""
+
+        for analyzer in self.analyzers:
+            analyzer.start()
+        projections = self._projections()
+        mrt_files = tuple(
+            [
+                x
+                for x in sort_mrt_files_by_parsed_file_size(mrt_files)
+                if x.parse_succeeded
+            ]
+        )
+        total_lines = sum(x.total_parsed_lines for x in mrt_files)
+        with tqdm(total=total_lines, desc=desc) as pbar:
+            for mrt_file in mrt_files:
+                rows = iter_psv_fields(mrt_file.parsed_path_psv, self.columns)
+                while batch := list(islice(rows, self.batch_size)):
+                    for analyzer, project in zip(
+                        self.analyzers, projections, strict=True
+                    ):
+                        analyzer.process_rows(
+                            batch if project is None else list(map(project, batch))
+                        )
+                    pbar.update(len(batch))
+
+    def _projections(
+        self,
+    ) -> tuple[Callable[[tuple[Any, ...]], tuple[Any, ...]] | None, ...]:
+        """Returns funcs that project rows down to each analyzer's COLUMNS
+
+        None for analyzers that need every column read, as they're read
+        """
+
+        return tuple(
+            [
+                None
+                if self.columns == analyzer.COLUMNS
+                else fields_getter(
+                    tuple([self.columns.index(x) for x in analyzer.COLUMNS])
+                )
+                for analyzer in self.analyzers
+            ]
+        )
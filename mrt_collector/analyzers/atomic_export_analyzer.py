@@ -1,32 +1,53 @@
-import csv
 import json
-from collections import defaultdict
 from dataclasses import asdict, dataclass
+from functools import partial
+from itertools import islice
+from multiprocessing import cpu_count
 from pathlib import Path
+from typing import Any
 
+import numpy as np
 from tqdm import tqdm
 
-from mrt_collector.mrt_collector import sort_mrt_files_by_parsed_file_size
+from mrt_collector.chunked_reader import PSVChunk, map_reduce_psvs
 from mrt_collector.mrt_file import MRTFile
+from mrt_collector.parquet_io import iter_parquet_batches, iter_psv_batches
+from mrt_collector.parse_filter import ParseFilter
+from mrt_collector.prefix_codec import PrefixMap, PrefixSet, encode_prefixes
+
+from .analysis_engine import AnalysisEngine
+from .psv_analyzer import PSVAnalyzer
 
 # prefix atomic data will be formatted as:
-# defaultdict<prefix: str, set{data: AtomicData}>
+# dict<prefix: str, list[data: AtomicData]>
+# and is held as a PrefixMap of (prefix, atomic, aggr_asn) records,
+# where an aggr_asn of -1 means None
 
 @dataclass(frozen=True)
 class AtomicData:
     atomic: bool
     aggr_asn: int
 
-class AtomicExportAnalyzer:
+class AtomicExportAnalyzer(PSVAnalyzer):
+    COLUMNS = ("type", "prefix", "atomic", "aggr_asn")
+    # Parsing with this keeps only the rows and columns used here
+    PARSE_FILTER = ParseFilter(
+        columns=COLUMNS,
+        atomic_or_aggregator=True,
+    )
+
     def __init__(
         self,
-        base_dir: Path
+        base_dir: Path,
+        cpus: int = cpu_count(),
+        vectorized: bool = False,
     ) -> None:
 
-        self.atomic_data = defaultdict(set)
-        self.atomic_prefixes = set()
-        self.aggr_asn_prefixes = set()
+        self.atomic_data = PrefixMap([("atomic", "?"), ("aggr_asn", "i8")])
         self.base_dir = base_dir
+        self.cpus = cpus
+        # Reads columns with pyarrow, see process_batch
+        self.vectorized = vectorized
 
     def run(
         self,
@@ -34,67 +55,139 @@ class AtomicExportAnalyzer:
     ) -> None:
         """Lifecycle of the export analyzer"""
 
-        mrt_files = sort_mrt_files_by_parsed_file_size(mrt_files)
         self.get_atomic_data(mrt_files)
-        self.dump_atomic_data_json(
-            self.json_atomic_data_path
-        )
-        self.dump_prefix_sets_json(
-            self.json_prefixes_path
-        )
+        self.finish()
 
 
     def get_atomic_data(
         self,
         mrt_files: tuple[MRTFile, ...],
     ):
-        """Creates Atomic Export Data from parsed MRTs"""
+        """Creates Atomic Export Data from parsed MRTs
+
+        With more than one cpu, chunks of the parsed MRTs are collected in
+        a pool, and their partial data is merged in pairs (see merge).
+        When vectorized, MRTs that were converted to Parquet are read from
+        their Parquet files instead
+        """
 
-        total_lines = sum(x.total_parsed_lines for x in mrt_files)
         desc = "Extracting atomic aggregate data"
-        with tqdm(
-            total=total_lines,
-            desc=desc
-        ) as pbar:
-            for mrt_file in mrt_files:
-                if not mrt_file.parsed_path_psv.exists():
-                    continue
-                self._collect_from_file(
-                    mrt_file,
-                    pbar
-                )
+        mrt_files = tuple([x for x in mrt_files if x.parse_succeeded])
+        if self.vectorized:
+            self._get_parquet_atomic_data(
+                tuple([x for x in mrt_files if x.parquet_path.exists()]), desc
+            )
+            mrt_files = tuple([x for x in mrt_files if not x.parquet_path.exists()])
+        elif self.cpus == 1:
+            AnalysisEngine((self,)).read(mrt_files, desc=desc)
+            return
 
-    def _collect_from_file(
-        self,
-        mrt_file: MRTFile,
-        pbar
-    ):
-        """Collects atomic data from an mrt file"""
-
-        with mrt_file.parsed_path_psv.open() as f:
-            reader = csv.DictReader(f, delimiter="|")
-            for row in reader:
-                pbar.update()
-                if row["type"] != "A":
-                    continue
-
-                atomic = row["atomic"] == "true"
-                aggr_asn = row["aggr_asn"] or "None"
-                # skip rows without atomic and without aggregate data
-                # some rows can have atomic=false but still have data
-                if not atomic and aggr_asn == "None":
-                    continue
-
-                prefix = row["prefix"]
-                if atomic:
-                    self.atomic_prefixes.add(prefix)
-
-                if aggr_asn != "None":
-                    self.aggr_asn_prefixes.add(prefix)
-
-                self.atomic_data[prefix].add(
-                    AtomicData(atomic, aggr_asn)
-                )
+        map_reduce_psvs(
+            [x.parsed_path_psv for x in mrt_files],
+            partial(_collect_atomic_data, self.base_dir, self.vectorized),
+            _merge_atomic_data,
+            self,
+            cpus=self.cpus,
+            desc=desc,
+            tree_reduce=True,
+        )
+
+    def _get_parquet_atomic_data(
+        self, mrt_files: tuple[MRTFile, ...], desc: str
+    ) -> None:
+        """Creates Atomic Export Data from the Parquet files of parsed MRTs
+
+        Row groups without announcements that are atomic or have an
+        aggregator are skipped by the filter without being read
+        """
+
+        if not mrt_files:
+            return
+
+        from pyarrow import dataset as ds  # noqa: PLC0415
+
+        batches = iter_parquet_batches(
+            [x.parquet_path for x in mrt_files],
+            list(self.COLUMNS),
+            filter=(ds.field("type") == "A")
+            & (ds.field("atomic") | ds.field("aggr_asn").is_valid()),
+        )
+        for batch in tqdm(batches, desc=desc, unit=" batches"):
+            self.process_batch(batch)
+
+    def merge(self, other: "AtomicExportAnalyzer") -> "AtomicExportAnalyzer":
+        """Merges the atomic data of another analyzer into this one
+
+        Both are sorted arrays of records, so this is a single merge
+        """
+
+        self.atomic_data.update(other.atomic_data)
+        return self
+
+    def process_rows(self, rows: list[tuple[str, ...]]) -> None:
+        """Collects atomic data from rows of (type, prefix, atomic, aggr_asn)"""
+
+        for type_, prefix, atomic_str, aggr_asn_str in rows:
+            if type_ != "A":
+                continue
+
+            atomic = atomic_str == "true"
+            # skip rows without atomic and without aggregate data
+            # some rows can have atomic=false but still have data
+            if not atomic and not aggr_asn_str:
+                continue
+
+            self.atomic_data.add(
+                prefix, atomic, int(aggr_asn_str) if aggr_asn_str else -1
+            )
+
+    def process_batch(self, batch: Any) -> None:
+        """Collects atomic data from a pyarrow RecordBatch of COLUMNS
+
+        Rather than going row by row, rows are filtered with masks over
+        whole columns, and (prefix, atomic, aggr_asn) are packed into one
+        uint64 per row, so that np.unique leaves only the distinct hits of
+        the batch, which are added as records to atomic_data
+        """
+
+        if not batch.num_rows:
+            return
+
+        types, type_codes = _dictionary_codes(batch.column("type"))
+        is_announcement = np.array([x == "A" for x in types.to_pylist()], dtype=bool)
+        atomic = batch.column("atomic").fill_null(False).to_numpy(zero_copy_only=False)
+        aggr_asns = batch.column("aggr_asn")
+        has_aggr_asn = aggr_asns.is_valid().to_numpy(zero_copy_only=False)
+        # skip rows without atomic and without aggregate data
+        # some rows can have atomic=false but still have data
+        hits = np.flatnonzero(is_announcement[type_codes] & (atomic | has_aggr_asn))
+        if not hits.size:
+            return
+
+        prefixes, prefix_codes = _dictionary_codes(batch.column("prefix"))
+        keys = np.unique(
+            (prefix_codes[hits].astype(np.uint64) << np.uint64(34))
+            | (atomic[hits].astype(np.uint64) << np.uint64(33))
+            | (has_aggr_asn[hits].astype(np.uint64) << np.uint64(32))
+            | aggr_asns.fill_null(0)
+            .to_numpy(zero_copy_only=False)[hits]
+            .astype(np.uint64)
+        )
+        records = np.empty(len(keys), dtype=self.atomic_data.dtype)
+        records["prefix"] = encode_prefixes(
+            prefixes.take((keys >> np.uint64(34)).astype(np.int64)).to_pylist()
+        )
+        records["atomic"] = (keys >> np.uint64(33)) & np.uint64(1)
+        aggr_asn = (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        aggr_asn[(keys >> np.uint64(32)) & np.uint64(1) == 0] = -1
+        records["aggr_asn"] = aggr_asn
+        self.atomic_data.add_records(records)
+
+    def finish(self) -> None:
+        """Writes the atomic data once every row was processed"""
+
+        self.dump_atomic_data_json(self.json_atomic_data_path)
+        self.dump_prefix_sets_json(self.json_prefixes_path)
 
     def dump_atomic_data_json(
         self,
@@ -104,8 +197,15 @@ class AtomicExportAnalyzer:
         filepath.parent.mkdir(parents=True, exist_ok=True)
 
         serializable = {
-            prefix: [asdict(ad) for ad in ad_set]
-            for prefix, ad_set in self.atomic_data.items()
+            prefix: [
+                asdict(AtomicData(atomic, "None" if aggr_asn == -1 else str(aggr_asn)))
+                for atomic, aggr_asn in zip(
+                    records["atomic"].tolist(),
+                    records["aggr_asn"].tolist(),
+                    strict=True,
+                )
+            ]
+            for prefix, records in self.atomic_data.items()
         }
 
         with open(filepath, "w") as f:
@@ -129,6 +229,18 @@ class AtomicExportAnalyzer:
         with open(filepath, "w") as f:
             json.dump(output, f, indent=4)
 
+    @property
+    def atomic_prefixes(self) -> PrefixSet:
+        """Prefixes where atomic=true"""
+
+        return self.atomic_data.prefix_set(self.atomic_data.records["atomic"])
+
+    @property
+    def aggr_asn_prefixes(self) -> PrefixSet:
+        """Prefixes with an aggregator asn"""
+
+        return self.atomic_data.prefix_set(self.atomic_data.records["aggr_asn"] != -1)
+
     @property
     def atomic_and_aggr_asn_prefixes(self):
         """Property for an optional third set of prefixes;
@@ -145,3 +257,38 @@ class AtomicExportAnalyzer:
     def json_prefixes_path(self) -> Path:
         return self.base_dir / "analysis" / "atomic_prefixes.json"
 
+
+def _collect_atomic_data(
+    base_dir: Path, vectorized: bool, chunk: PSVChunk
+) -> AtomicExportAnalyzer:
+    """Collects the atomic data of a chunk of a parsed MRT (in a worker)"""
+
+    analyzer = AtomicExportAnalyzer(base_dir, cpus=1)
+    if vectorized:
+        for batch in iter_psv_batches(
+            chunk.path, AtomicExportAnalyzer.COLUMNS, chunk.start, chunk.end
+        ):
+            analyzer.process_batch(batch)
+        return analyzer
+
+    rows = chunk.iter_fields(AtomicExportAnalyzer.COLUMNS)
+    while batch := list(islice(rows, 2**16)):
+        analyzer.process_rows(batch)
+    return analyzer
+
+
+def _merge_atomic_data(
+    analyzer: AtomicExportAnalyzer, other: AtomicExportAnalyzer
+) -> AtomicExportAnalyzer:
+    return analyzer.merge(other)
+
+
+def _dictionary_codes(array: Any) -> tuple[Any, Any]:
+    """Returns the dictionary and (numpy) codes of a pyarrow string array"""
+
+    import pyarrow as pa  # noqa: PLC0415
+
+    if not pa.types.is_dictionary(array.type):
+        array = array.dictionary_encode()
+    return array.dictionary, array.indices.to_numpy(zero_copy_only=False)
+
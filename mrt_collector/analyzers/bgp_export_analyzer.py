@@ -1,25 +1,21 @@
-import csv
 import gc
 import json
 import time
-from collections import defaultdict
-from dataclasses import dataclass
 from pathlib import Path
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
+import numpy as np
 from bgpy.as_graphs import CAIDAASGraphConstructor
 from tqdm import tqdm
 
 from mrt_collector.mrt_file import MRTFile
 
-mpl.use("Agg")
-
+from .analysis_engine import AnalysisEngine
+from .next_hop_store import NextHopStore, asn_slices
+from .psv_analyzer import PSVAnalyzer
 
-@dataclass(frozen=True)
-class NextHopData:
-    asn: int
-    prepending: bool
+mpl.use("Agg")
 
 
 # https://stackoverflow.com/a/8230505/8903959
@@ -30,67 +26,71 @@ class SetEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-class BGPExportAnalyzer:
+class BGPExportAnalyzer(PSVAnalyzer):
+    COLUMNS = ("type", "as_path", "prefix")
+
+    def __init__(self) -> None:
+        # {current_asn: {prefix: set_of_next_hops}}
+        self.as_path_data = NextHopStore()
+
     def run(self, mrt_files: tuple[MRTFile, ...]):
         og_start = time.perf_counter()
         start = og_start
         # Aggregates data into {current_asn: {prefix: set_of_next_hops}}
-        as_path_data = self.get_as_path_data(mrt_files)
+        self.get_as_path_data(mrt_files)
         print("Make the above multiprocessing")
         print(f"got AS path data in {time.perf_counter() - start}")
-        start = time.perf_counter()
-        as_path_data_w_only_providers = self.remove_non_providers(as_path_data)
-        print(f"filtered AS path data in {time.perf_counter() - start}")
-        self.create_graphs(as_path_data_w_only_providers)
+        self.finish()
         print(time.perf_counter() - og_start)
 
-    def get_as_path_data(
-        self, mrt_files: tuple[MRTFile, ...]
-    ) -> defaultdict[int, defaultdict[str, set[int]]]:
+    def get_as_path_data(self, mrt_files: tuple[MRTFile, ...]) -> NextHopStore:
         """Aggregates data into {current_asn: {prefix: set_of_next_hops}}"""
 
         print("NOTE: this takes up about XGB of RAM")
         print("Add multiprocessing? Potentially? If you have enough ram?")
-        data = defaultdict(lambda: defaultdict(set))
-        total_lines = sum(x.total_parsed_lines for x in mrt_files)
-        with tqdm(total=total_lines, desc="Extracting AS-Path data") as pbar:
-            for mrt_file in sorted(mrt_files):
-                if not mrt_file.parsed_path_psv.exists():
+        AnalysisEngine((self,)).read(mrt_files, desc="Extracting AS-Path data")
+        return self.as_path_data
+
+    def process_rows(self, rows: list[tuple[str, ...]]) -> None:
+        """Adds the next hops of rows of (type, as_path, prefix)"""
+
+        reversed_as_paths = list()
+        prefixes = list()
+        for type_, as_path_str, prefix in rows:
+            if type_ == "A":
+                try:
+                    as_path = [int(x) for x in as_path_str.split()]
+                except ValueError:
+                    # print("Encountered AS set")
                     continue
-                with mrt_file.parsed_path_psv.open() as f:
-                    reader = csv.DictReader(f, delimiter="|")
-                    for row in reader:
-                        pbar.update()
-                        if row["type"] == "A":
-                            try:
-                                as_path = [int(x) for x in row["as_path"].split()]
-                            except ValueError:
-                                # print("Encountered AS set")
-                                continue
-                            # print(as_path)
-                            reversed_as_path = list(reversed(as_path))
-                            prepending = len(set(as_path)) != len(as_path)
-                            for i, asn in enumerate(reversed_as_path):
-                                try:
-                                    next_asn = reversed_as_path[i + 1]
-                                    # This will add an empty set to the end
-                                    data[asn][row["prefix"]]
-                                except IndexError:
-                                    break
-                                data[asn][row["prefix"]].add(
-                                    NextHopData(asn=next_asn, prepending=prepending)
-                                )
-        return data
+                as_path.reverse()
+                reversed_as_paths.append(as_path)
+                prefixes.append(prefix)
+        self.as_path_data.add_as_paths(reversed_as_paths, prefixes)
+
+    def finish(self) -> None:
+        """Filters the AS path data down to providers and graphs it"""
+
+        start = time.perf_counter()
+        as_path_data_w_only_providers = self.remove_non_providers(self.as_path_data)
+        print(f"filtered AS path data in {time.perf_counter() - start}")
+        self.create_graphs(as_path_data_w_only_providers)
 
     def remove_non_providers(
         self,
-        as_path_data: defaultdict[int, defaultdict[str, set[int]]],
-    ) -> defaultdict[int, defaultdict[str, set[int]]]:
-        filtered_data = defaultdict(lambda: defaultdict(set))
+        as_path_data: NextHopStore,
+    ) -> NextHopStore:
+        """Keeps only the next hops that are providers, of ASes with providers"""
+
         bgp_dag = CAIDAASGraphConstructor().run()
-        for asn, inner_dict in tqdm(
-            as_path_data.items(),
-            total=len(as_path_data),
+        records = as_path_data.records
+        next_hop_asns = records["hop"] >> np.uint64(1)
+        is_provider = np.zeros(len(records), dtype=bool)
+        asns_with_providers = list()
+        asns, starts, ends = asn_slices(records["group"])
+        for asn, start, end in tqdm(
+            zip(asns, starts, ends, strict=True),
+            total=len(asns),
             desc="Filtering AS path data",
         ):
             as_obj = bgp_dag.as_dict.get(asn)
@@ -99,15 +99,16 @@ class BGPExportAnalyzer:
             provider_asns = as_obj.provider_asns
             if not provider_asns:
                 continue
-            for prefix, set_of_next_hops in inner_dict.items():
-                filtered_data[asn][prefix] = {
-                    x for x in set_of_next_hops if x.asn in provider_asns
-                }
-        return filtered_data
+            asns_with_providers.append(asn)
+            is_provider[start:end] = np.isin(
+                next_hop_asns[start:end],
+                np.array(list(provider_asns), dtype=np.uint64),
+            )
+        return as_path_data.filter(is_provider, asns_with_providers)
 
     def create_graphs(
         self,
-        filtered_as_path_data: defaultdict[int, defaultdict[str, set[int]]],
+        filtered_as_path_data: NextHopStore,
     ) -> None:
         total = 0
         total_export_to_some = 0
@@ -117,19 +118,31 @@ class BGPExportAnalyzer:
         total_only_one_provider = 0
         bgp_dag = CAIDAASGraphConstructor().run()
         export_to_some_ases = set()
-        for asn, prefix_dict in filtered_as_path_data.items():
+
+        records = filtered_as_path_data.records
+        groups = filtered_as_path_data.groups
+        # Sizes of the set of next hops of each (asn, prefix)
+        record_groups = np.searchsorted(groups, records["group"])
+        group_lengths = np.bincount(record_groups, minlength=len(groups))
+        prepending_lengths = np.bincount(
+            record_groups,
+            weights=(records["hop"] & np.uint64(1)).astype(np.float64),
+            minlength=len(groups),
+        )
+        # Sets of next hops both with and without prepending
+        mixed_prepending = (prepending_lengths > 0) & (
+            prepending_lengths < group_lengths
+        )
+        for asn, start, end in zip(*asn_slices(groups), strict=True):
             total += 1
-            provider_lengths = [len(v) for v in prefix_dict.values()]
+            provider_lengths = group_lengths[start:end].tolist()
             prepending = False
-            for prefix, set_of_next_hops in prefix_dict.items():  # noqa
-                prepending_list = [x.prepending for x in set_of_next_hops]
-                if len(set(prepending_list)) == 2:
-                    prepending = True
-                    total_export_to_some_prepending += 1
-                    total_export_to_some += 1
-                    export_to_some_ases.add(asn)
-                    break
-            assert any(len(x) > 0 for x in provider_lengths), "No providers?"
+            if mixed_prepending[start:end].any():
+                prepending = True
+                total_export_to_some_prepending += 1
+                total_export_to_some += 1
+                export_to_some_ases.add(asn)
+            assert any(x > 0 for x in provider_lengths), "No providers?"
             if len(set(provider_lengths)) > 1:
                 if not prepending:
                     total_export_to_some += 1
@@ -1,4 +1,3 @@
-import csv
 import gc
 import json
 import time
@@ -9,11 +8,12 @@ from pathlib import Path
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from bgpy.as_graphs import CAIDAASGraphConstructor
-from tqdm import tqdm
 
 from mrt_collector.mrt_file import MRTFile
 
+from .analysis_engine import AnalysisEngine
 from .json_set_encoder import JSONSetEncoder as SetEncoder
+from .psv_analyzer import PSVAnalyzer
 
 mpl.use("Agg")
 
@@ -32,7 +32,14 @@ class JSONSetEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-class MHExportAnalyzer:
+class MHExportAnalyzer(PSVAnalyzer):
+    COLUMNS = ("type", "as_path", "prefix")
+
+    def __init__(self, mh_data=None) -> None:
+        # {origin: {provider_asn: set of prefix data}}, from _init_data (in
+        # start) if None, since loading CAIDA takes a while
+        self.mh_data = mh_data
+
     # not that I really know what I'm talking abt
     # but I get the sense this func needs work/restructuring
     # some of the calls, IE self.create_graphs() appear in
@@ -41,9 +48,8 @@ class MHExportAnalyzer:
         print("This takes about an hour")
         og_start = time.perf_counter()
         start = og_start
-        # mh_data = self._init_data()
         # Aggregates data into {current_asn: {provider_asn: {set of prefix data}}
-        mh_data = self.get_mh_data(mrt_files, mh_data)  # noqa
+        mh_data = self.get_mh_data(mrt_files, self.mh_data)
         print("Make the above multiprocessing")
         print(f"got AS path data in {time.perf_counter() - start}")
         start = time.perf_counter()
@@ -52,7 +58,6 @@ class MHExportAnalyzer:
         print(f"got graph data in {time.perf_counter() - start}")
         print(time.perf_counter() - og_start)
 
-    # *** Is this deprecated? it appears to be
     def _init_data(self):
         bgp_dag = CAIDAASGraphConstructor().run()
         data = dict()
@@ -68,50 +73,60 @@ class MHExportAnalyzer:
 
         print("NOTE: this takes up about 5GB of RAM")
         print("Add multiprocessing? Potentially? If you have enough ram?")
-        total_lines = sum(x.total_parsed_lines for x in mrt_files)
-        with tqdm(
-            total=total_lines, desc="Extracting Mulithomed 2+Provider Export data"
-        ) as pbar:
-            for mrt_file in sorted(mrt_files):
-                if not mrt_file.parsed_path_psv.exists():
+        self.mh_data = mh_data
+        AnalysisEngine((self,)).read(
+            mrt_files, desc="Extracting Mulithomed 2+Provider Export data"
+        )
+        return self.mh_data
+
+    def process_rows(self, rows: list[tuple[str, ...]]) -> None:
+        """Adds the provider prefixes of rows of (type, as_path, prefix)"""
+
+        mh_data = self.mh_data
+        for type_, as_path_str, prefix in rows:
+            if type_ == "A":
+                try:
+                    as_path = [int(x) for x in as_path_str.split()]
+                except ValueError:
+                    # print("Encountered AS set")
+                    continue
+
+                if len(as_path) <= 1:
                     continue
-                with mrt_file.parsed_path_psv.open() as f:
-                    reader = csv.DictReader(f, delimiter="|")
-                    for row in reader:
-                        pbar.update()
-                        if row["type"] == "A":
-                            try:
-                                as_path = [int(x) for x in row["as_path"].split()]
-                            except ValueError:
-                                # print("Encountered AS set")
-                                continue
-
-                            if len(as_path) <= 1:
-                                continue
-                            else:
-                                origin = as_path[-1]
-                                if origin not in mh_data:
-                                    continue
-                                provider_asn = as_path[-2]
-                                prepending = provider_asn == origin
-                                if prepending:
-                                    reversed_as_path = list(reversed(as_path))
-                                    for asn in reversed_as_path:
-                                        if asn != origin:
-                                            provider_asn = asn
-                                            break
-                                # This was just prepending and nothing else
-                                if provider_asn == origin:
-                                    continue
-                                # Provider is not in CAIDA, skip
-                                if provider_asn not in mh_data[origin]:
-                                    continue
-                                mh_data[origin][provider_asn].add(
-                                    PrefixData(
-                                        prefix=row["prefix"], prepending=prepending
-                                    )
-                                )
-        return mh_data
+                else:
+                    origin = as_path[-1]
+                    if origin not in mh_data:
+                        continue
+                    provider_asn = as_path[-2]
+                    prepending = provider_asn == origin
+                    if prepending:
+                        reversed_as_path = list(reversed(as_path))
+                        for asn in reversed_as_path:
+                            if asn != origin:
+                                provider_asn = asn
+                                break
+                    # This was just prepending and nothing else
+                    if provider_asn == origin:
+                        continue
+                    # Provider is not in CAIDA, skip
+                    if provider_asn not in mh_data[origin]:
+                        continue
+                    mh_data[origin][provider_asn].add(
+                        PrefixData(prefix=prefix, prepending=prepending)
+                    )
+
+    def start(self) -> None:
+        """Loads the multihomed ASes and their providers from CAIDA"""
+
+        if self.mh_data is None:
+            self.mh_data = self._init_data()
+
+    def finish(self) -> None:
+        """Writes and graphs the multihomed data once every row was processed"""
+
+        self.start()
+        self.dump_json(self.mh_data)
+        self.create_graphs()
 
     def dump_json(
         self,
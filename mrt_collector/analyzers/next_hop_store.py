@@ -0,0 +1,137 @@
+from collections.abc import Iterable
+
+import numpy as np
+
+from mrt_collector.prefix_codec import PENDING_SIZE, merge_sorted, sorted_unique
+
+# An (asn, prefix) is packed into a "group" as asn << 32 | prefix_id, and a
+# next hop into a "hop" as next_asn << 1 | prepending
+RECORD_DTYPE: np.dtype = np.dtype([("group", "u8"), ("hop", "u8")])
+
+
+class NextHopStore:
+    """{asn: {prefix: set of next hops}} as sorted typed arrays
+
+    Rather than a dict per asn, a set per prefix and an object per next
+    hop, every distinct (asn, prefix_id, next_asn, prepending) is a record
+    of two uint64s, and records are deduplicated by sorting. Sorting also
+    groups them by asn, then prefix, so each asn's records are a
+    contiguous slice (CSR style, see asn_slices).
+
+    groups are the (asn, prefix)s that have a set of next hops. A set can
+    be filtered down to nothing (see filter), so groups are kept apart.
+    """
+
+    def __init__(self) -> None:
+        # Prefixes are numbered in the order they're first seen
+        self.prefix_ids: dict[str, int] = dict()
+        self._records: np.ndarray = np.empty(0, dtype=RECORD_DTYPE)
+        self._pending: list[np.ndarray] = list()
+        self._pending_size: int = 0
+        # None for the groups of the records
+        self._groups: np.ndarray | None = None
+
+    def add_as_paths(
+        self,
+        reversed_as_paths: Iterable[list[int]],
+        prefixes: Iterable[str],
+    ) -> None:
+        """Adds the next hops of as paths (origin first) for prefixes
+
+        Each asn of a path gets the asn after it as a next hop, and paths
+        with prepending mark all of theirs as prepending
+        """
+
+        asns: list[int] = list()
+        lengths: list[int] = list()
+        prefix_ids: list[int] = list()
+        prepending: list[bool] = list()
+        for as_path, prefix in zip(reversed_as_paths, prefixes, strict=True):
+            if len(as_path) < 2:
+                continue
+            asns.extend(as_path)
+            lengths.append(len(as_path))
+            prefix_ids.append(self.prefix_ids.setdefault(prefix, len(self.prefix_ids)))
+            prepending.append(len(set(as_path)) != len(as_path))
+        if not lengths:
+            return
+
+        asn_array = np.array(asns, dtype=np.uint64)
+        path_lengths = np.array(lengths)
+        # Every asn but the last of each path has a next hop
+        has_next_hop = np.ones(len(asn_array), dtype=bool)
+        has_next_hop[np.cumsum(path_lengths) - 1] = False
+        hop_indexes = np.flatnonzero(has_next_hop)
+        hop_paths = np.repeat(np.arange(len(path_lengths)), path_lengths)[hop_indexes]
+
+        records = np.empty(len(hop_indexes), dtype=RECORD_DTYPE)
+        records["group"] = (asn_array[hop_indexes] << np.uint64(32)) | np.array(
+            prefix_ids, dtype=np.uint64
+        )[hop_paths]
+        records["hop"] = (asn_array[hop_indexes + 1] << np.uint64(1)) | np.array(
+            prepending, dtype=np.uint64
+        )[hop_paths]
+        self._pending.append(records)
+        self._pending_size += len(records)
+        if self._pending_size >= max(PENDING_SIZE, len(self._records) // 4):
+            self._flush()
+
+    @property
+    def records(self) -> np.ndarray:
+        """The sorted, distinct (group, hop) records"""
+
+        self._flush()
+        return self._records
+
+    @property
+    def groups(self) -> np.ndarray:
+        """The sorted, distinct groups with a set of next hops"""
+
+        if self._groups is None:
+            return sorted_unique(self.records["group"])
+        return self._groups
+
+    @property
+    def prefixes(self) -> list[str]:
+        """Every prefix, indexed by prefix id"""
+
+        return list(self.prefix_ids)
+
+    def filter(self, mask: np.ndarray, asns: Iterable[int]) -> "NextHopStore":
+        """Returns a store of the records where mask is true, for asns
+
+        The groups of asns are all kept, even if all of their records
+        are filtered out
+        """
+
+        asn_array = np.array(list(asns), dtype=np.uint64)
+        store = NextHopStore()
+        store.prefix_ids = self.prefix_ids
+        records = self.records[mask]
+        store._records = records[np.isin(records["group"] >> np.uint64(32), asn_array)]
+        store._groups = self.groups[np.isin(self.groups >> np.uint64(32), asn_array)]
+        return store
+
+    def __len__(self) -> int:
+        """Returns the number of asns with next hops"""
+
+        return len(np.unique(self.groups >> np.uint64(32)))
+
+    def _flush(self) -> None:
+        """Merges buffered records into the array"""
+
+        if self._pending:
+            self._records = merge_sorted(self._records, np.concatenate(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+
+
+def asn_slices(groups: np.ndarray) -> tuple[list[int], list[int], list[int]]:
+    """Returns the asns of sorted groups, and the start and end of each
+
+    i.e. the records of asns[i] are records[starts[i]:ends[i]]
+    """
+
+    asns, starts = np.unique(groups >> np.uint64(32), return_index=True)
+    ends = np.append(starts[1:], len(groups))
+    return asns.tolist(), starts.tolist(), ends.tolist()
@@ -0,0 +1,33 @@
+from typing import Any
+
+
+class PSVAnalyzer:
+    """An analysis of the rows of parsed PSVs, fed to it by an AnalysisEngine
+
+    COLUMNS are the columns the analysis needs, and rows are tuples of
+    them, in that order. Override process_row, or process_rows to handle
+    a batch of rows at a time (which skips a method call per row).
+    """
+
+    COLUMNS: tuple[str, ...] = ()
+
+    def start(self) -> None:
+        """Runs before any rows are processed, i.e. to load reference data"""
+
+        return None
+
+    def process_rows(self, rows: list[tuple[Any, ...]]) -> None:
+        """Processes a batch of rows"""
+
+        for row in rows:
+            self.process_row(row)
+
+    def process_row(self, row: tuple[Any, ...]) -> None:
+        """Processes a single row"""
+
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Runs once every row was processed, i.e. to write outputs"""
+
+        return None
@@ -0,0 +1,170 @@
+from datetime import datetime
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Any
+
+from .collection_path_handler import dated_dir
+from .debug_tools import ec_file_sizes_from_json, ec_file_sizes_to_json
+from .head_cache import HeadCache
+from .memory_governor import MemoryGovernor
+from .mrt_collector import MRTCollector
+from .mrt_file import MRTFile
+from .pipeline import Pipeline
+from .rate_limiter import HostRateLimiter
+from .rib_dump_parse_funcs import PARSE_FUNC, bgpkit_parser
+from .sources import CollectorRegistry, Source
+
+
+class BatchMRTCollector:
+    """Collects MRTs from many times in a single run
+
+    Running an MRTCollector per time repeats discovering sources, probing
+    file sizes and spinning up worker pools for every time. Instead, this
+    expands the URLs of every time up front, fetches all of their sizes in
+    one pass, and feeds every file into a single Pipeline. The rate
+    limiter, HEAD cache, collector registry, memory governor and requests
+    cache are shared by every time.
+
+    Each time still gets its own MRTCollector (and base_dir, i.e.
+    root/mrt_data/yyyy_mm_dd_hh), so the output is laid out just as if
+    each time had been collected separately.
+    """
+
+    def __init__(
+        self,
+        dl_times: tuple[datetime, ...],
+        root: Path | None = None,
+        cpus: int = cpu_count(),
+        rate_limiter: HostRateLimiter | None = None,
+        head_cache: HeadCache | None = None,
+        collector_registry: CollectorRegistry | None = None,
+        memory_governor: MemoryGovernor | None = None,
+        **collector_kwargs: Any,
+    ) -> None:
+        """Creates an MRTCollector for each time
+
+        collector_kwargs are passed to every MRTCollector
+        """
+
+        assert dl_times, "Need at least one time to collect"
+
+        self.dl_times: tuple[datetime, ...] = dl_times
+        self.cpus: int = cpus
+        self.data_dir: Path = (root or Path.home()) / "mrt_data"
+        self.rate_limiter: HostRateLimiter = rate_limiter or HostRateLimiter()
+        self.head_cache: HeadCache = head_cache or HeadCache()
+        self.collector_registry: CollectorRegistry = (
+            collector_registry or CollectorRegistry(rate_limiter=self.rate_limiter)
+        )
+        self.memory_governor: MemoryGovernor = memory_governor or MemoryGovernor()
+        self.collectors: dict[datetime, MRTCollector] = {
+            dl_time: MRTCollector(
+                dl_time=dl_time,
+                cpus=cpus,
+                base_dir=self.data_dir / dated_dir(dl_time),
+                rate_limiter=self.rate_limiter,
+                head_cache=self.head_cache,
+                collector_registry=self.collector_registry,
+                memory_governor=self.memory_governor,
+                requests_cache_path=self.requests_cache_path,
+                **collector_kwargs,
+            )
+            for dl_time in dl_times
+        }
+
+    def run(
+        self,
+        sources: tuple[Source, ...] = tuple([Cls() for Cls in Source.sources]),
+        limit_files_to: int = 0,
+        parse_func: PARSE_FUNC = bgpkit_parser,
+    ) -> dict[datetime, tuple[MRTFile, ...]]:
+        """Downloads MRTs for every time and then extracts data from them
+
+        limit_files_to applies to each time separately. Returns the MRTFiles
+        that made it through every step, for each time
+        """
+
+        mrt_files_by_time = {
+            dl_time: collector.get_mrt_files(sources)
+            for dl_time, collector in self.collectors.items()
+        }
+        self.set_mrt_ec_file_sizes(mrt_files_by_time)
+
+        for dl_time, collector in self.collectors.items():
+            mrt_files = collector.strip_unavail_sources(mrt_files_by_time[dl_time])
+            if limit_files_to != 0:
+                mrt_files = collector.limit_mrt_files(mrt_files, limit_files_to)
+            mrt_files_by_time[dl_time] = mrt_files
+
+        # Without multiprocessing there's no pool to share, so go time by time
+        if self.cpus == 1:
+            return {
+                dl_time: collector.process_mrt_files(
+                    mrt_files_by_time[dl_time], parse_func
+                )
+                for dl_time, collector in self.collectors.items()
+            }
+
+        time_of_mrt_file = {
+            id(mrt_file): dl_time
+            for dl_time, mrt_files in mrt_files_by_time.items()
+            for mrt_file in mrt_files
+        }
+        # Every collector is configured alike, so any of them has the stages
+        collector = self.collectors[self.dl_times[0]]
+        completed = Pipeline(
+            collector.get_pipeline_stages(parse_func),
+            self.rate_limiter,
+            self.memory_governor,
+        ).run(tuple([x for mrt_files in mrt_files_by_time.values() for x in mrt_files]))
+
+        completed_by_time: dict[datetime, list[MRTFile]] = {
+            dl_time: list() for dl_time in self.dl_times
+        }
+        for mrt_file in completed:
+            completed_by_time[time_of_mrt_file[id(mrt_file)]].append(mrt_file)
+        return {
+            dl_time: tuple(mrt_files)
+            for dl_time, mrt_files in completed_by_time.items()
+        }
+
+    def set_mrt_ec_file_sizes(
+        self, mrt_files_by_time: dict[datetime, tuple[MRTFile, ...]]
+    ) -> None:
+        """Gets the expected file size of each MRT for every time
+
+        Times that were already probed reuse their head_req.json. The
+        rest are probed together, so that every host is queried
+        concurrently across all times
+        """
+
+        unprobed = list()
+        for dl_time, collector in self.collectors.items():
+            if collector.head_req_path.exists():
+                ec_file_sizes_from_json(
+                    mrt_files_by_time[dl_time], collector.head_req_path
+                )
+            else:
+                unprobed.append(dl_time)
+
+        if not unprobed:
+            print("Head request results already cached!")
+            return
+
+        self.collectors[unprobed[0]].set_mrt_ec_file_sizes(
+            tuple([x for dl_time in unprobed for x in mrt_files_by_time[dl_time]])
+        )
+        for dl_time in unprobed:
+            ec_file_sizes_to_json(
+                mrt_files_by_time[dl_time], self.collectors[dl_time].head_req_path
+            )
+
+    @property
+    def requests_cache_path(self) -> Path:
+        """Returns the requests cache shared by every time
+
+        Collectors' directory listings are by month, so many times
+        share the same cached pages
+        """
+
+        return self.data_dir / "requests_cache.db"
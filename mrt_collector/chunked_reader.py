@@ -0,0 +1,179 @@
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass
+from itertools import pairwise
+from multiprocessing import cpu_count
+from pathlib import Path
+from typing import Any, TypeVar
+
+from tqdm import tqdm
+
+from .psv_index import PSVIndex, psv_index_path
+from .psv_io import open_psv, psv_compression
+from .psv_tokenizer import iter_psv_blocks, iter_psv_fields
+
+T = TypeVar("T")
+
+# Bytes of PSV in each chunk (compressed PSVs are always a single chunk)
+CHUNK_SIZE: int = 64 * 2**20
+
+
+@dataclass(frozen=True)
+class PSVChunk:
+    """A newline aligned byte range of the rows of a parsed PSV
+
+    An end of -1 means the whole PSV, which is how compressed PSVs
+    (which can't be seeked into) are read.
+    """
+
+    path: Path
+    start: int
+    end: int
+    # From the PSV's header, since filtered PSVs have fewer columns
+    columns: tuple[str, ...]
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Yields the rows of the chunk as bytes, without newlines"""
+
+        for block in iter_psv_blocks(self.path, self.start, self.end):
+            lines = block.split(b"\n")
+            lines.pop()
+            yield from lines
+
+    def iter_fields(
+        self, columns: tuple[str, ...], decode: bool = True
+    ) -> Iterator[tuple[Any, ...]]:
+        """Yields a tuple of columns for each row of the chunk (see psv_tokenizer)"""
+
+        yield from iter_psv_fields(self.path, columns, self.start, self.end, decode)
+
+    @property
+    def size(self) -> int:
+        if self.end < 0:
+            return self.path.stat().st_size
+        return self.end - self.start
+
+
+def split_psv(path: Path, chunk_size: int = CHUNK_SIZE) -> tuple[PSVChunk, ...]:
+    """Splits the rows of a parsed PSV into chunks of about chunk_size bytes
+
+    Boundaries come from the PSV's index when it has one. Otherwise, this
+    seeks to every chunk_size bytes and scans to the next newline.
+    """
+
+    with open_psv(path, "rb") as f:
+        header = f.readline()
+    columns = tuple(header.decode().rstrip("\n").split("|"))
+    if psv_compression(path):
+        return (PSVChunk(path, 0, -1, columns),)
+
+    size = path.stat().st_size
+    boundaries = [len(header)]
+    index = _load_index(path, size)
+    if index is not None:
+        for _, offset in index.offsets:
+            if offset - boundaries[-1] >= chunk_size:
+                boundaries.append(offset)
+    else:
+        with path.open("rb") as f:
+            for target in range(len(header) + chunk_size, size, chunk_size):
+                if target <= boundaries[-1]:
+                    continue
+                f.seek(target - 1)
+                # Reads the rest of the row that target is in
+                f.readline()
+                if f.tell() < size:
+                    boundaries.append(f.tell())
+    boundaries.append(size)
+    return tuple(
+        [
+            PSVChunk(path, start, end, columns)
+            for start, end in pairwise(boundaries)
+            if end > start
+        ]
+    )
+
+
+def map_reduce_psvs(
+    paths: Iterable[Path],
+    map_func: Callable[[PSVChunk], T],
+    reduce_func: Callable[[T, T], T],
+    initial: T,
+    cpus: int = cpu_count(),
+    chunk_size: int = CHUNK_SIZE,
+    desc: str = "Reading parsed MRTs",
+    tree_reduce: bool = False,
+) -> T:
+    """Runs map_func on chunks of PSVs in a pool, reducing its partial results
+
+    Every PSV is split into chunks, so a single huge PSV is still read on
+    every core. Chunks run largest first, so that a large chunk doesn't
+    finish last. map_func must be picklable (i.e. a module level function),
+    and its results are reduced into initial, in the order that chunks
+    finish, as reduce_func(result, partial_result).
+
+    With tree_reduce, partial results are instead reduced in pairs in the
+    pool as they finish (so reduce_func must be picklable too), and only
+    the last of them is reduced into initial. So large partial results
+    (i.e. sets) are merged on every core, rather than one at a time.
+    """
+
+    chunks = sorted(
+        [chunk for path in paths for chunk in split_psv(path, chunk_size)],
+        key=lambda x: x.size,
+        reverse=True,
+    )
+    result = initial
+    if cpus == 1:
+        for chunk in tqdm(chunks, desc=desc):
+            result = reduce_func(result, map_func(chunk))
+        return result
+
+    with ProcessPoolExecutor(max_workers=cpus) as executor:
+        futures = [executor.submit(map_func, chunk) for chunk in chunks]
+        if tree_reduce:
+            with tqdm(total=len(futures), desc=desc) as pbar:
+                partial_result = _tree_reduce(executor, futures, reduce_func, pbar)
+            if partial_result is not None:
+                result = reduce_func(result, partial_result)
+            return result
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            result = reduce_func(result, future.result())
+    return result
+
+
+def _tree_reduce(
+    executor: ProcessPoolExecutor,
+    futures: list[Future[T]],
+    reduce_func: Callable[[T, T], T],
+    pbar: tqdm,
+) -> T | None:
+    """Reduces results in pairs in the pool as they finish, until one is left"""
+
+    map_futures = set(futures)
+    pending = set(futures)
+    results: list[T] = list()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results.append(future.result())
+            if future in map_futures:
+                pbar.update()
+        while len(results) >= 2:
+            pending.add(executor.submit(reduce_func, results.pop(), results.pop()))
+    return results[0] if results else None
+
+
+def _load_index(path: Path, size: int) -> PSVIndex | None:
+    """Returns the index of a PSV, unless it's missing or out of date"""
+
+    if not psv_index_path(path).exists():
+        return None
+    index = PSVIndex.load(psv_index_path(path))
+    return index if index.size == size else None
@@ -1,5 +1,5 @@
 import argparse
-from datetime import datetime
+from datetime import datetime, timedelta
 
 OLDEST = datetime(2002, 12, 26, 0, 0, 0)
 
@@ -51,3 +51,26 @@ def handle_datetime(
 
     return given_dt
 
+
+def handle_datetime_range(
+    from_dt_str: str, to_dt_str: str, every_hours: int = 8
+) -> tuple[datetime, ...]:
+    """Returns every time from from_dt_str to to_dt_str (inclusive),
+    every_hours apart. Expects formats as "MM/DD/YYYY/HH"
+    """
+
+    # RIPE dumps every 8 hours, so every time must be a RIPE dump time
+    if every_hours <= 0 or every_hours % 8 != 0:
+        raise ValueError("RIPE dumps every 8 hours; --every must be a multiple of 8")
+
+    from_dt = handle_datetime(from_dt_str)
+    to_dt = handle_datetime(to_dt_str)
+    if from_dt > to_dt:
+        raise ValueError(f"--from ({from_dt}) is after --to ({to_dt})")
+
+    dl_times = []
+    dl_time = from_dt
+    while dl_time <= to_dt:
+        dl_times.append(dl_time)
+        dl_time += timedelta(hours=every_hours)
+    return tuple(dl_times)
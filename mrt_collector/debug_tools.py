@@ -10,7 +10,13 @@ def ec_file_sizes_to_json(mrt_files: tuple[MRTFile, ...], output_path: Path) ->
     Helpful when debugging to skip the 7 min wait
     """
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    data = {mrt_file.url: mrt_file.ec_file_size for mrt_file in mrt_files}
+    # Approximate sizes (from directory listings) are stored with their tolerance
+    data = {
+        mrt_file.url: [mrt_file.ec_file_size, mrt_file.ec_file_size_tolerance]
+        if mrt_file.ec_file_size_tolerance
+        else mrt_file.ec_file_size
+        for mrt_file in mrt_files
+    }
     with output_path.open("w") as f:
         json.dump(data, f, indent=2)
 
@@ -26,4 +32,8 @@ def ec_file_sizes_from_json(mrt_files: tuple[MRTFile, ...], input_path: Path) ->
 
     for mrt_file in mrt_files:
         if mrt_file.url in url_to_size:
-            mrt_file._ec_file_size = url_to_size[mrt_file.url]  # noqa
+            size = url_to_size[mrt_file.url]
+            if isinstance(size, list):
+                mrt_file.set_ec_file_size(*size)
+            else:
+                mrt_file.set_ec_file_size(size)
@@ -0,0 +1,74 @@
+import os
+import threading
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+
+from .retry_session import RetrySession
+
+
+class DownloadClient:
+    """Owns one pooled RetrySession per host
+
+    Sessions keep their connections alive, so HEAD and GET requests to the
+    same host (and all the files on it) reuse connections rather than
+    repeating TCP and TLS handshakes. Every request gets the same
+    retry/backoff policy from RetrySession.
+
+    Use get_download_client() to get the client for the current process,
+    since sessions can't be shared across processes.
+    """
+
+    def __init__(self, **retry_session_kwargs: Any) -> None:
+        self.retry_session_kwargs: dict[str, Any] = retry_session_kwargs
+        self._sessions: dict[str, RetrySession] = dict()
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> RetrySession:
+        """Returns the session for the URL's host, creating it if needed"""
+
+        host = urlparse(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = RetrySession(**self.retry_session_kwargs)
+                self._sessions[host] = session
+            return session
+
+    def head(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session(url).head(url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session(url).get(url, **kwargs)
+
+    def close(self) -> None:
+        """Closes all sessions (and their connection pools)"""
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_download_client: DownloadClient | None = None
+_download_client_pid: int = 0
+_download_client_lock = threading.Lock()
+
+
+def get_download_client() -> DownloadClient:
+    """Returns the DownloadClient for the current process
+
+    Each worker process creates its own client on first use and then
+    reuses it for every file that the worker downloads. A client inherited
+    from a parent process (when forking) is never reused, since its
+    connections belong to the parent.
+    """
+
+    global _download_client, _download_client_pid  # noqa: PLW0603
+
+    with _download_client_lock:
+        if _download_client is None or _download_client_pid != os.getpid():
+            _download_client = DownloadClient()
+            _download_client_pid = os.getpid()
+        return _download_client
@@ -0,0 +1,101 @@
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import astuple, dataclass, field, fields
+from pathlib import Path
+
+from platformdirs import user_cache_path
+
+
+@dataclass
+class HeadResult:
+    """The result of a HEAD request for a single MRT URL
+
+    A status of 0 means that no response was received
+    """
+
+    url: str
+    size: int = 0
+    status: int = 0
+    etag: str = ""
+    last_modified: str = ""
+    checked_at: float = field(default_factory=time.time)
+
+    @property
+    def conditional_headers(self) -> dict[str, str]:
+        """Returns headers to revalidate this result with (304 if unchanged)"""
+
+        headers = dict()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HeadCache:
+    """SQLite store of HeadResults, shared by runs for every date
+
+    Results are saved as soon as each HEAD request completes, so an
+    interrupted run loses nothing. Results younger than ttl seconds are used
+    without any request. Older results are revalidated with a conditional
+    request, which is answered with a (cheap) 304 if the file hasn't changed.
+
+    Unlike head_req.json, this isn't stored in a (per date) base_dir, since
+    runs for different dates request many of the same collectors' files.
+    Like the Manifest, only the path is stored on this object, and each call
+    opens its own connection. The database is only created once it's used,
+    so runs that never make a HEAD request leave the cache dir alone.
+    """
+
+    def __init__(self, path: Path | None = None, ttl: float = 24 * 60 * 60) -> None:
+        self.path: Path = path or user_cache_path("mrt_collector") / "head_cache.db"
+        # Seconds that a result is used for before it's revalidated
+        self.ttl: float = ttl
+        self._created: bool = False
+
+    def get(self, url: str) -> HeadResult | None:
+        """Returns the cached result for a URL, if there is one"""
+
+        columns = ", ".join(self._columns)
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {columns} FROM head_results WHERE url = ?",  # noqa: S608
+                (url,),
+            ).fetchone()
+        return None if row is None else HeadResult(*row)
+
+    def save(self, result: HeadResult) -> None:
+        """Inserts or replaces the result for its URL"""
+
+        placeholders = ", ".join("?" for _ in self._columns)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO head_results ({', '.join(self._columns)}) "  # noqa: S608
+                f"VALUES ({placeholders})",
+                astuple(result),
+            )
+
+    def is_fresh(self, result: HeadResult) -> bool:
+        """Returns True if a result can be used without revalidating it"""
+
+        return time.time() - result.checked_at < self.ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._created:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One thread per host writes at the same time, so wait on locks
+        conn = sqlite3.connect(self.path, timeout=60)
+        if not self._created:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS head_results ("
+                    "url TEXT PRIMARY KEY, size INTEGER, status INTEGER, "
+                    "etag TEXT, last_modified TEXT, checked_at REAL)"
+                )
+            self._created = True
+        return conn
+
+    @property
+    def _columns(self) -> tuple[str, ...]:
+        return tuple([x.name for x in fields(HeadResult)])
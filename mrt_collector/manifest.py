@@ -0,0 +1,98 @@
+import sqlite3
+from contextlib import closing
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+
+
+@dataclass
+class FileRecord:
+    """What we know about the files of a single MRT URL
+
+    Sizes of 0 and a line_count of -1 mean that the stage isn't done yet
+    """
+
+    url: str
+    raw_size: int = 0
+    raw_mtime: float = 0
+    # i.e. crc32:0123abcd, empty when unknown (segmented or pre-manifest files)
+    raw_checksum: str = ""
+    parsed_size: int = 0
+    parsed_mtime: float = 0
+    line_count: int = -1
+
+    @property
+    def status(self) -> str:
+        """Returns the furthest stage that this URL has completed"""
+
+        if self.line_count >= 0:
+            return "counted"
+        elif self.parsed_size:
+            return "parsed"
+        elif self.raw_size:
+            return "downloaded"
+        else:
+            return "new"
+
+
+class Manifest:
+    """SQLite store of FileRecords, the source of truth for skipping work
+
+    Checking whether files exist (and their sizes) over and over is slow on
+    network filesystems, so instead each MRTFile records what it has done
+    here once, and reruns read every record with a single query.
+
+    Only the path is stored on this object, so it can be pickled into worker
+    processes, each of which opens its own connection. Records keep the
+    size and mtime of each file, so MRTFile drops the records of files that
+    were deleted or modified by hand (and checks them again).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "url TEXT PRIMARY KEY, raw_size INTEGER, raw_mtime REAL, "
+                "raw_checksum TEXT, parsed_size INTEGER, parsed_mtime REAL, "
+                "line_count INTEGER, status TEXT)"
+            )
+
+    def load(self) -> dict[str, FileRecord]:
+        """Returns all records, keyed by URL"""
+
+        columns = ", ".join(self._columns)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT {columns} FROM files").fetchall()  # noqa: S608
+        return {row[0]: FileRecord(*row) for row in rows}
+
+    def get(self, url: str) -> FileRecord | None:
+        """Returns the record for a URL, if there is one"""
+
+        columns = ", ".join(self._columns)
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {columns} FROM files WHERE url = ?",  # noqa: S608
+                (url,),
+            ).fetchone()
+        return None if row is None else FileRecord(*row)
+
+    def save(self, record: FileRecord) -> None:
+        """Inserts or replaces the record for its URL"""
+
+        columns = (*self._columns, "status")
+        placeholders = ", ".join("?" for _ in columns)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(columns)}) "  # noqa: S608
+                f"VALUES ({placeholders})",
+                (*astuple(record), record.status),
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Workers write at the same time, so wait on locks rather than erroring
+        return sqlite3.connect(self.path, timeout=60)
+
+    @property
+    def _columns(self) -> tuple[str, ...]:
+        return tuple([x.name for x in fields(FileRecord)])
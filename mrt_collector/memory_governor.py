@@ -0,0 +1,172 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable
+
+import psutil
+from platformdirs import user_cache_path
+
+
+def run_measured(func: Callable[..., Any], *args: Any) -> tuple[Any, int]:
+    """Runs func(*args) in a worker, returning its result and peak RSS in bytes
+
+    The peak includes child processes (i.e. bgpkit-parser), and is sampled
+    by a background thread while func runs
+    """
+
+    process = psutil.Process(os.getpid())
+    peak = 0
+    done = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak
+        while True:
+            try:
+                rss = process.memory_info().rss + sum(
+                    x.memory_info().rss for x in process.children(recursive=True)
+                )
+            except psutil.Error:
+                # A child exited while we were sampling it
+                rss = 0
+            peak = max(peak, rss)
+            if done.wait(0.2):
+                return
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        result = func(*args)
+    finally:
+        done.set()
+        sampler.join()
+    return result, peak
+
+
+def collector_key(url: str) -> str:
+    """Returns the collector of an MRT URL, i.e. data.ris.ripe.net/rrc00
+
+    Collectors' dumps (and so the memory to process them) are similar in
+    size from dump to dump, so memory estimates are kept per collector
+    """
+
+    return re.sub(r"^\w+://|/\d{4}\.\d{2}/.*$", "", url)
+
+
+class MemoryGovernor:
+    """Admits tasks into process pools only when there's memory for them
+
+    Each task is estimated to peak at the RSS that the same task peaked at
+    for the same collector in previous runs (stored in SQLite in the user
+    cache dir). Tasks are only started while the estimates of running tasks
+    fit in memory_fraction of total memory, and while at least
+    headroom bytes would still be available. Tasks also wait while the load
+    average is above max_load_per_cpu (i.e. when sharded parses oversubscribe
+    the CPUs). Waiting beats running the machine out of memory, and a task
+    always runs if nothing else is running, so work never stalls entirely.
+
+    This class isn't thread safe, and should only be used by the process
+    that submits tasks. Estimates are only loaded (and the database created)
+    once a task is admitted, so single process runs leave the cache dir alone.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        memory_fraction: float = 0.8,
+        headroom: int = 2**30,
+        # Used for tasks without previous runs, unless similar tasks had any
+        default_estimate: int = 2**29,
+        max_load_per_cpu: float = 2,
+    ) -> None:
+        assert 0 < memory_fraction <= 1, "memory_fraction must be a fraction"
+
+        self.path: Path = path or user_cache_path("mrt_collector") / "memory.db"
+        self.budget: int = int(psutil.virtual_memory().total * memory_fraction)
+        self.headroom: int = headroom
+        self.default_estimate: int = default_estimate
+        self.max_load: float = max_load_per_cpu * (os.cpu_count() or 1)
+        # Peak RSS by (task, collector), see _estimates
+        self._loaded_estimates: dict[tuple[str, str], int] | None = None
+        # Estimates reserved by running tasks, by task ID
+        self._reserved: dict[int, int] = dict()
+
+    def estimate(self, task: str, url: str, processes: int = 1) -> int:
+        """Returns the estimated peak RSS of a task (i.e. parse_mrt) for a URL
+
+        Without previous runs for the URL's collector, this falls back to
+        the largest peak of the task for any collector, for each of the
+        task's processes (i.e. the shards of a sharded parse). Previous runs
+        already include every process, since peaks include child processes
+        """
+
+        estimate = self._estimates.get((task, collector_key(url)))
+        if estimate is not None:
+            return estimate
+        return processes * max(
+            (v for (t, _), v in self._estimates.items() if t == task),
+            default=self.default_estimate,
+        )
+
+    def try_admit(self, task_id: int, task: str, url: str, processes: int = 1) -> bool:
+        """Reserves memory for a task if there's enough, returning if it can run
+
+        Call release with the same task_id when the task finishes
+        """
+
+        estimate = self.estimate(task, url, processes)
+        if self._reserved:
+            if sum(self._reserved.values()) + estimate > self.budget:
+                return False
+            if psutil.virtual_memory().available - estimate < self.headroom:
+                return False
+            if psutil.getloadavg()[0] > self.max_load:
+                return False
+        self._reserved[task_id] = estimate
+        return True
+
+    def release(self, task_id: int, task: str, url: str, peak_rss: int = 0) -> None:
+        """Releases a task's reservation, learning from its peak RSS
+
+        The new estimate moves halfway towards a lower peak, but jumps
+        straight to a higher one, so that estimates stay conservative
+        """
+
+        self._reserved.pop(task_id, None)
+        if not peak_rss:
+            return
+        key = (task, collector_key(url))
+        old = self._estimates.get(key)
+        estimate = peak_rss if old is None else max(peak_rss, (old + peak_rss) // 2)
+        self._estimates[key] = estimate
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO memory_estimates "
+                "(task, collector, peak_rss) VALUES (?, ?, ?)",
+                (*key, estimate),
+            )
+
+    @property
+    def _estimates(self) -> dict[tuple[str, str], int]:
+        """Peak RSS by (task, collector), loaded from previous runs when first used"""
+
+        if self._loaded_estimates is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS memory_estimates ("
+                    "task TEXT, collector TEXT, peak_rss INTEGER, "
+                    "PRIMARY KEY (task, collector))"
+                )
+                rows = conn.execute(
+                    "SELECT task, collector, peak_rss FROM memory_estimates"
+                ).fetchall()
+            self._loaded_estimates = {
+                (task, collector): peak_rss for task, collector, peak_rss in rows
+            }
+        return self._loaded_estimates
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60)
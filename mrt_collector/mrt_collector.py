@@ -1,26 +1,94 @@
-import time  # this is for temp solution to our new connection error diagnostics
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime
 from multiprocessing import cpu_count
 from pathlib import Path
 from typing import Any, Callable
 
+import requests
 from tqdm import tqdm
 
 from .debug_tools import ec_file_sizes_from_json, ec_file_sizes_to_json
+from .head_cache import HeadCache
+from .manifest import Manifest
+from .memory_governor import MemoryGovernor, run_measured
 from .mrt_file import MRTFile
-from .rib_dump_parse_funcs import PARSE_FUNC, bgpkit_parser
-from .sources import Source
-
-
-def download_mrt(mrt_file: MRTFile) -> None:
-    mrt_file.download_raw()
+from .parse_filter import ParseFilter
+from .pipeline import Pipeline, PipelineStage
+from .rate_limiter import HostRateLimiter, exception_status_code
+from .rib_dump_parse_funcs import (
+    PARSE_FUNC,
+    bgpkit_parser,
+    bgpkit_parser_sharded,
+    bgpkit_parser_stream,
+)
+from .sources import CollectorRegistry, Source
+
+
+def download_mrt(
+    mrt_file: MRTFile, segments: int = 1, segment_interval: float = 0
+) -> int:
+    return mrt_file.download_raw(segments=segments, segment_interval=segment_interval)
+
+
+def stream_parse_mrt(
+    mrt_file: MRTFile, keep_raw: bool = False, parse_filter: ParseFilter | None = None
+) -> int:
+    """Streams an MRT into the parser, returning the download's status code
+
+    Files that fail to stream are left unparsed, to be downloaded (rate
+    limited like any other download) and then parsed instead
+    """
+
+    if mrt_file.parse_succeeded:
+        return 0
+
+    try:
+        return bgpkit_parser_stream(
+            mrt_file, keep_raw=keep_raw, parse_filter=parse_filter
+        )
+    except requests.HTTPError as e:
+        print(f"URL {mrt_file.url} failed due to {e} {type(e)}")
+        return exception_status_code(e)
+    except Exception as e:  # noqa: BLE001
+        print(f"Streaming {mrt_file.url} failed due to {e}, downloading instead")
+        return 0
+
+
+def parse_mrt(
+    mrt_file: MRTFile,
+    parse_func: PARSE_FUNC,
+    shards: int = 1,
+    parse_filter: ParseFilter | None = None,
+    keep_raw: bool = True,
+) -> None:
+    if shards > 1:
+        bgpkit_parser_sharded(mrt_file, shards, parse_filter)
+    elif parse_filter is not None:
+        # Only passed when set, so parse funcs without filtering still work
+        parse_func(mrt_file, parse_filter=parse_filter)  # type: ignore[call-arg]
+    else:
+        parse_func(mrt_file)
+    # i.e. downloaded only because streaming failed
+    if not keep_raw and mrt_file.parse_succeeded:
+        mrt_file.raw_path.unlink(missing_ok=True)
 
 
 def count_parsed_lines(mrt_file: MRTFile) -> None:
     mrt_file.count_parsed_lines()
 
 
+def convert_to_parquet(mrt_file: MRTFile) -> None:
+    mrt_file.convert_to_parquet()
+
+
 def sort_mrt_files_by_ec_file_size(
     mrt_files: tuple[MRTFile, ...]
 ) -> tuple[MRTFile, ...]:
@@ -56,11 +124,88 @@ class MRTCollector:
         dl_time: datetime = datetime(2026, 2, 26, 0, 0, 0),
         cpus: int = cpu_count(),
         base_dir: Path | None = None,
+        rate_limiter: HostRateLimiter | None = None,
+        segmented_download_threshold: int = 0,
+        download_segments: int = 4,
+        stream_parse: bool = False,
+        keep_raw: bool = False,
+        download_workers: int | None = None,
+        parse_workers: int | None = None,
+        count_workers: int | None = None,
+        head_cache: HeadCache | None = None,
+        requests_cache_path: Path | None = None,
+        collector_registry: CollectorRegistry | None = None,
+        sharded_parse_threshold: int = 0,
+        parse_shards: int = 4,
+        memory_governor: MemoryGovernor | None = None,
+        parse_filter: ParseFilter | None = None,
+        parsed_compression: str = "",
+        parquet: bool = False,
+        parquet_workers: int | None = None,
     ) -> None:
-        """Creates directories"""
+        """Creates directories
+
+        Files at least segmented_download_threshold bytes large are downloaded
+        as download_segments parallel byte ranges (0 disables this). The
+        number of segments is capped by the rate limiter's max_connections.
+
+        With stream_parse, downloads are piped straight into the parser
+        instead of being written to raw_dir first (unless keep_raw is set,
+        in which case they're written to raw_dir as well)
+
+        When multiprocessing, each MRT moves through downloading, parsing and
+        counting independently, with the workers of each stage limited by
+        download_workers, parse_workers and count_workers (default cpus)
+
+        HEAD request results are cached in head_cache, which is shared across
+        runs for every date (defaults to the user's cache directory).
+        requests_cache_path defaults to requests_cache.db in base_dir.
+        Sources' collectors are cached (across runs) in collector_registry
+
+        When parsing with bgpkit_parser, files at least sharded_parse_threshold
+        bytes large are split into parse_shards shards that are parsed at
+        once (0 disables this), so that the largest files don't leave every
+        other core idle while they finish. Each shard takes up one of the
+        parse workers (or cpus), so sharded files don't oversubscribe the CPUs.
+
+        When multiprocessing, tasks only start when memory_governor expects
+        them to fit in memory (using the peak memory of previous runs)
+
+        With a parse_filter, only the rows and columns that it keeps are
+        written to the parsed PSVs (see ParseFilter)
+
+        parsed_compression ("gzip" or "zstd") compresses parsed PSVs as
+        they're written, to be read with psv_io.open_psv. Parsed files
+        aren't reparsed when it changes, so use a separate base_dir per
+        compression
+
+        With parquet, each parsed file is also converted into a Parquet file
+        in parquet_dir (see parquet_io, needs pyarrow), with at most
+        parquet_workers (default cpus) conversions at once
+        """
 
         self.dl_time: datetime = dl_time
         self.cpus: int = cpus
+        # Rate limits HEAD and GET requests separately for each host
+        self.rate_limiter: HostRateLimiter = rate_limiter or HostRateLimiter()
+        self.segmented_download_threshold: int = segmented_download_threshold
+        self.download_segments: int = download_segments
+        self.stream_parse: bool = stream_parse
+        self.keep_raw: bool = keep_raw
+        self.download_workers: int = download_workers or cpus
+        self.parse_workers: int = parse_workers or cpus
+        self.count_workers: int = count_workers or cpus
+        self.sharded_parse_threshold: int = sharded_parse_threshold
+        self.parse_shards: int = parse_shards
+        self.memory_governor: MemoryGovernor = memory_governor or MemoryGovernor()
+        self.parse_filter: ParseFilter | None = parse_filter
+        self.parsed_compression: str = parsed_compression
+        self.parquet: bool = parquet
+        self.parquet_workers: int = parquet_workers or cpus
+        self.head_cache: HeadCache = head_cache or HeadCache()
+        self.collector_registry: CollectorRegistry = (
+            collector_registry or CollectorRegistry(rate_limiter=self.rate_limiter)
+        )
 
         # Set base directory
         if base_dir is None:
@@ -69,17 +214,24 @@ class MRTCollector:
         else:
             self.base_dir = base_dir
 
+        self._requests_cache_path: Path = (
+            requests_cache_path or self.base_dir / "requests_cache.db"
+        )
+
         self._initialize_dirs()
+        # Records what has been done with each file, to skip it on reruns
+        self.manifest: Manifest = Manifest(self.manifest_path)
 
     def run(
         self,
         sources: tuple[Source, ...] = tuple([Cls() for Cls in Source.sources]),
         limit_files_to: int = 0,
         mrt_files: tuple[MRTFile, ...] = (),
+        parse_func: PARSE_FUNC = bgpkit_parser,
     ) -> tuple[MRTFile, ...]:
         """Downloads MRTs and then extracts data from them"""
 
-        mrt_files = mrt_files or self.get_mrt_files()
+        mrt_files = mrt_files or self.get_mrt_files(sources)
 
         # head_req_path = self.base_dir / "head_req" / "data.csv"
         if not self.head_req_path.exists():
@@ -93,22 +245,146 @@ class MRTCollector:
 
         if limit_files_to != 0:
             mrt_files = self.limit_mrt_files(mrt_files, limit_files_to)
-        self.download_raw_mrts(mrt_files)
-        mrt_files = self.strip_failed_downloads(mrt_files)
 
-        self.parse_mrts(mrt_files)
+        return self.process_mrt_files(mrt_files, parse_func)
+
+    def process_mrt_files(
+        self,
+        mrt_files: tuple[MRTFile, ...],
+        parse_func: PARSE_FUNC = bgpkit_parser,
+    ) -> tuple[MRTFile, ...]:
+        """Downloads, parses and counts the lines of MRTs with known sizes
+
+        Returns the MRTFiles that made it through every step
+        """
+
+        # Stages overlap when multiprocessing
+        if self.cpus > 1:
+            return Pipeline(
+                self.get_pipeline_stages(parse_func),
+                self.rate_limiter,
+                self.memory_governor,
+            ).run(mrt_files)
+
+        if self.stream_parse:
+            self.stream_parse_mrts(mrt_files)
+            # Files that failed to stream are downloaded then parsed instead
+            unstreamed = tuple([x for x in mrt_files if not x.parse_succeeded])
+            if unstreamed:
+                self.download_raw_mrts(unstreamed)
+                self.parse_mrts(
+                    self.strip_failed_downloads(unstreamed),
+                    parse_func,
+                    keep_raw=self.keep_raw,
+                )
+            mrt_files = self.strip_failed_parses(mrt_files)
+        else:
+            self.download_raw_mrts(mrt_files)
+            mrt_files = self.strip_failed_downloads(mrt_files)
+            self.parse_mrts(mrt_files, parse_func)
+
         self.count_parsed_lines(mrt_files)
+        if self.parquet:
+            self.convert_mrts_to_parquet(mrt_files)
+            mrt_files = tuple([x for x in mrt_files if x.parquet_path.exists()])
         return mrt_files
 
+    def get_pipeline_stages(
+        self, parse_func: PARSE_FUNC = bgpkit_parser
+    ) -> tuple[PipelineStage, ...]:
+        """Returns the stages that every MRTFile goes through, in order"""
+
+        count_stage = PipelineStage(
+            desc="Counting lines in MRTs",
+            func=count_parsed_lines,
+            workers=self.count_workers,
+            done=lambda x: x.parsed_lines_counted,
+            priority=lambda x: x.parsed_file_size,
+        )
+        final_stages: tuple[PipelineStage, ...] = (count_stage,)
+        if self.parquet:
+            parquet_stage = PipelineStage(
+                desc="Converting parsed MRTs to Parquet",
+                func=convert_to_parquet,
+                workers=self.parquet_workers,
+                done=lambda x: x.parquet_path.exists(),
+                priority=lambda x: x.parsed_file_size,
+            )
+            final_stages = (count_stage, parquet_stage)
+
+        # Streamed files are parsed without ever having a raw file
+        downloaded: Callable[[MRTFile], bool] = (
+            (lambda x: x.download_succeeded or x.parse_succeeded)
+            if self.stream_parse
+            else (lambda x: x.download_succeeded)
+        )
+        download_stage = PipelineStage(
+            desc="Downloading raw MRTs",
+            func=download_mrt,
+            workers=self.download_workers,
+            done=downloaded,
+            priority=lambda x: x.ec_file_size,
+            args=lambda x: (x, self.download_segments_for(x), self.segment_interval(x)),
+            rate_limited=True,
+            connections=self.download_segments_for,
+        )
+        parse_stage = PipelineStage(
+            desc="Parsing MRTs",
+            func=parse_mrt,
+            workers=self.parse_workers,
+            done=lambda x: x.parse_succeeded,
+            priority=lambda x: x.ac_file_size,
+            args=lambda x: (
+                x,
+                parse_func,
+                self.parse_shards_for(x, parse_func),
+                self.parse_filter,
+                # Raw files are only kept when streaming if keep_raw is set
+                self.keep_raw or not self.stream_parse,
+            ),
+            task_workers=lambda x: self.parse_shards_for(x, parse_func),
+        )
+        if self.stream_parse:
+            # Files that fail to stream are downloaded and parsed instead
+            stream_stage = PipelineStage(
+                desc="Streaming MRTs into parser",
+                func=stream_parse_mrt,
+                workers=self.download_workers,
+                done=lambda x: x.parse_succeeded,
+                priority=lambda x: x.ec_file_size,
+                args=lambda x: (x, self.keep_raw, self.parse_filter),
+                rate_limited=True,
+                optional=True,
+            )
+            return (stream_stage, download_stage, parse_stage, *final_stages)
+        return (download_stage, parse_stage, *final_stages)
+
     def get_mrt_files(
         self,
         sources: tuple[Source, ...] = tuple([Cls() for Cls in Source.sources]),
     ) -> tuple[MRTFile, ...]:
-        """Gets URLs from sources (cached) and returns MRT File objects"""
+        """Gets URLs from sources (cached) and returns MRT File objects
+
+        Sources are on different hosts, so they're queried concurrently
+        """
 
+        records = self.manifest.load()
         mrt_files = list()
-        for source in tqdm(sources, total=len(sources), desc=f"Getting URLs {sources}"):
-            for url in source.get_urls(self.dl_time, self.requests_cache_path):
+        with ThreadPoolExecutor(max_workers=len(sources) or 1) as executor:
+            futures = [
+                executor.submit(
+                    source.get_urls,
+                    self.dl_time,
+                    self.requests_cache_path,
+                    self.collector_registry,
+                )
+                for source in sources
+            ]
+            desc = f"Getting URLs {sources}"
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+                future.result()
+        for source, future in zip(sources, futures, strict=True):
+            for url in future.result():
                 mrt_files.append(
                     MRTFile(
                         url,
@@ -116,19 +392,93 @@ class MRTCollector:
                         raw_dir=self.raw_dir,
                         parsed_dir=self.parsed_dir,
                         parsed_line_count_dir=self.parsed_line_count_dir,
+                        manifest=self.manifest,
+                        record=records.get(url),
+                        parsed_compression=self.parsed_compression,
+                        parquet_dir=self.parquet_dir,
                     )
                 )
         return tuple(mrt_files)
 
     def set_mrt_ec_file_sizes(self, mrt_files: tuple[MRTFile, ...]) -> None:
-        """Gets the expected file size of each MRT"""
+        """Gets the expected file size of each MRT
+
+        Sizes come from the sources' directory listings where possible, and
+        from HEAD requests otherwise
+        """
+
+        mrt_files = self.set_mrt_ec_file_sizes_from_listings(mrt_files)
+        self.set_mrt_ec_file_sizes_from_head(mrt_files)
+
+    def set_mrt_ec_file_sizes_from_listings(
+        self, mrt_files: tuple[MRTFile, ...]
+    ) -> tuple[MRTFile, ...]:
+        """Sets expected file sizes from (cached) directory listings
+
+        Returns the MRTFiles whose sizes weren't in a listing
+        """
+
+        mrt_files_by_source: defaultdict[str, list[MRTFile]] = defaultdict(list)
+        for mrt_file in mrt_files:
+            mrt_files_by_source[repr(mrt_file.source)].append(mrt_file)
+
+        remaining = list()
+        desc = "Fetching MRT file sizes from directory listings"
+        # Sources are on different hosts, so they're fetched concurrently
+        with ThreadPoolExecutor(max_workers=len(mrt_files_by_source) or 1) as executor:
+            futures = {
+                executor.submit(
+                    source_mrt_files[0].source.get_ec_file_sizes,
+                    tuple([x.url for x in source_mrt_files]),
+                    self.requests_cache_path,
+                    self.rate_limiter,
+                ): source_mrt_files
+                for source_mrt_files in mrt_files_by_source.values()
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+                sizes = future.result()
+                for mrt_file in futures[future]:
+                    if mrt_file.url in sizes:
+                        mrt_file.set_ec_file_size(*sizes[mrt_file.url])
+                    else:
+                        remaining.append(mrt_file)
+        return tuple(remaining)
+
+    def set_mrt_ec_file_sizes_from_head(self, mrt_files: tuple[MRTFile, ...]) -> None:
+        """Gets the expected file size of each MRT with a HEAD request
+
+        Each host gets its own thread, so that hosts are queried concurrently
+        while the rate limiter keeps requests to any single host spaced out
+        """
 
         desc = "Fetching compressed MRT file sizes"
 
-        for mrt_file in tqdm(mrt_files, total=len(mrt_files), desc=desc):
-            mrt_file.fetch_ec_file_size()
-            # need minimum 3 sec delay between requests, otherwise rate limit exceeded
-            time.sleep(5)
+        mrt_files_by_host: defaultdict[str, list[MRTFile]] = defaultdict(list)
+        for mrt_file in mrt_files:
+            mrt_files_by_host[self.rate_limiter.host(mrt_file.url)].append(mrt_file)
+
+        with tqdm(total=len(mrt_files), desc=desc) as pbar:
+            max_workers = len(mrt_files_by_host) or 1
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._set_host_ec_file_sizes, host_mrt_files, pbar)
+                    for host_mrt_files in mrt_files_by_host.values()
+                ]
+                for future in as_completed(futures):
+                    future.result()
+
+    def _set_host_ec_file_sizes(self, mrt_files: list[MRTFile], pbar: tqdm) -> None:
+        """Gets the expected file sizes of MRTs that all share a single host
+
+        Fresh results from the head_cache are used without any request
+        """
+
+        for mrt_file in mrt_files:
+            if not mrt_file.load_ec_file_size(self.head_cache):
+                self.rate_limiter.acquire(mrt_file.url)
+                status_code = mrt_file.fetch_ec_file_size(self.head_cache)
+                self.rate_limiter.record(mrt_file.url, status_code)
+            pbar.update(1)
 
     def strip_unavail_sources(
         self,
@@ -170,6 +520,13 @@ class MRTCollector:
             [mrt_file for mrt_file in mrt_files if mrt_file.download_succeeded]
         )
 
+    def strip_failed_parses(
+        self, mrt_files: tuple[MRTFile, ...]
+    ) -> tuple[MRTFile, ...]:
+        """Removes any MRTFile that doesn't have a parsed file"""
+
+        return tuple([mrt_file for mrt_file in mrt_files if mrt_file.parse_succeeded])
+
     def download_raw_mrts(self, mrt_files: tuple[MRTFile, ...]) -> None:
         """Downloads raw MRT RIB dumps into raw_dir"""
 
@@ -181,9 +538,49 @@ class MRTCollector:
             print("Raw MRTs already downloaded!")
             return
 
-        args = tuple([(x,) for x in mrt_files])
+        args = tuple(
+            [
+                (x, segments, self.segment_interval(x))
+                for x, segments in zip(
+                    mrt_files, self.get_download_segments(mrt_files), strict=True
+                )
+            ]
+        )
         desc = self.download_raw_desc(mrt_files)
-        self.start_sp_or_mp_tqdm(args, download_mrt, desc=desc, use_delay=True, delay=5)
+        urls = tuple([x.url for x in mrt_files])
+        self.start_sp_or_mp_tqdm(
+            args,
+            download_mrt,
+            desc=desc,
+            rate_limited_urls=urls,
+            connections=tuple([x[1] for x in args]),
+        )
+
+    def get_download_segments(self, mrt_files: tuple[MRTFile, ...]) -> tuple[int, ...]:
+        """Returns the number of segments to download each MRT with
+
+        Only files over segmented_download_threshold are segmented, and never
+        into more segments than the connections allowed to a single host
+        """
+
+        return tuple([self.download_segments_for(x) for x in mrt_files])
+
+    def download_segments_for(self, mrt_file: MRTFile) -> int:
+        """Returns the number of segments to download an MRT with"""
+
+        if (
+            self.segmented_download_threshold
+            and mrt_file.ec_file_size >= self.segmented_download_threshold
+            # Segments need an exact size
+            and not mrt_file.ec_file_size_tolerance
+        ):
+            return min(self.download_segments, self.rate_limiter.max_connections)
+        return 1
+
+    def segment_interval(self, mrt_file: MRTFile) -> float:
+        """Seconds between opening the connections of a segmented download"""
+
+        return 1 / self.rate_limiter.rate(mrt_file.url)
 
     def download_raw_desc(self, mrt_files: tuple[MRTFile, ...]) -> str:
         """Returns a formatted description for tqdm bar
@@ -195,33 +592,84 @@ class MRTCollector:
 
         return f"Downloading raw MRTs ({gigabytes} total gigs, largest first)"
 
+    def stream_parse_mrts(self, mrt_files: tuple[MRTFile, ...]) -> None:
+        """Pipes raw MRT downloads straight into the parser
+
+        This overlaps parsing with downloading, and skips writing
+        (and then rereading) the raw dumps unless keep_raw is set
+        """
+
+        mrt_files = sort_mrt_files_by_ec_file_size(mrt_files)
+
+        already_parsed = all(mrt_file.parse_succeeded for mrt_file in mrt_files)
+
+        if already_parsed:
+            print("MRTs already parsed!")
+            return
+
+        args = tuple([(x, self.keep_raw, self.parse_filter) for x in mrt_files])
+        gigabytes = round(self.get_total_download_size(mrt_files) / 1e9, 2)
+        desc = f"Streaming MRTs into parser ({gigabytes} total gigs, largest first)"
+        urls = tuple([x.url for x in mrt_files])
+        self.start_sp_or_mp_tqdm(
+            args, stream_parse_mrt, desc=desc, rate_limited_urls=urls
+        )
+
     def parse_mrts(
-        self, mrt_files: tuple[MRTFile, ...], parse_func: PARSE_FUNC = bgpkit_parser
+        self,
+        mrt_files: tuple[MRTFile, ...],
+        parse_func: PARSE_FUNC = bgpkit_parser,
+        keep_raw: bool = True,
     ) -> None:
-        """Runs a tool to extract information from a dump"""
+        """Runs a tool to extract information from a dump
+
+        Without keep_raw, raw files are deleted once they're parsed
+        """
 
         mrt_files = sort_mrt_files_by_ac_file_size(mrt_files)
 
-        already_parsed = all(
-            mrt_file.parsed_path_psv.exists() for mrt_file in mrt_files
-        )
+        already_parsed = all(mrt_file.parse_succeeded for mrt_file in mrt_files)
 
         if already_parsed:
             print("Downloaded MRTs already parsed!")
             return
 
-        args = tuple([(x,) for x in mrt_files])
+        args = tuple(
+            [
+                (
+                    x,
+                    parse_func,
+                    self.parse_shards_for(x, parse_func),
+                    self.parse_filter,
+                    keep_raw,
+                )
+                for x in mrt_files
+            ]
+        )
         desc = "Parsing MRTs (largest first), ~13m"
-        self.start_sp_or_mp_tqdm(args, parse_func, desc)
+        shards = tuple([x[2] for x in args])
+        self.start_sp_or_mp_tqdm(args, parse_mrt, desc, task_workers=shards)
+
+    def parse_shards_for(self, mrt_file: MRTFile, parse_func: PARSE_FUNC) -> int:
+        """Returns the number of shards to parse an MRT in (1 if unsharded)
+
+        Only bgpkit_parser can parse shards
+        """
+
+        if (
+            parse_func is bgpkit_parser
+            and self.sharded_parse_threshold
+            and mrt_file.ac_file_size >= self.sharded_parse_threshold
+        ):
+            return self.parse_shards
+        return 1
 
     def count_parsed_lines(self, mrt_files: tuple[MRTFile, ...]) -> None:
         """Counts parsed lines from MRT files and stores them"""
 
         mrt_files = sort_mrt_files_by_parsed_file_size(mrt_files)
 
-        already_counted = all(
-            mrt_file.parsed_line_count_path.exists() for mrt_file in mrt_files
-        )
+        already_counted = all(mrt_file.parsed_lines_counted for mrt_file in mrt_files)
 
         if already_counted:
             print("Parsed MRTs already counted!")
@@ -231,63 +679,188 @@ class MRTCollector:
         desc = "Counting lines in MRTs (largest first), ~2m"
         self.start_sp_or_mp_tqdm(args, count_parsed_lines, desc)
 
+    def convert_mrts_to_parquet(self, mrt_files: tuple[MRTFile, ...]) -> None:
+        """Converts parsed MRTs into Parquet files"""
+
+        mrt_files = sort_mrt_files_by_parsed_file_size(mrt_files)
+
+        if all(x.parquet_path.exists() for x in mrt_files):
+            print("Parsed MRTs already converted to Parquet!")
+            return
+
+        args = tuple([(x,) for x in mrt_files])
+        desc = "Converting parsed MRTs to Parquet (largest first)"
+        self.start_sp_or_mp_tqdm(args, convert_to_parquet, desc)
+
     def start_sp_or_mp_tqdm(
         self,
         iterable: tuple[tuple[Any, ...], ...],
         func: Callable[..., Any],
         desc: str,
-        use_delay: bool = False,
-        delay: float = 3,  # minimum 3 seconds, otherwise exceeds rate limits
+        rate_limited_urls: tuple[str, ...] = (),
+        connections: tuple[int, ...] = (),
+        task_workers: tuple[int, ...] = (),
     ) -> None:
-        """Wrapper method for setting up mp or sp"""
+        """Wrapper method for setting up mp or sp
+
+        If rate_limited_urls is passed, it must contain the URL requested by
+        each task in iterable. Tasks are then only started once the rate
+        limiter has a token for their host, and func must return the status
+        code of the request so that the rate limiter can adjust.
+
+        connections optionally contains the number of connections that each
+        task opens to its host (defaults to 1 each), which are limited by
+        the rate limiter's max_connections
+
+        task_workers optionally contains the number of processes that each
+        task runs (defaults to 1 each), which count towards self.cpus
+        """
+
+        task_workers = task_workers or tuple([1 for _ in iterable])
+        assert len(task_workers) == len(iterable), "Need task_workers per task"
+        if rate_limited_urls:
+            assert len(rate_limited_urls) == len(iterable), "Need one URL per task"
+            connections = connections or tuple([1 for _ in iterable])
+            assert len(connections) == len(iterable), "Need connections per task"
 
         if self.cpus == 1:
-            self._sp_tqdm(iterable, func, desc, use_delay, delay)
+            self._sp_tqdm(iterable, func, desc, rate_limited_urls, connections)
         else:
-            self._mp_tqdm(iterable, func, desc, use_delay, delay)
+            self._mp_tqdm(
+                iterable, func, desc, rate_limited_urls, connections, task_workers
+            )
 
     def _sp_tqdm(
         self,
         iterable: tuple[tuple[Any, ...], ...],
         func: Callable[..., Any],
         desc: str,
-        use_delay: bool,
-        delay: float,
+        rate_limited_urls: tuple[str, ...],
+        connections: tuple[int, ...],
     ) -> None:
-        """Runs tqdm with singleprocessing. Use delay for http requests"""
+        """Runs tqdm with singleprocessing. Rate limits http requests by host"""
 
-        for args in tqdm(iterable, total=len(iterable), desc=desc):
-            func(*args)
-            if use_delay:
-                time.sleep(delay)
+        for i, args in tqdm(enumerate(iterable), total=len(iterable), desc=desc):
+            if rate_limited_urls:
+                self.rate_limiter.acquire(rate_limited_urls[i])
+                self.rate_limiter.reserve(rate_limited_urls[i], connections[i] - 1)
+                self.rate_limiter.record(rate_limited_urls[i], func(*args))
+            else:
+                func(*args)
 
     def _mp_tqdm(
         self,
         iterable: tuple[tuple[Any, ...], ...],
         func: Callable[..., Any],
         desc: str,
-        use_delay: bool,
-        delay: float,
+        rate_limited_urls: tuple[str, ...],
+        connections: tuple[int, ...],
+        task_workers: tuple[int, ...],
     ) -> None:
-        """Runs tqdm with multiprocessing. Use delay for http requests"""
+        """Runs tqdm with multiprocessing. Rate limits http requests by host
+
+        At most self.cpus tasks are in flight, so that a task starts (and
+        makes its request) when it is submitted, and tasks are only
+        submitted when the memory_governor admits them. Tasks that run
+        several processes (task_workers) count as that many tasks.
+
+        When rate limiting, tasks for a host whose bucket is empty (or that
+        is at max_connections) are skipped over in favor of tasks for other
+        hosts, rather than blocking everything behind them.
+        """
 
+        pending = deque(range(len(iterable)))
+        running: dict[Future[Any], int] = dict()
         with ProcessPoolExecutor(max_workers=self.cpus) as executor:
-            futures = []
             with tqdm(total=len(iterable), desc=desc) as pbar:
-                for x in iterable:
-                    futures.append(executor.submit(func, *x))
-                    if use_delay:
-                        time.sleep(delay)
-
-                    done = [f for f in futures if f.done()]
-                    for f in done:
-                        f.result()
-                        futures.remove(f)
+                while pending or running:
+                    timeout = self._submit_pending(
+                        executor,
+                        iterable,
+                        func,
+                        rate_limited_urls,
+                        connections,
+                        task_workers,
+                        pending,
+                        running,
+                    )
+                    done, _ = wait(
+                        running, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        i = running.pop(future)
+                        url = self._task_url(iterable, rate_limited_urls, i)
+                        try:
+                            result, peak_rss = future.result()
+                        except BaseException:
+                            self.memory_governor.release(i, func.__name__, url)
+                            raise
+                        self.memory_governor.release(i, func.__name__, url, peak_rss)
+                        if rate_limited_urls:
+                            self.rate_limiter.disconnect(url, connections[i])
+                            self.rate_limiter.record(url, result)
                         pbar.update(1)
 
-                for future in as_completed(futures):
-                    future.result()
-                    pbar.update(1)
+    def _submit_pending(
+        self,
+        executor: ProcessPoolExecutor,
+        iterable: tuple[tuple[Any, ...], ...],
+        func: Callable[..., Any],
+        urls: tuple[str, ...],
+        connections: tuple[int, ...],
+        task_workers: tuple[int, ...],
+        pending: deque[int],
+        running: dict[Future[Any], int],
+    ) -> float | None:
+        """Submits pending tasks (in order) that fit in memory and, when
+        rate limiting, whose hosts have tokens available
+
+        Returns how long to wait before trying to submit again, or None
+        to wait until a running task completes
+        """
+
+        timeout = None
+        blocked_hosts = set()
+        busy_workers = sum(task_workers[x] for x in running.values())
+        for i in tuple(pending):
+            if busy_workers >= self.cpus:
+                return timeout
+            # A task with more processes than cpus still runs on its own
+            if busy_workers and busy_workers + task_workers[i] > self.cpus:
+                return timeout
+            url = self._task_url(iterable, urls, i)
+            if not self.memory_governor.try_admit(
+                i, func.__name__, url, task_workers[i]
+            ):
+                # Memory frees up as tasks finish, but also as other programs do
+                return Pipeline.MEMORY_POLL_INTERVAL
+            if urls:
+                host = self.rate_limiter.host(url)
+                seconds_until_start = (
+                    None
+                    if host in blocked_hosts
+                    else self.rate_limiter.try_start(url, connections[i])
+                )
+                if seconds_until_start != 0:
+                    self.memory_governor.release(i, func.__name__, url)
+                    blocked_hosts.add(host)
+                    # None means waiting for a running task to finish
+                    if seconds_until_start is not None and (
+                        timeout is None or seconds_until_start < timeout
+                    ):
+                        timeout = seconds_until_start
+                    continue
+            pending.remove(i)
+            running[executor.submit(run_measured, func, *iterable[i])] = i
+            busy_workers += task_workers[i]
+        return timeout
+
+    def _task_url(
+        self, iterable: tuple[tuple[Any, ...], ...], urls: tuple[str, ...], i: int
+    ) -> str:
+        """Returns the URL that a task is for, to key its memory estimate"""
+
+        return urls[i] if urls else getattr(iterable[i][0], "url", "")
 
     ###############
     # Directories #
@@ -301,6 +874,7 @@ class MRTCollector:
             self.raw_dir,
             self.parsed_dir,
             self.parsed_line_count_dir,
+            *((self.parquet_dir,) if self.parquet else ()),
         ):
             dir_.mkdir(parents=True, exist_ok=True)
 
@@ -312,7 +886,7 @@ class MRTCollector:
         this directory is used
         """
 
-        return self.base_dir / "requests_cache.db"
+        return self._requests_cache_path
 
     @property
     def head_req_path(self) -> Path:
@@ -320,6 +894,12 @@ class MRTCollector:
 
         return self.base_dir / "head_req.json"
 
+    @property
+    def manifest_path(self) -> Path:
+        """Returns SQLite DB recording the size, mtime and stage of each file"""
+
+        return self.base_dir / "manifest.db"
+
     @property
     def raw_dir(self) -> Path:
         """Returns directory into which raw MRTs are downloaded"""
@@ -334,3 +914,8 @@ class MRTCollector:
     def parsed_line_count_dir(self) -> Path:
         """Directory in which MRTs are parsed using available tools"""
         return self.base_dir / "parsed_line_count"
+
+    @property
+    def parquet_dir(self) -> Path:
+        """Directory in which parsed MRTs are converted to Parquet"""
+        return self.base_dir / "parquet"
@@ -0,0 +1,414 @@
+"""Pure python decoder for MRT TABLE_DUMP_V2 RIB dumps (RFC 6396)
+
+Rows are decoded into the same columns (and formatting) as
+bgpkit-parser's --psv output, so that they can be written as PSV or used
+directly by analyzers (i.e. dict(zip(PSV_COLUMNS, row))) without a text
+round-trip. Records are decoded from memoryviews of the decompressed
+buffer, so fields are never copied out before being formatted (other than
+path attributes, which are copied once as the key of the attribute cache).
+"""
+
+import bz2
+import gzip
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+from socket import AF_INET, AF_INET6, inet_ntop
+from typing import BinaryIO
+
+PSV_COLUMNS: tuple[str, ...] = (
+    "type",
+    "timestamp",
+    "peer_ip",
+    "peer_asn",
+    "prefix",
+    "as_path",
+    "origin_asns",
+    "origin",
+    "next_hop",
+    "local_pref",
+    "med",
+    "communities",
+    "atomic",
+    "aggr_asn",
+    "aggr_ip",
+    "only_to_customer",
+)
+
+# MRT types
+TABLE_DUMP = 12
+TABLE_DUMP_V2 = 13
+# Extended timestamp types, which have microseconds before the message
+ET_TYPES = frozenset((17, 19, 21))
+
+# TABLE_DUMP_V2 subtypes
+PEER_INDEX_TABLE = 1
+RIB_IPV4_UNICAST = 2
+RIB_IPV6_UNICAST = 4
+RIB_IPV4_UNICAST_ADDPATH = 8
+RIB_IPV6_UNICAST_ADDPATH = 10
+RIB_SUBTYPES = {
+    RIB_IPV4_UNICAST: (AF_INET, False),
+    RIB_IPV6_UNICAST: (AF_INET6, False),
+    RIB_IPV4_UNICAST_ADDPATH: (AF_INET, True),
+    RIB_IPV6_UNICAST_ADDPATH: (AF_INET6, True),
+}
+
+# Path attribute types
+ORIGIN = 1
+AS_PATH = 2
+NEXT_HOP = 3
+MULTI_EXIT_DISC = 4
+LOCAL_PREF = 5
+ATOMIC_AGGREGATE = 6
+AGGREGATOR = 7
+COMMUNITIES = 8
+MP_REACH_NLRI = 14
+LARGE_COMMUNITIES = 32
+ONLY_TO_CUSTOMER = 35
+
+ORIGINS = ("IGP", "EGP", "INCOMPLETE")
+
+_HEADER = struct.Struct("!IHHI")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_LARGE_COMMUNITY = struct.Struct("!III")
+
+
+def open_mrt(path: Path) -> BinaryIO:
+    """Opens a (possibly gzip or bzip2 compressed) MRT file for reading"""
+
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")  # type: ignore[return-value]
+    elif path.suffix == ".bz2":
+        return bz2.open(path, "rb")  # type: ignore[return-value]
+    else:
+        return path.open("rb")
+
+
+def iter_mrt_records(
+    f: BinaryIO, chunk_size: int = 16 * 2**20
+) -> Iterator[tuple[int, int, int, memoryview]]:
+    """Yields (timestamp, type, subtype, message) for each MRT record
+
+    The decompressed stream is read chunk_size bytes at a time, and each
+    message is a memoryview into the current chunk. So a message is only
+    valid until the next one is yielded.
+    """
+
+    buf = b""
+    offset = 0
+    while True:
+        chunk = f.read(chunk_size)
+        # Only the partial record at the end of the last chunk is copied
+        buf = buf[offset:] + chunk
+        offset = 0
+        view = memoryview(buf)
+        end = len(buf)
+        while end - offset >= _HEADER.size:
+            timestamp, type_, subtype, length = _HEADER.unpack_from(buf, offset)
+            record_end = offset + _HEADER.size + length
+            if record_end > end:
+                break
+            start = offset + _HEADER.size
+            if type_ in ET_TYPES:
+                start += 4
+            yield timestamp, type_, subtype, view[start:record_end]
+            offset = record_end
+        if not chunk:
+            if offset != end:
+                raise ValueError(f"MRT ends with a truncated record of {end - offset}B")
+            return
+
+
+def split_mrt_records(
+    f: BinaryIO, shards: int
+) -> tuple[int, tuple[tuple[int, int], ...]]:
+    """Splits an uncompressed TABLE_DUMP_V2 dump into shards of whole records
+
+    Returns the end of the PEER_INDEX_TABLE (which must precede the
+    records of every shard for them to be decoded), and the (start, end)
+    byte range of each shard. Shards are roughly equal in size, and there
+    are fewer than requested if there are too few records.
+    """
+
+    f.seek(0, 2)
+    size = f.tell()
+    step = max(1, size // shards)
+    peer_index_end = shard_start = 0
+    target = step
+    ranges = list()
+    offset = 0
+    while offset < size:
+        f.seek(offset)
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            break
+        _, type_, subtype, length = _HEADER.unpack(header)
+        if type_ == TABLE_DUMP_V2 and subtype == PEER_INDEX_TABLE:
+            if offset != 0:
+                raise ValueError("PEER_INDEX_TABLE must be the first record")
+            peer_index_end = shard_start = _HEADER.size + length
+            step = max(1, (size - peer_index_end) // shards)
+            target = shard_start + step
+        elif offset >= target:
+            ranges.append((shard_start, offset))
+            shard_start = offset
+            target = shard_start + step
+        offset += _HEADER.size + length
+    if offset != size:
+        raise ValueError(f"MRT ends with a truncated record at {offset}B")
+    if size > shard_start:
+        ranges.append((shard_start, size))
+    return peer_index_end, tuple(ranges)
+
+
+class TableDumpV2Decoder:
+    """Decodes the RIB entries of a TABLE_DUMP_V2 dump into PSV rows
+
+    Each row is a tuple of strings, in the order of PSV_COLUMNS. RIB dumps
+    repeat the same path attributes for many prefixes, so decoded
+    attributes are cached by their raw bytes.
+    """
+
+    def __init__(self, attribute_cache_size: int = 2**16) -> None:
+        # (peer ip, peer asn) for each peer index
+        self.peers: list[tuple[str, str]] = list()
+        self.attribute_cache_size: int = attribute_cache_size
+        self._attribute_cache: dict[bytes, tuple[str, ...]] = dict()
+
+    def iter_rows(self, f: BinaryIO) -> Iterator[tuple[str, ...]]:
+        """Yields a row for every RIB entry in a decompressed MRT stream"""
+
+        for timestamp, type_, subtype, message in iter_mrt_records(f):
+            if type_ == TABLE_DUMP_V2:
+                if subtype == PEER_INDEX_TABLE:
+                    self.peers = self._decode_peer_index_table(message)
+                elif subtype in RIB_SUBTYPES:
+                    yield from self._decode_rib(str(timestamp), subtype, message)
+            elif type_ == TABLE_DUMP:
+                # Used by dumps from before ~2008
+                raise ValueError(
+                    f"TABLE_DUMP (v1) subtype {subtype} records aren't supported, "
+                    "use bgpkit_parser instead"
+                )
+
+    def _decode_peer_index_table(self, message: memoryview) -> list[tuple[str, str]]:
+        """Returns (peer ip, peer asn) for each peer in a PEER_INDEX_TABLE"""
+
+        # Skip the collector BGP ID, and then the view name
+        offset = 4
+        (view_name_length,) = _U16.unpack_from(message, offset)
+        offset += 2 + view_name_length
+        (peer_count,) = _U16.unpack_from(message, offset)
+        offset += 2
+
+        peers = list()
+        for _ in range(peer_count):
+            peer_type = message[offset]
+            # Skip the peer type and BGP ID
+            offset += 5
+            if peer_type & 1:
+                peer_ip = inet_ntop(AF_INET6, message[offset : offset + 16])
+                offset += 16
+            else:
+                peer_ip = inet_ntop(AF_INET, message[offset : offset + 4])
+                offset += 4
+            if peer_type & 2:
+                (peer_asn,) = _U32.unpack_from(message, offset)
+                offset += 4
+            else:
+                (peer_asn,) = _U16.unpack_from(message, offset)
+                offset += 2
+            peers.append((peer_ip, str(peer_asn)))
+        return peers
+
+    def _decode_rib(
+        self, timestamp: str, subtype: int, message: memoryview
+    ) -> Iterator[tuple[str, ...]]:
+        """Yields a row for each entry of a RIB_IPV4/IPV6_UNICAST record"""
+
+        family, add_path = RIB_SUBTYPES[subtype]
+        # Skip the sequence number
+        prefix_length = message[4]
+        prefix_bytes = (prefix_length + 7) // 8
+        offset = 5 + prefix_bytes
+        address_length = 4 if family == AF_INET else 16
+        address = bytes(message[5:offset]) + bytes(address_length - prefix_bytes)
+        prefix = f"{inet_ntop(family, address)}/{prefix_length}"
+
+        (entry_count,) = _U16.unpack_from(message, offset)
+        offset += 2
+        peers = self.peers
+        for _ in range(entry_count):
+            # Skip the originated time (and path ID, with ADD-PATH)
+            (peer_index,) = _U16.unpack_from(message, offset)
+            offset += 10 if add_path else 6
+            (attributes_length,) = _U16.unpack_from(message, offset)
+            offset += 2
+            attributes = self._decode_attributes(
+                message[offset : offset + attributes_length]
+            )
+            offset += attributes_length
+            peer_ip, peer_asn = peers[peer_index]
+            yield ("A", timestamp, peer_ip, peer_asn, prefix, *attributes)
+
+    def _decode_attributes(self, message: memoryview) -> tuple[str, ...]:
+        """Returns the PSV columns from as_path on for some path attributes
+
+        The key is a copy of the attributes, since a memoryview key would
+        keep its whole chunk of the MRT alive. Attributes are short, so the
+        copy is also cheaper than looking up the memoryview itself, which
+        CPython compares to keys element by element
+        """
+
+        key = bytes(message)
+        attributes = self._attribute_cache.get(key)
+        if attributes is None:
+            attributes = self._decode_uncached_attributes(message)
+            if len(self._attribute_cache) >= self.attribute_cache_size:
+                self._attribute_cache.clear()
+            self._attribute_cache[key] = attributes
+        return attributes
+
+    def _decode_uncached_attributes(self, message: memoryview) -> tuple[str, ...]:
+        as_path = origin_asns = origin = next_hop = local_pref = med = ""
+        communities = aggr_asn = aggr_ip = only_to_customer = ""
+        atomic = "false"
+
+        offset = 0
+        end = len(message)
+        while offset < end:
+            flags = message[offset]
+            type_ = message[offset + 1]
+            # Extended length flag
+            if flags & 0x10:
+                (length,) = _U16.unpack_from(message, offset + 2)
+                offset += 4
+            else:
+                length = message[offset + 2]
+                offset += 3
+            value = message[offset : offset + length]
+            offset += length
+
+            if type_ == ORIGIN:
+                origin = ORIGINS[value[0]] if value[0] < len(ORIGINS) else ""
+            elif type_ == AS_PATH:
+                as_path, origin_asns = _decode_as_path(value)
+            elif type_ == NEXT_HOP:
+                next_hop = inet_ntop(AF_INET, value)
+            elif type_ == MULTI_EXIT_DISC:
+                med = str(_U32.unpack_from(value)[0])
+            elif type_ == LOCAL_PREF:
+                local_pref = str(_U32.unpack_from(value)[0])
+            elif type_ == ATOMIC_AGGREGATE:
+                atomic = "true"
+            elif type_ == AGGREGATOR:
+                # RIB entries use 4 byte ASNs, but tolerate 2 byte ones
+                if length == 8:
+                    aggr_asn = str(_U32.unpack_from(value)[0])
+                else:
+                    aggr_asn = str(_U16.unpack_from(value)[0])
+                aggr_ip = inet_ntop(AF_INET, value[length - 4 :])
+            elif type_ == COMMUNITIES:
+                communities = _join(
+                    communities,
+                    " ".join(
+                        f"{x >> 16}:{x & 0xFFFF}" for (x,) in _U32.iter_unpack(value)
+                    ),
+                )
+            elif type_ == LARGE_COMMUNITIES:
+                communities = _join(
+                    communities,
+                    " ".join(
+                        f"lg:{a}:{b}:{c}"
+                        for a, b, c in _LARGE_COMMUNITY.iter_unpack(value)
+                    ),
+                )
+            elif type_ == MP_REACH_NLRI:
+                next_hop = _decode_mp_reach_next_hop(value)
+            elif type_ == ONLY_TO_CUSTOMER:
+                only_to_customer = str(_U32.unpack_from(value)[0])
+
+        return (
+            as_path,
+            origin_asns,
+            origin,
+            next_hop,
+            local_pref,
+            med,
+            communities,
+            atomic,
+            aggr_asn,
+            aggr_ip,
+            only_to_customer,
+        )
+
+
+def _decode_as_path(value: memoryview) -> tuple[str, str]:
+    """Returns (as_path, origin_asns) from a 4 byte AS_PATH attribute
+
+    AS_SETs are formatted as {1,2} and confederation segments as (1 2)
+    and [1,2], as bgpkit-parser does
+    """
+
+    segments = list()
+    origin_asns = ""
+    offset = 0
+    end = len(value)
+    while offset < end:
+        segment_type = value[offset]
+        count = value[offset + 1]
+        offset += 2
+        asns = struct.unpack_from(f"!{count}I", value, offset)
+        offset += 4 * count
+        if segment_type == 2:
+            segments.append(" ".join(map(str, asns)))
+            origin_asns = str(asns[-1]) if asns else origin_asns
+        elif segment_type == 1:
+            segments.append("{" + ",".join(map(str, asns)) + "}")
+            origin_asns = " ".join(map(str, asns))
+        elif segment_type == 3:
+            segments.append("(" + " ".join(map(str, asns)) + ")")
+        else:
+            segments.append("[" + ",".join(map(str, asns)) + "]")
+    return " ".join(segments), origin_asns
+
+
+def _decode_mp_reach_next_hop(value: memoryview) -> str:
+    """Returns the next hop of an MP_REACH_NLRI attribute
+
+    RIB entries use an abbreviated form with just the next hop length and
+    next hop, but some dumps include the AFI and SAFI as well
+    """
+
+    next_hop_length = value[0]
+    offset = 1
+    if next_hop_length + 1 != len(value):
+        next_hop_length = value[3]
+        offset = 4
+    # A link local address may follow the global one
+    if next_hop_length >= 16:
+        return inet_ntop(AF_INET6, value[offset : offset + 16])
+    elif next_hop_length == 4:
+        return inet_ntop(AF_INET, value[offset : offset + 4])
+    else:
+        return ""
+
+
+def _join(a: str, b: str) -> str:
+    return f"{a} {b}" if a and b else a or b
+
+
+def iter_mrt_rows(path: Path) -> Iterator[tuple[str, ...]]:
+    """Yields a PSV row (in the order of PSV_COLUMNS) per RIB entry of an MRT"""
+
+    with open_mrt(path) as f:
+        yield from TableDumpV2Decoder().iter_rows(f)
+
+
+def iter_mrt_dicts(path: Path) -> Iterator[dict[str, str]]:
+    """Yields rows like csv.DictReader does on a parsed PSV, straight from an MRT"""
+
+    for row in iter_mrt_rows(path):
+        yield dict(zip(PSV_COLUMNS, row, strict=True))
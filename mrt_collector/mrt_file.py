@@ -1,17 +1,33 @@
+import json
 import os
-import shutil
+import threading
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from itertools import pairwise
 from pathlib import Path
-from subprocess import check_output
+from typing import Any, BinaryIO
 from urllib.parse import quote
 
 import requests
 
-from .retry_session import RetrySession
+from .download_client import get_download_client
+from .head_cache import HeadCache, HeadResult
+from .manifest import FileRecord, Manifest
+from .parquet_io import psv_to_parquet
+from .psv_index import PSVIndex, psv_index_path
+from .psv_io import PSV_SUFFIXES, count_lines
+from .rate_limiter import exception_status_code, response_status_code
 from .sources import Source
 
 
 class MRTFile:
+    # Bytes read from the response at a time
+    DOWNLOAD_CHUNK_SIZE: int = 2**20
+    # Bytes written between persisting download progress
+    DOWNLOAD_PROGRESS_INTERVAL: int = 16 * 2**20
+
     def __init__(
         self,
         url: str,
@@ -21,74 +37,548 @@ class MRTFile:
         parsed_line_count_dir: Path,
         expected_compressed_file_size: int = 0,
         status: str = "unknown",
+        manifest: Manifest | None = None,
+        record: FileRecord | None = None,
+        parsed_compression: str = "",
+        parquet_dir: Path | None = None,
     ) -> None:
+        assert parsed_compression in PSV_SUFFIXES, (
+            f"Unknown compression {parsed_compression}"
+        )
+
         self.url: str = url
         self.source: Source = source
         self.raw_path: Path = raw_dir / self._url_to_fname(self.url)
-        self.parsed_path_psv: Path = parsed_dir / self._url_to_fname(
-            self.url, ext="psv"
+        # Tracks how much of raw_path has been safely written, for resuming
+        self.download_progress_path: Path = raw_dir / (self.raw_path.name + ".progress")
+        # Parsed files may be compressed (i.e. .psv.zst), see psv_io
+        self.parsed_path_psv: Path = parsed_dir / (
+            self._url_to_fname(self.url, ext="psv") + PSV_SUFFIXES[parsed_compression]
+        )
+        # Row counts and offsets of the parsed file, written while parsing
+        self.psv_index_path: Path = psv_index_path(self.parsed_path_psv)
+        # Columnar copy of the parsed file, see parquet_io
+        self.parquet_path: Path = (parquet_dir or parsed_dir) / self._url_to_fname(
+            self.url, ext="parquet"
         )
         self.parsed_line_count_path: Path = parsed_line_count_dir / self._url_to_fname(
             self.url, ext="txt"
         )
         self._ec_file_size: int = expected_compressed_file_size
+        # Sizes from directory listings are approximate (i.e. 98M), so the
+        # actual size may be off by this many bytes until we learn the exact
+        # size from the download itself
+        self.ec_file_size_tolerance: int = 0
+        # What has been done with this file, persisted in the manifest
+        self.manifest: Manifest | None = manifest
+        self.record: FileRecord = record or FileRecord(url)
+
+    def fetch_ec_file_size(self, head_cache: HeadCache | None = None) -> int:
+        """Tries to set expected_file_size with a HEAD request
+
+        With a head_cache, a previously cached result is revalidated with a
+        conditional request (reused on a 304), and the result is saved
+        to the cache as soon as the request completes.
+
+        Returns the status code of the request (0 if no response), which is
+        used by the HostRateLimiter to back off when a host is throttling us
+        """
 
-    def fetch_ec_file_size(
-        self,
-    ) -> None:
-        """Tries to set expected_file_size with a HEAD request"""
-
+        cached = head_cache.get(self.url) if head_cache is not None else None
+        headers = (
+            cached.conditional_headers if cached and cached.status == 200 else dict()
+        )
         try:
-            with RetrySession() as session:
-                with session.head(self.url, timeout=60) as r:
-                    status_code = r.status_code
-                    if status_code == 200:
-                        self._ec_file_size = int(r.headers.get("Content-Length", 0))
-                        self.status = "Ready for download"
-                        return
+            with get_download_client().head(self.url, timeout=60, headers=headers) as r:
+                if r.status_code == 304 and cached is not None:
+                    result = replace(cached, checked_at=time.time())
+                else:
+                    result = HeadResult(
+                        self.url,
+                        size=int(r.headers.get("Content-Length", 0))
+                        if r.status_code == 200
+                        else 0,
+                        status=r.status_code,
+                        etag=r.headers.get("ETag", ""),
+                        last_modified=r.headers.get("Last-Modified", ""),
+                    )
+                self.set_ec_file_size_from_head(result)
+                self._cache_head_result(head_cache, result)
+                return response_status_code(r)
         except Exception as e:  # noqa
             print(f"URL {self.url} : Head Request failed due to {e} {type(e)}")
+            status_code = exception_status_code(e)
+            self._cache_head_result(
+                head_cache, HeadResult(self.url, status=status_code)
+            )
+            return status_code
 
-    def download_raw(self, retries: int = 3) -> None:
-        """Downloads the raw file if you haven't already"""
+    def load_ec_file_size(self, head_cache: HeadCache) -> bool:
+        """Sets expected_file_size from a fresh cached HEAD result
 
-        if self.download_succeeded:
+        Returns True if there was one (so no request is needed)
+        """
+
+        result = head_cache.get(self.url)
+        if result is None or not head_cache.is_fresh(result):
+            return False
+        self.set_ec_file_size_from_head(result)
+        return True
+
+    def set_ec_file_size_from_head(self, result: HeadResult) -> None:
+        """Sets expected_file_size from a successful HEAD result"""
+
+        if result.status == 200:
+            self.set_ec_file_size(result.size)
+            self.status = "Ready for download"
+
+    def _cache_head_result(
+        self, head_cache: HeadCache | None, result: HeadResult
+    ) -> None:
+        """Saves a HEAD result, unless it was a failure that may be transient
+
+        Missing files (i.e. 404s) are cached too, so that they aren't
+        requested again until the result expires
+        """
+
+        if head_cache is None:
             return
+        if result.status == 200 or result.status in (403, 404, 410):
+            head_cache.save(result)
+
+    def download_raw(
+        self, retries: int = 3, segments: int = 1, segment_interval: float = 0
+    ) -> int:
+        """Downloads the raw file if you haven't already
+
+        Partial downloads are kept (along with their progress file) so that
+        the next attempt, even from a new process, resumes where it left off.
+
+        If segments > 1, the file is downloaded as that many byte ranges in
+        parallel, with connections opened segment_interval seconds apart.
+        If the server doesn't honor the ranges, this falls back to a single
+        connection.
+
+        Returns the status code of the last request (0 if no request was made),
+        so that the HostRateLimiter can back off when a host is throttling us
+        """
+
+        if self.download_succeeded:
+            return 0
 
         # I tried using proper backoff strategies, such as:
         # https://stackoverflow.com/a/35504626/8903959
         # But this actually doesn't capture incomplete read
         # errors in URL lib. So I need to write my own.
+        # Segments need the exact size, which we only have from a HEAD request
+        if self.ec_file_size_tolerance:
+            segments = 1
+
         succeeded = False
-        for i in range(retries):
-            try:
-                succeeded = self.attempt_download_raw()
-                if succeeded:
-                    break
-            except Exception as e:  # noqa
-                if i == retries - 1:
-                    raise
-            time.sleep((i + 1) * 10)
-
-        if not succeeded and self.raw_path.exists():
-            self.raw_path.unlink(missing_ok=True)
+        status_code = 0
+        try:
+            for i in range(retries):
+                try:
+                    if segments > 1:
+                        succeeded, status_code = self.attempt_download_raw_segmented(
+                            segments, segment_interval
+                        )
+                        # Server doesn't support ranges, use a single connection
+                        if status_code == 200:
+                            segments = 1
+                    else:
+                        succeeded, status_code = self.attempt_download_raw()
+                    if succeeded:
+                        break
+                except Exception as e:
+                    if i == retries - 1:
+                        raise
+                    status_code = exception_status_code(e)
+                time.sleep((i + 1) * 10)
+        finally:
+            # Without a progress file, a partial download can't be resumed
+            if not succeeded and not self.download_progress_path.exists():
+                self.raw_path.unlink(missing_ok=True)
+
+        return status_code
+
+    def attempt_download_raw(self) -> tuple[bool, int]:
+        """Attempts to download the raw MRT file, resuming a partial download
+
+        Returns whether the download succeeded along with the status code
+        """
 
-    def attempt_download_raw(self) -> bool:
-        """Attempts to download the raw MRT file"""
+        progress = self._load_download_progress()
+        headers = dict()
+        if progress["bytes"]:
+            headers["Range"] = f"bytes={progress['bytes']}-"
+            # If the file changed on the server, this gets us the whole new file
+            # rather than splicing two different files together
+            validator = progress["etag"] or progress["last_modified"]
+            if validator:
+                headers["If-Range"] = validator
 
         try:
-            with requests.get(self.url, stream=True, timeout=60) as r:
+            with get_download_client().get(
+                self.url, stream=True, timeout=60, headers=headers
+            ) as r:
                 status_code = r.status_code
+                if status_code == 416:
+                    # Range wasn't satisfiable, start over from scratch
+                    self._remove_download_progress()
+                    return False, status_code
                 r.raise_for_status()
-                if status_code == 200:
-                    with self.raw_path.open("wb") as f:
-                        shutil.copyfileobj(r.raw, f)
-                    return self.download_succeeded
+                if status_code == 206 and not self._valid_content_range(
+                    r, progress["bytes"]
+                ):
+                    self._remove_download_progress()
+                    return False, status_code
+                if status_code in (200, 206):
+                    self._write_download(r, progress)
+                    return self.download_succeeded, status_code
         except Exception as e:
             print(f"URL {self.url} failed due to {e} {type(e)}")
             raise
 
-        return False
+        return False, status_code
+
+    def attempt_download_raw_segmented(
+        self, segments: int, segment_interval: float = 0
+    ) -> tuple[bool, int]:
+        """Attempts to download the raw MRT file as parallel byte ranges
+
+        raw_path is preallocated to ec_file_size and each segment writes into
+        its own range, so there is nothing to stitch together afterwards.
+        Progress of each segment is persisted, so this resumes like
+        attempt_download_raw. The file is verified against ec_file_size.
+
+        Returns whether the download succeeded along with the worst status
+        code (200 if the server ignored a Range header)
+        """
+
+        progress = self._load_download_progress()
+        if "segments" not in progress:
+            progress["segments"] = self._split_into_segments(
+                progress["bytes"], segments
+            )
+        # Save progress before creating the file so that a partial file
+        # never exists without a progress file describing it
+        self._save_download_progress(progress)
+        with self.raw_path.open("r+b" if self.raw_path.exists() else "wb") as f:
+            f.truncate(self.ec_file_size)
+
+        lock = threading.Lock()
+        incomplete = [x for x in progress["segments"] if x[2] < x[1] - x[0]]
+        status_codes = [206]
+        with ThreadPoolExecutor(max_workers=len(incomplete) or 1) as executor:
+            futures = [
+                executor.submit(
+                    self._download_segment,
+                    segment,
+                    progress,
+                    lock,
+                    i * segment_interval,
+                )
+                for i, segment in enumerate(incomplete)
+            ]
+            errors = list()
+            for future in as_completed(futures):
+                try:
+                    status_codes.append(future.result())
+                except Exception as e:  # noqa: BLE001
+                    errors.append(e)
+
+        if 200 in status_codes:
+            # Ranges not supported (or the file changed), can't resume these.
+            # The preallocated file is full size, so without its progress
+            # file it would pass for a finished download
+            self.raw_path.unlink(missing_ok=True)
+            self._remove_download_progress()
+            return False, 200
+
+        with lock:
+            self._save_download_progress(progress)
+        if errors:
+            print(f"URL {self.url} segment failed due to {errors[0]} {type(errors[0])}")
+            raise errors[0]
+
+        done = all(x[2] == x[1] - x[0] for x in progress["segments"])
+        if done and self.raw_path.stat().st_size == self.ec_file_size:
+            self._remove_download_progress()
+            # Segments are written out of order, so there is no checksum
+            self._record_download()
+        return self.download_succeeded, max(status_codes)
+
+    def _split_into_segments(self, offset: int, segments: int) -> list[list[int]]:
+        """Splits the file into [start, end, done] segments
+
+        Everything before offset has already been downloaded
+        """
+
+        boundaries = [0, offset] if offset else [0]
+        remaining = self.ec_file_size - offset
+        boundaries.extend(
+            offset + remaining * i // segments for i in range(1, segments + 1)
+        )
+        return [
+            [start, end, end - start if end <= offset else 0]
+            for start, end in pairwise(boundaries)
+            if end > start
+        ]
+
+    def _download_segment(
+        self,
+        segment: list[int],
+        progress: dict[str, Any],
+        lock: threading.Lock,
+        delay: float,
+    ) -> int:
+        """Downloads the rest of one segment into its range of raw_path
+
+        Returns the status code of the request
+        """
+
+        time.sleep(delay)
+        start, end, done = segment
+        headers = {"Range": f"bytes={start + done}-{end - 1}"}
+        with lock:
+            validator = progress["etag"] or progress["last_modified"]
+        if validator:
+            headers["If-Range"] = validator
+
+        with get_download_client().get(
+            self.url, stream=True, timeout=60, headers=headers
+        ) as r:
+            r.raise_for_status()
+            if r.status_code != 206 or not self._valid_content_range(r, start + done):
+                return 200
+            with lock:
+                # Every segment must come from the same version of the file
+                etag = r.headers.get("ETag", "")
+                if progress["etag"] and etag and etag != progress["etag"]:
+                    return 200
+                progress["etag"] = progress["etag"] or etag
+                progress["last_modified"] = progress["last_modified"] or (
+                    r.headers.get("Last-Modified", "")
+                )
+
+            with self.raw_path.open("r+b") as f:
+                f.seek(start + done)
+                unsaved_bytes = 0
+                for chunk in r.raw.stream(
+                    self.DOWNLOAD_CHUNK_SIZE, decode_content=False
+                ):
+                    # Never write past the end of this segment
+                    remaining = end - start - segment[2] - unsaved_bytes
+                    chunk = chunk[:remaining]  # noqa: PLW2901
+                    f.write(chunk)
+                    unsaved_bytes += len(chunk)
+                    if unsaved_bytes >= self.DOWNLOAD_PROGRESS_INTERVAL:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        with lock:
+                            segment[2] += unsaved_bytes
+                            progress["bytes"] = self._contiguous_bytes(
+                                progress["segments"]
+                            )
+                            self._save_download_progress(progress)
+                        unsaved_bytes = 0
+                f.flush()
+                os.fsync(f.fileno())
+                with lock:
+                    segment[2] += unsaved_bytes
+                    progress["bytes"] = self._contiguous_bytes(progress["segments"])
+        return r.status_code
+
+    def stream_raw(self, sink: BinaryIO, keep_raw: bool = False) -> tuple[bool, int]:
+        """Streams the raw MRT file into sink, i.e. a parser's input pipe
+
+        Since the parser needs the whole file, this never resumes. With
+        keep_raw, the file is also written to raw_path (resumable later on
+        by download_raw if the stream fails partway through)
+
+        Returns whether the full file was streamed along with the status code
+        """
+
+        with get_download_client().get(self.url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            if keep_raw:
+                progress = self._new_download_progress()
+                self._write_download(r, progress, tee=sink)
+                return self.download_succeeded, r.status_code
+
+            self._adopt_content_length(r)
+            streamed_bytes = 0
+            for chunk in r.raw.stream(self.DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                sink.write(chunk)
+                streamed_bytes += len(chunk)
+            return self._matches_ec_file_size(streamed_bytes), r.status_code
+
+    def _write_download(
+        self,
+        response: requests.Response,
+        progress: dict[str, Any],
+        tee: BinaryIO | None = None,
+    ) -> None:
+        """Writes a 200 or (validated) 206 response into raw_path
+
+        Progress is persisted every DOWNLOAD_PROGRESS_INTERVAL bytes.
+        Every chunk is also written to tee, if passed
+        """
+
+        if response.status_code == 206:
+            mode = "r+b"
+        else:
+            # Full body, so discard whatever we had before
+            self._adopt_content_length(response)
+            progress["bytes"] = 0
+            progress["crc32"] = 0
+            mode = "wb"
+        progress["ec_file_size"] = self.ec_file_size
+        progress["etag"] = response.headers.get("ETag", "")
+        progress["last_modified"] = response.headers.get("Last-Modified", "")
+        # Segments are replaced by the contiguous bytes from the start
+        progress.pop("segments", None)
+        # Save progress before creating the file so that a partial file
+        # never exists without a progress file describing it
+        self._save_download_progress(progress)
+
+        with self.raw_path.open(mode) as f:
+            f.seek(progress["bytes"])
+            f.truncate()
+            unsaved_bytes = 0
+            # decode_content=False so that gzip transfer encodings aren't undone
+            for chunk in response.raw.stream(
+                self.DOWNLOAD_CHUNK_SIZE, decode_content=False
+            ):
+                f.write(chunk)
+                if tee is not None:
+                    tee.write(chunk)
+                if progress["crc32"] is not None:
+                    progress["crc32"] = zlib.crc32(chunk, progress["crc32"])
+                progress["bytes"] += len(chunk)
+                unsaved_bytes += len(chunk)
+                if unsaved_bytes >= self.DOWNLOAD_PROGRESS_INTERVAL:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._save_download_progress(progress)
+                    unsaved_bytes = 0
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._matches_ec_file_size(progress["bytes"]):
+            self._remove_download_progress()
+            if progress["crc32"] is not None:
+                self._record_download(f"crc32:{progress['crc32']:08x}")
+        else:
+            self._save_download_progress(progress)
+
+    def _valid_content_range(self, response: requests.Response, offset: int) -> bool:
+        """Returns True if a 206 response continues the file from offset"""
+
+        # Format is bytes start-end/total
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            unit, byte_range = content_range.split(" ", 1)
+            start_end, total = byte_range.split("/", 1)
+            start = int(start_end.split("-", 1)[0])
+        except ValueError:
+            return False
+        if unit != "bytes" or start != offset:
+            return False
+        return total == "*" or self._adopt_exact_ec_file_size(int(total))
+
+    def _load_download_progress(self) -> dict[str, Any]:
+        """Returns persisted download progress, validated against raw_path
+
+        Resuming is only done when the progress file matches this URL and
+        ec_file_size. Bytes past the last persisted checkpoint are discarded,
+        since they may not have been flushed to disk before a crash.
+
+        Segmented downloads also store a "segments" list of [start, end, done]
+        byte counts. "bytes" is always the contiguous prefix that is done,
+        so sequential downloads can resume from segmented ones.
+
+        "crc32" is the running checksum of the first "bytes" bytes, or None
+        if it's unknown (i.e. segmented downloads)
+        """
+
+        progress = self._new_download_progress()
+        if not self.download_progress_path.exists() or not self.raw_path.exists():
+            return progress
+
+        try:
+            with self.download_progress_path.open() as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return progress
+
+        # A download that started from an approximate size knows the exact one
+        if saved.get("url") != self.url or not self._adopt_exact_ec_file_size(
+            saved.get("ec_file_size", 0)
+        ):
+            return progress
+        progress["ec_file_size"] = self.ec_file_size
+
+        progress["etag"] = saved.get("etag", "")
+        progress["last_modified"] = saved.get("last_modified", "")
+        segments = saved.get("segments")
+        if segments and self._valid_segments(segments):
+            progress["segments"] = segments
+            progress["bytes"] = self._contiguous_bytes(segments)
+            progress["crc32"] = None
+        elif 0 < saved.get("bytes", 0) < self.ec_file_size:
+            progress["bytes"] = min(saved["bytes"], self.raw_path.stat().st_size)
+            # The checksum only covers the bytes from the checkpoint
+            if progress["bytes"] == saved["bytes"]:
+                progress["crc32"] = saved.get("crc32")
+            else:
+                progress["crc32"] = None
+        return progress
+
+    def _new_download_progress(self) -> dict[str, Any]:
+        """Returns progress for a download that is starting from scratch"""
+
+        return {
+            "url": self.url,
+            "ec_file_size": self.ec_file_size,
+            "bytes": 0,
+            "etag": "",
+            "last_modified": "",
+            "crc32": 0,
+        }
+
+    def _valid_segments(self, segments: list[list[int]]) -> bool:
+        """Returns True if segments exactly tile the expected file"""
+
+        expected_start = 0
+        for start, end, done in segments:
+            if start != expected_start or end <= start or not 0 <= done <= end - start:
+                return False
+            expected_start = end
+        return expected_start == self.ec_file_size
+
+    @staticmethod
+    def _contiguous_bytes(segments: list[list[int]]) -> int:
+        """Returns the number of bytes done from the start of the file"""
+
+        total = 0
+        for start, end, done in segments:
+            total += done
+            if done < end - start:
+                break
+        return total
+
+    def _save_download_progress(self, progress: dict[str, Any]) -> None:
+        """Atomically writes download progress next to raw_path"""
+
+        tmp_path = self.download_progress_path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            json.dump(progress, f)
+        tmp_path.replace(self.download_progress_path)
+
+    def _remove_download_progress(self) -> None:
+        self.download_progress_path.unlink(missing_ok=True)
 
     def validate_file_size(self) -> bool:
         """Returns true if expected_file_size is equal to actual file size.
@@ -102,9 +592,36 @@ class MRTFile:
             print("houston we have a file size")
             raise NotImplementedError("Expected cmprsd size 0 at " + str(self.raw_path))
 
-        result = actual_file_size == self._ec_file_size
+        result = self._matches_ec_file_size(actual_file_size)
         return result
 
+    def set_ec_file_size(self, ec_file_size: int, tolerance: int = 0) -> None:
+        """Sets the expected compressed file size, and how approximate it is"""
+
+        self._ec_file_size = ec_file_size
+        self.ec_file_size_tolerance = tolerance
+
+    def _matches_ec_file_size(self, size: int) -> bool:
+        return abs(size - self.ec_file_size) <= self.ec_file_size_tolerance
+
+    def _adopt_exact_ec_file_size(self, size: int) -> bool:
+        """Replaces an approximate expected size with an exact one
+
+        Returns False (changing nothing) if size isn't within the tolerance
+        """
+
+        if not self._matches_ec_file_size(size):
+            return False
+        self.set_ec_file_size(size)
+        return True
+
+    def _adopt_content_length(self, response: requests.Response) -> None:
+        """Adopts the exact size from a full (200) response, if we lack it"""
+
+        content_length = response.headers.get("Content-Length")
+        if self.ec_file_size_tolerance and content_length:
+            self._adopt_exact_ec_file_size(int(content_length))
+
     def _url_to_fname(self, url: str, ext: str = "") -> str:
         """Converts a URL into a file name"""
 
@@ -118,31 +635,86 @@ class MRTFile:
         return fname
 
     def count_parsed_lines(self) -> int:
-        if not self.parsed_path_psv.exists():
+        if self.record.line_count >= 0:
+            return self.record.line_count
+        if not self.parse_succeeded:
             return 0
         if self.parsed_line_count_path.exists():
             with self.parsed_line_count_path.open() as f:
-                return int(f.read())
-
-        # use single quotes for the string to resolve an
-        # issue with my (Satchel) external hard drive
-        # theres a space in the drive name so without
-        # the quotes shell will treat the path as
-        # two separate args
-        command = f'wc -l "{self.parsed_path_psv}"'
-        # Run the command
-        result = check_output(  # noqa
-            command,
-            shell=True,
-        ).decode()
-
-        count = int(result.split()[0])
+                return self._record_line_count(int(f.read()))
+        # Counted while parsing, so there's no need to reread the PSV
+        if self.psv_index_path.exists():
+            return self._record_line_count(PSVIndex.load(self.psv_index_path).rows)
+
+        # Reads compressed PSVs too, unlike wc -l
+        count = count_lines(self.parsed_path_psv)
 
         with self.parsed_line_count_path.open("w") as f:
             # Remove header
             count -= 1
             f.write(str(count))
-            return int(count)
+        return self._record_line_count(count)
+
+    def convert_to_parquet(self) -> None:
+        """Converts the parsed file into parquet_path, unless already done"""
+
+        if not self.parquet_path.exists():
+            psv_to_parquet(self.parsed_path_psv, self.parquet_path)
+
+    ############
+    # Manifest #
+    ############
+
+    def _refresh_record(self) -> None:
+        """Reloads the record from the manifest, i.e. after a worker updated it"""
+
+        if self.manifest is not None:
+            self.record = self.manifest.get(self.url) or self.record
+
+    def _save_record(self) -> None:
+        if self.manifest is not None:
+            self.manifest.save(self.record)
+
+    def _record_download(self, checksum: str = "") -> None:
+        stat_info = self.raw_path.stat()
+        self.record.raw_size = stat_info.st_size
+        self.record.raw_mtime = stat_info.st_mtime
+        self.record.raw_checksum = checksum
+        self._save_record()
+
+    def _record_parse(self) -> None:
+        stat_info = self.parsed_path_psv.stat()
+        self.record.parsed_size = stat_info.st_size
+        self.record.parsed_mtime = stat_info.st_mtime
+        self._save_record()
+
+    def _record_line_count(self, count: int) -> int:
+        self.record.line_count = count
+        self._save_record()
+        return count
+
+    def _drop_download_record(self) -> None:
+        self.record.raw_size = 0
+        self.record.raw_mtime = 0
+        self.record.raw_checksum = ""
+        self._save_record()
+
+    def _drop_parse_record(self) -> None:
+        # The line count was of the old parsed file
+        self.record.parsed_size = 0
+        self.record.parsed_mtime = 0
+        self.record.line_count = -1
+        self._save_record()
+
+    @staticmethod
+    def _stat_matches(path: Path, size: int, mtime: float) -> bool:
+        """Returns True if path still has the size and mtime it was recorded with"""
+
+        try:
+            stat_info = path.stat()
+        except FileNotFoundError:
+            return False
+        return stat_info.st_size == size and stat_info.st_mtime == mtime
 
     def __str__(self) -> str:
         """Temporary str override for debugging issues with sources"""
@@ -159,12 +731,71 @@ class MRTFile:
 
     @property
     def download_succeeded(self) -> bool:
-        """Returns true if the raw file exists and matches the expected size"""
+        """Returns true if the raw file exists and matches the expected size
 
-        if not self.raw_path.exists():
+        If the manifest has a record of the download, the file only needs a
+        stat to check that it wasn't deleted or modified since. Otherwise
+        the record is dropped and the file is checked as if it were new
+        """
+
+        if not self._download_recorded:
+            self._refresh_record()
+        if self._download_recorded:
+            if self._stat_matches(
+                self.raw_path, self.record.raw_size, self.record.raw_mtime
+            ):
+                return True
+            self._drop_download_record()
+
+        # A progress file means that the download is only partially complete
+        if not self.raw_path.exists() or self.download_progress_path.exists():
             return False
 
-        return self.validate_file_size()
+        if self.validate_file_size():
+            self._record_download()
+            return True
+        return False
+
+    @property
+    def parse_succeeded(self) -> bool:
+        """Returns true if the parsed file exists (checking the manifest first)
+
+        Like download_succeeded, a record is dropped if the parsed file was
+        deleted or modified since (or was parsed with another compression)
+        """
+
+        if not self.record.parsed_size:
+            self._refresh_record()
+        if self.record.parsed_size:
+            if self._stat_matches(
+                self.parsed_path_psv, self.record.parsed_size, self.record.parsed_mtime
+            ):
+                return True
+            self._drop_parse_record()
+
+        if not self.parsed_path_psv.exists():
+            return False
+
+        self._record_parse()
+        return True
+
+    @property
+    def parsed_lines_counted(self) -> bool:
+        """Returns true if parsed lines were counted (checking the manifest first)"""
+
+        if self.record.line_count < 0:
+            self._refresh_record()
+        if self.record.line_count < 0 and (
+            self.parsed_line_count_path.exists() or self.psv_index_path.exists()
+        ):
+            self.count_parsed_lines()
+        return self.record.line_count >= 0
+
+    @property
+    def _download_recorded(self) -> bool:
+        return self.record.raw_size > 0 and self._matches_ec_file_size(
+            self.record.raw_size
+        )
 
     @property
     def ec_file_size(self) -> int:
@@ -176,6 +807,9 @@ class MRTFile:
     def ac_file_size(self) -> int:
         """Returns actual (post download) compressed file size in bytes"""
 
+        if self._download_recorded:
+            return self.record.raw_size
+
         if not self.raw_path.exists():
             raise ValueError("Actual file does not exist, from " + self.url)
 
@@ -185,6 +819,9 @@ class MRTFile:
     def parsed_file_size(self) -> int:
         """Returns parsed file size in bytes"""
 
+        if self.record.parsed_size:
+            return self.record.parsed_size
+
         if not self.parsed_path_psv.exists():
             raise ValueError("Parsed file does not exist, from " + self.url)
 
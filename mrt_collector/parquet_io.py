@@ -0,0 +1,189 @@
+"""Converts parsed PSVs into Parquet, and reads them back as a dataset
+
+Every analyzer that reads PSVs re-tokenizes every field of every row.
+Parquet stores each column separately and already typed, so readers only
+read (and decode) the columns they ask for:
+    ASNs, local_pref and med are unsigned ints (null when missing)
+    timestamp is a float and atomic is a bool
+    every other column (i.e. prefix, as_path and origin_asns) is a string,
+    dictionary encoded in the file, since their values repeat heavily
+Types are fixed rather than inferred, since inferring them from the first
+block would type i.e. an origin_asns column of single ASNs as ints, or a
+column that's empty in that block as nulls.
+Each row group stores min/max statistics, so filters on the dataset
+skip the row groups that can't match.
+
+This needs pyarrow (pip install pyarrow).
+"""
+
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from .mrt_decoder import PSV_COLUMNS
+from .psv_tokenizer import read_psv_columns
+
+# Bytes of PSV read at a time, and so (roughly) the size of each row group
+PSV_BLOCK_SIZE: int = 64 * 2**20
+
+
+def parquet_column_types() -> dict[str, Any]:
+    """Returns the arrow type of every PSV column"""
+
+    pa = _import_pyarrow()
+    column_types = dict.fromkeys(PSV_COLUMNS, pa.string())
+    column_types.update(
+        {
+            "timestamp": pa.float64(),
+            "peer_asn": pa.uint32(),
+            "local_pref": pa.uint32(),
+            "med": pa.uint32(),
+            "atomic": pa.bool_(),
+            "aggr_asn": pa.uint32(),
+            "only_to_customer": pa.uint32(),
+        }
+    )
+    return column_types
+
+
+def parquet_schema(columns: Iterable[str]) -> Any:
+    """Returns the arrow schema of a PSV with columns (see parquet_column_types)"""
+
+    pa = _import_pyarrow()
+    column_types = parquet_column_types()
+    return pa.schema([(x, column_types.get(x, pa.string())) for x in columns])
+
+
+def psv_to_parquet(psv_path: Path, parquet_path: Path) -> None:
+    """Converts a (possibly compressed) parsed PSV into a Parquet file
+
+    The PSV is streamed through, so memory stays at a few row groups.
+    The Parquet file only appears once the whole PSV was converted.
+    """
+
+    pa = _import_pyarrow()
+    from pyarrow import parquet as pq  # noqa: PLC0415
+
+    # Filtered PSVs only have some of the columns
+    schema = parquet_schema(read_psv_columns(psv_path))
+    # Decompresses .gz and .zst PSVs
+    with _open_csv(pa.input_stream(str(psv_path), compression="detect")) as reader:
+        tmp_path = parquet_path.with_name(parquet_path.name + ".tmp")
+        try:
+            with pq.ParquetWriter(
+                tmp_path,
+                schema,
+                compression="zstd",
+                use_dictionary=True,
+                write_statistics=True,
+            ) as writer:
+                for batch in reader:
+                    writer.write_batch(batch.cast(schema))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    tmp_path.replace(parquet_path)
+
+
+def iter_psv_batches(
+    psv_path: Path,
+    columns: Iterable[str] | None = None,
+    start: int = 0,
+    end: int = -1,
+) -> Iterator[Any]:
+    """Yields pyarrow RecordBatches of a parsed PSV, typed as in Parquet files
+
+    Only columns are kept (default all of them). start and end optionally
+    limit this to a newline aligned byte range of a plain PSV (see
+    chunked_reader), otherwise every row is read.
+    """
+
+    pa = _import_pyarrow()
+
+    include_columns = None if columns is None else list(columns)
+    if end < 0:
+        source = pa.input_stream(str(psv_path), compression="detect")
+        with _open_csv(source, include_columns=include_columns) as reader:
+            yield from reader
+        return
+
+    with psv_path.open("rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    with _open_csv(
+        pa.BufferReader(data),
+        column_names=list(read_psv_columns(psv_path)),
+        include_columns=include_columns,
+    ) as reader:
+        yield from reader
+
+
+def iter_parquet_batches(
+    parquet_paths: Iterable[Path],
+    columns: list[str] | None = None,
+    filter: Any = None,  # noqa: A002
+    batch_size: int = 2**17,
+) -> Iterator[Any]:
+    """Yields pyarrow RecordBatches of Parquet files, read as one dataset
+
+    Only columns are read (default all of them). filter is a pyarrow
+    dataset expression, i.e. pyarrow.dataset.field("atomic"), and row
+    groups whose statistics rule it out are skipped without being read.
+    """
+
+    _import_pyarrow()
+    from pyarrow import dataset as ds  # noqa: PLC0415
+
+    dataset = ds.dataset([str(x) for x in parquet_paths], format="parquet")
+    yield from dataset.to_batches(columns=columns, filter=filter, batch_size=batch_size)
+
+
+def read_parquet(
+    parquet_paths: Iterable[Path],
+    columns: list[str] | None = None,
+    filter: Any = None,  # noqa: A002
+) -> Any:
+    """Returns Parquet files as a single pyarrow Table (see iter_parquet_batches)"""
+
+    _import_pyarrow()
+    from pyarrow import dataset as ds  # noqa: PLC0415
+
+    dataset = ds.dataset([str(x) for x in parquet_paths], format="parquet")
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def _open_csv(
+    source: Any,
+    column_names: list[str] | None = None,
+    include_columns: list[str] | None = None,
+) -> Any:
+    """Opens a pyarrow stream of RecordBatches of a PSV
+
+    column_names are for sources without the header
+    """
+
+    _import_pyarrow()
+    from pyarrow import csv  # noqa: PLC0415
+
+    return csv.open_csv(
+        source,
+        read_options=csv.ReadOptions(
+            block_size=PSV_BLOCK_SIZE, column_names=column_names
+        ),
+        parse_options=csv.ParseOptions(delimiter="|", quote_char=False),
+        convert_options=csv.ConvertOptions(
+            column_types=parquet_column_types(),
+            strings_can_be_null=True,
+            true_values=["true"],
+            false_values=["false"],
+            include_columns=include_columns,
+        ),
+    )
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow as pa  # noqa: PLC0415
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow, pip install pyarrow") from e
+    return pa
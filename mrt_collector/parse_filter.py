@@ -0,0 +1,124 @@
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cached_property
+from typing import TextIO
+
+from .mrt_decoder import PSV_COLUMNS
+
+# AS paths hold sets and confederations, i.e. 1 2 {3,4} (5 6)
+_AS_PATH_SEPARATORS = re.compile(r"[\s,{}()\[\]]+")
+_PREFIX = PSV_COLUMNS.index("prefix")
+_PEER_ASN = PSV_COLUMNS.index("peer_asn")
+_AS_PATH = PSV_COLUMNS.index("as_path")
+_ORIGIN_ASNS = PSV_COLUMNS.index("origin_asns")
+_ATOMIC = PSV_COLUMNS.index("atomic")
+_AGGR_ASN = PSV_COLUMNS.index("aggr_asn")
+
+
+@dataclass(frozen=True)
+class ParseFilter:
+    """Row predicates and a column projection applied while parsing
+
+    Rows are kept only if they pass every predicate that is set:
+        ip_version: 4 or 6 for only that address family (0 for both)
+        atomic_or_aggregator: only rows with atomic aggregate or an aggregator
+        prefixes: only rows for these exact prefixes
+        origin_asns: only rows originated by any of these ASNs
+        peer_asns: only rows from any of these peers
+        path_asns: only rows whose AS path has any of these ASNs
+    Kept rows only keep columns (in that order).
+
+    The slim rows are written to parsed_path_psv, so analyzers read them
+    just like a full PSV (as long as columns has every column they use).
+    With keep_full, the full PSV is also kept alongside, with a .full.psv
+    suffix. The default ParseFilter keeps everything.
+
+    Parsed files that already exist aren't reparsed when the filter changes,
+    so use a separate base_dir per filter.
+    """
+
+    columns: tuple[str, ...] = PSV_COLUMNS
+    ip_version: int = 0
+    atomic_or_aggregator: bool = False
+    prefixes: frozenset[str] = frozenset()
+    origin_asns: frozenset[int] = frozenset()
+    peer_asns: frozenset[int] = frozenset()
+    path_asns: frozenset[int] = frozenset()
+    keep_full: bool = False
+
+    def __post_init__(self) -> None:
+        unknown = set(self.columns) - set(PSV_COLUMNS)
+        assert not unknown, f"Unknown columns {unknown}"
+        assert self.ip_version in (0, 4, 6), "ip_version must be 0, 4 or 6"
+
+    def write(
+        self,
+        rows: Iterable[list[str] | tuple[str, ...]],
+        f: TextIO,
+        full_f: TextIO | None = None,
+    ) -> int:
+        """Writes a header and the kept rows (in PSV_COLUMNS order) to f
+
+        With full_f, every row is also written there in full.
+        Returns the number of rows kept
+        """
+
+        f.write("|".join(self.columns) + "\n")
+        if full_f is not None:
+            full_f.write("|".join(PSV_COLUMNS) + "\n")
+        kept = 0
+        for row in rows:
+            if full_f is not None:
+                full_f.write("|".join(row) + "\n")
+            if self.matches(row):
+                f.write("|".join(self.project(row)) + "\n")
+                kept += 1
+        return kept
+
+    def matches(self, row: list[str] | tuple[str, ...]) -> bool:
+        """Returns True if a row (in PSV_COLUMNS order) passes every predicate"""
+
+        if self.atomic_or_aggregator and (
+            row[_ATOMIC] != "true" and not row[_AGGR_ASN]
+        ):
+            return False
+        if self.ip_version and (":" in row[_PREFIX]) != (self.ip_version == 6):
+            return False
+        if self.prefixes and row[_PREFIX] not in self.prefixes:
+            return False
+        if self.peer_asns and row[_PEER_ASN] not in self._peer_asns:
+            return False
+        if self.origin_asns and self._origin_asns.isdisjoint(
+            _AS_PATH_SEPARATORS.split(row[_ORIGIN_ASNS])
+        ):
+            return False
+        if self.path_asns and self._path_asns.isdisjoint(
+            _AS_PATH_SEPARATORS.split(row[_AS_PATH])
+        ):
+            return False
+        return True
+
+    def project(self, row: list[str] | tuple[str, ...]) -> list[str] | tuple[str, ...]:
+        """Returns the columns of a row (in PSV_COLUMNS order) that are kept"""
+
+        if self.columns == PSV_COLUMNS:
+            return row
+        return [row[i] for i in self._column_indexes]
+
+    @cached_property
+    def _column_indexes(self) -> tuple[int, ...]:
+        return tuple([PSV_COLUMNS.index(x) for x in self.columns])
+
+    # Rows hold ASNs as strings, so compare them as strings
+    @cached_property
+    def _origin_asns(self) -> frozenset[str]:
+        return frozenset([str(x) for x in self.origin_asns])
+
+    @cached_property
+    def _peer_asns(self) -> frozenset[str]:
+        return frozenset([str(x) for x in self.peer_asns])
+
+    @cached_property
+    def _path_asns(self) -> frozenset[str]:
+        return frozenset([str(x) for x in self.path_asns])
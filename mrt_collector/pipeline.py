@@ -0,0 +1,257 @@
+import heapq
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from dataclasses import dataclass
+from itertools import count
+from typing import Any, Callable
+
+from tqdm import tqdm
+
+from .memory_governor import MemoryGovernor, run_measured
+from .mrt_file import MRTFile
+from .rate_limiter import HostRateLimiter
+
+
+def _no_priority(mrt_file: MRTFile) -> int:
+    return 0
+
+
+def _one_connection(mrt_file: MRTFile) -> int:
+    return 1
+
+
+def _one_worker(mrt_file: MRTFile) -> int:
+    return 1
+
+
+def _mrt_file_args(mrt_file: MRTFile) -> tuple[Any, ...]:
+    return (mrt_file,)
+
+
+@dataclass(frozen=True)
+class PipelineStage:
+    """A step that every MRTFile goes through, i.e. downloading or parsing
+
+    func is run in a worker process as func(*args(mrt_file)), so it must be
+    picklable. done is checked in the parent process, both to skip work that
+    was already done and to check that the task succeeded. Files with the
+    highest priority are run first.
+
+    task_workers returns how many of the stage's workers a task takes up,
+    for tasks that run several processes (i.e. sharded parses). A task that
+    needs more than workers still runs on its own, or it would never run.
+
+    For rate_limited stages, func must return the status code of its
+    request, and connections returns how many connections it opens.
+
+    Files that fail an optional stage move on to the next stage rather
+    than being dropped, for stages whose work later stages can do instead
+    (i.e. streaming into the parser, before downloading then parsing).
+    """
+
+    desc: str
+    func: Callable[..., Any]
+    workers: int
+    done: Callable[[MRTFile], bool]
+    priority: Callable[[MRTFile], int] = _no_priority
+    args: Callable[[MRTFile], tuple[Any, ...]] = _mrt_file_args
+    rate_limited: bool = False
+    connections: Callable[[MRTFile], int] = _one_connection
+    task_workers: Callable[[MRTFile], int] = _one_worker
+    optional: bool = False
+
+
+class Pipeline:
+    """Runs MRTFiles through stages without barriers between stages
+
+    Each MRTFile moves on to its next stage as soon as its current stage
+    succeeds, rather than waiting for every other file to finish that stage.
+    So parsing starts once the first download validates, and CPUs and the
+    network are busy at the same time. Every stage has its own pool of
+    workers, so that the concurrency of each stage is limited separately.
+    With a memory_governor, tasks also wait until there's memory for them.
+
+    A file fails a stage when the stage's task raises, or when done is
+    still False afterwards. Either way only that file is dropped (or moved
+    on, for optional stages), and errors are printed along with its URL.
+    The exception is a worker process dying (i.e. killed for memory),
+    which breaks its pool and so aborts the run.
+    """
+
+    # Seconds between checks for free memory while tasks are held back
+    MEMORY_POLL_INTERVAL: float = 1
+
+    def __init__(
+        self,
+        stages: tuple[PipelineStage, ...],
+        rate_limiter: HostRateLimiter,
+        memory_governor: MemoryGovernor | None = None,
+    ) -> None:
+        self.stages: tuple[PipelineStage, ...] = stages
+        self.rate_limiter: HostRateLimiter = rate_limiter
+        # Holds tasks back when they wouldn't fit in memory
+        self.memory_governor: MemoryGovernor | None = memory_governor
+
+    def run(self, mrt_files: tuple[MRTFile, ...]) -> tuple[MRTFile, ...]:
+        """Runs mrt_files through all stages
+
+        Returns the MRTFiles that made it through every stage, in their
+        original order. Files that fail a stage are dropped.
+        """
+
+        # Heap of (-priority, tiebreaker, index of mrt file) per stage
+        self._queues: list[list[tuple[int, int, int]]] = [[] for _ in self.stages]
+        self._tiebreaker = count()
+        self._running: dict[Future[Any], tuple[int, int]] = dict()
+        self._mrt_files: tuple[MRTFile, ...] = mrt_files
+        self._completed: set[int] = set()
+
+        with ExitStack() as stack:
+            self._pbars = [
+                stack.enter_context(
+                    tqdm(total=len(mrt_files), desc=stage.desc, position=i)
+                )
+                for i, stage in enumerate(self.stages)
+            ]
+            self._executors = [
+                stack.enter_context(ProcessPoolExecutor(max_workers=stage.workers))
+                for stage in self.stages
+            ]
+
+            for mrt_file_index in range(len(mrt_files)):
+                self._advance(mrt_file_index, 0)
+
+            while self._running or any(self._queues):
+                timeout = self._submit()
+                done, _ = wait(
+                    self._running, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    self._finish(future)
+
+        return tuple([x for i, x in enumerate(mrt_files) if i in self._completed])
+
+    def _advance(self, mrt_file_index: int, stage_index: int) -> None:
+        """Queues an MRTFile for the next stage that it hasn't done yet"""
+
+        mrt_file = self._mrt_files[mrt_file_index]
+        for i in range(stage_index, len(self.stages)):
+            stage = self.stages[i]
+            if stage.done(mrt_file):
+                self._pbars[i].update(1)
+                continue
+            heapq.heappush(
+                self._queues[i],
+                (-stage.priority(mrt_file), next(self._tiebreaker), mrt_file_index),
+            )
+            return
+        self._completed.add(mrt_file_index)
+
+    def _submit(self) -> float | None:
+        """Submits queued tasks for every stage that has free workers
+
+        Returns how long to wait before trying to submit again, or None
+        to wait until a running task completes
+        """
+
+        timeout = None
+        for stage_index, stage in enumerate(self.stages):
+            busy_workers = sum(
+                stage.task_workers(self._mrt_files[x])
+                for i, _, x in self._running.values()
+                if i == stage_index
+            )
+            queue = self._queues[stage_index]
+            # Tasks that couldn't start due to rate limits, to requeue later
+            blocked = list()
+            blocked_hosts = set()
+            while queue and busy_workers < stage.workers:
+                _, task_id, mrt_file_index = queue[0]
+                mrt_file = self._mrt_files[mrt_file_index]
+                task_workers = stage.task_workers(mrt_file)
+                # Wait for enough free workers, rather than letting smaller
+                # tasks behind this one take them first
+                if busy_workers and busy_workers + task_workers > stage.workers:
+                    break
+                item = heapq.heappop(queue)
+                if not self._try_admit(stage, task_id, mrt_file):
+                    # Memory frees up as tasks finish, but also as other
+                    # programs finish, so check again in a bit either way
+                    blocked.append(item)
+                    timeout = min(
+                        timeout or self.MEMORY_POLL_INTERVAL,
+                        self.MEMORY_POLL_INTERVAL,
+                    )
+                    break
+                if stage.rate_limited:
+                    host = self.rate_limiter.host(mrt_file.url)
+                    seconds_until_start = (
+                        None
+                        if host in blocked_hosts
+                        else self.rate_limiter.try_start(
+                            mrt_file.url, stage.connections(mrt_file)
+                        )
+                    )
+                    if seconds_until_start != 0:
+                        self._release(stage, task_id, mrt_file)
+                        blocked.append(item)
+                        blocked_hosts.add(host)
+                        if seconds_until_start is not None and (
+                            timeout is None or seconds_until_start < timeout
+                        ):
+                            timeout = seconds_until_start
+                        continue
+                future = self._executors[stage_index].submit(
+                    run_measured, stage.func, *stage.args(mrt_file)
+                )
+                self._running[future] = (stage_index, task_id, mrt_file_index)
+                busy_workers += task_workers
+            for item in blocked:
+                heapq.heappush(queue, item)
+        return timeout
+
+    def _finish(self, future: Future[Any]) -> None:
+        """Handles a completed task, moving its MRTFile to the next stage"""
+
+        stage_index, task_id, mrt_file_index = self._running.pop(future)
+        stage = self.stages[stage_index]
+        mrt_file = self._mrt_files[mrt_file_index]
+        if stage.rate_limited:
+            self.rate_limiter.disconnect(mrt_file.url, stage.connections(mrt_file))
+        try:
+            result, peak_rss = future.result()
+        except BrokenProcessPool:
+            # A worker died, so the pool can't run anything else
+            self._release(stage, task_id, mrt_file)
+            raise
+        except Exception as e:  # noqa: BLE001
+            # Only this file fails, the rest carry on
+            self._release(stage, task_id, mrt_file)
+            tqdm.write(f"{stage.desc} failed for {mrt_file.url}: {e!r}")
+        else:
+            self._release(stage, task_id, mrt_file, peak_rss)
+            if stage.rate_limited:
+                self.rate_limiter.record(mrt_file.url, result)
+        self._pbars[stage_index].update(1)
+        if stage.optional or stage.done(mrt_file):
+            self._advance(mrt_file_index, stage_index + 1)
+
+    def _try_admit(self, stage: PipelineStage, task_id: int, mrt_file: MRTFile) -> bool:
+        if self.memory_governor is None:
+            return True
+        return self.memory_governor.try_admit(
+            task_id, stage.func.__name__, mrt_file.url, stage.task_workers(mrt_file)
+        )
+
+    def _release(
+        self,
+        stage: PipelineStage,
+        task_id: int,
+        mrt_file: MRTFile,
+        peak_rss: int = 0,
+    ) -> None:
+        if self.memory_governor is not None:
+            self.memory_governor.release(
+                task_id, stage.func.__name__, mrt_file.url, peak_rss
+            )
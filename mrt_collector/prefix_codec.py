@@ -0,0 +1,226 @@
+"""Compact prefixes for analyzers that hold millions of them
+
+As a python str, a prefix (i.e. "2001:db8::/32") takes about 60 bytes, plus
+a pointer and hash in every set or dict that holds it. Instead, analyzers
+hold prefixes as fixed width keys in sorted numpy arrays (PrefixSet and
+PrefixMap), which only decode back into strings for output.
+
+A key is PREFIX_KEY_SIZE big endian bytes: the IP version, the address
+(IPv4 addresses are zero padded to 16 bytes) and the prefix length. So
+sorting keys sorts prefixes by version, address, then length. Keys don't
+depend on any shared state (unlike ids from a dictionary would), so keys
+made in different processes can be merged as is.
+"""
+
+import socket
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+import numpy as np
+
+PREFIX_KEY_SIZE: int = 18
+PREFIX_KEY_DTYPE: str = f"S{PREFIX_KEY_SIZE}"
+# Keys buffered before being merged into an array, at the least
+PENDING_SIZE: int = 2**16
+
+
+def encode_prefix(prefix: str) -> bytes:
+    """Returns the key of a prefix, i.e. 1.2.0.0/16"""
+
+    address, length = prefix.split("/")
+    if ":" in address:
+        return (
+            b"\x06" + socket.inet_pton(socket.AF_INET6, address) + bytes([int(length)])
+        )
+    return (
+        b"\x04"
+        + socket.inet_pton(socket.AF_INET, address)
+        + bytes(12)
+        + bytes([int(length)])
+    )
+
+
+def decode_prefix(key: bytes) -> str:
+    """Returns the prefix of a key (in canonical form)"""
+
+    # numpy strips trailing null bytes from keys
+    key = key.ljust(PREFIX_KEY_SIZE, b"\x00")
+    if key[0] == 6:
+        return f"{socket.inet_ntop(socket.AF_INET6, key[1:17])}/{key[17]}"
+    return f"{socket.inet_ntop(socket.AF_INET, key[1:5])}/{key[17]}"
+
+
+def encode_prefixes(prefixes: Iterable[str]) -> np.ndarray:
+    """Returns an array of the keys of prefixes"""
+
+    return np.array([encode_prefix(x) for x in prefixes], dtype=PREFIX_KEY_DTYPE)
+
+
+def decode_prefixes(keys: np.ndarray) -> list[str]:
+    """Returns the prefixes of an array of keys"""
+
+    return [decode_prefix(x) for x in keys.tolist()]
+
+
+class PrefixSet:
+    """A set of prefixes, held as a sorted array of their keys
+
+    Adds are buffered, and merged into the array in bulk once the buffer is
+    a fraction of the array, so adding n prefixes stays about O(n log n).
+    """
+
+    def __init__(self, prefixes: Iterable[str] = ()) -> None:
+        self._keys: np.ndarray = np.empty(0, dtype=PREFIX_KEY_DTYPE)
+        self._pending: list[bytes] = list()
+        for prefix in prefixes:
+            self.add(prefix)
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray) -> "PrefixSet":
+        """Returns the set of an array of (possibly unsorted and repeated) keys"""
+
+        prefix_set = cls()
+        prefix_set._keys = sorted_unique(keys.astype(PREFIX_KEY_DTYPE))
+        return prefix_set
+
+    @property
+    def keys(self) -> np.ndarray:
+        """The sorted keys of every prefix in the set"""
+
+        self._flush()
+        return self._keys
+
+    def add(self, prefix: str) -> None:
+        self._pending.append(encode_prefix(prefix))
+        if len(self._pending) >= max(PENDING_SIZE, len(self._keys) // 4):
+            self._flush()
+
+    def update(self, other: "PrefixSet") -> None:
+        """Adds every prefix of another set"""
+
+        self._keys = merge_sorted(self.keys, other.keys)
+
+    def __contains__(self, prefix: str) -> bool:
+        key = np.array(encode_prefix(prefix), dtype=PREFIX_KEY_DTYPE)
+        index = int(np.searchsorted(self.keys, key))
+        return index < len(self._keys) and self._keys[index] == key
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self) -> Iterator[str]:
+        """Yields the prefixes of the set, decoded into strings"""
+
+        return iter(decode_prefixes(self.keys))
+
+    def __and__(self, other: "PrefixSet") -> "PrefixSet":
+        prefix_set = PrefixSet()
+        prefix_set._keys = np.intersect1d(self.keys, other.keys, assume_unique=True)
+        return prefix_set
+
+    def __ior__(self, other: "PrefixSet") -> "PrefixSet":
+        self.update(other)
+        return self
+
+    def _flush(self) -> None:
+        """Merges buffered adds into the array"""
+
+        if self._pending:
+            self._keys = merge_sorted(
+                self._keys, np.array(self._pending, dtype=PREFIX_KEY_DTYPE)
+            )
+            self._pending.clear()
+
+
+class PrefixMap:
+    """Maps prefixes to sets of values, held as one sorted array of records
+
+    Every distinct (prefix, *values) is a record of a structured array,
+    with a "prefix" key field and the value_fields. Records are sorted, so
+    the values of each prefix are contiguous (see items). Like PrefixSet,
+    adds are buffered and merged in bulk.
+    """
+
+    def __init__(self, value_fields: list[tuple[str, str]]) -> None:
+        self.dtype: np.dtype = np.dtype([("prefix", PREFIX_KEY_DTYPE), *value_fields])
+        self._records: np.ndarray = np.empty(0, dtype=self.dtype)
+        self._pending: list[tuple[Any, ...]] = list()
+
+    @property
+    def records(self) -> np.ndarray:
+        """The sorted, distinct records of the map"""
+
+        self._flush()
+        return self._records
+
+    def add(self, prefix: str, *values: Any) -> None:
+        """Adds values to the set of values of a prefix"""
+
+        self._pending.append((encode_prefix(prefix), *values))
+        if len(self._pending) >= max(PENDING_SIZE, len(self._records) // 4):
+            self._flush()
+
+    def add_records(self, records: np.ndarray) -> None:
+        """Adds a (possibly unsorted and repeated) array of records"""
+
+        self._records = merge_sorted(self.records, records.astype(self.dtype))
+
+    def update(self, other: "PrefixMap") -> None:
+        """Adds every record of another map"""
+
+        self._records = merge_sorted(self.records, other.records)
+
+    def prefix_set(self, mask: np.ndarray | None = None) -> PrefixSet:
+        """Returns the set of prefixes of the records (where mask is true)"""
+
+        records = self.records if mask is None else self.records[mask]
+        return PrefixSet.from_keys(records["prefix"])
+
+    def items(self) -> Iterator[tuple[str, np.ndarray]]:
+        """Yields each prefix (decoded) with its records"""
+
+        records = self.records
+        if not len(records):
+            return
+        keys = records["prefix"]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        ends = np.append(starts[1:], len(records))
+        for key, start, end in zip(
+            keys[starts].tolist(), starts.tolist(), ends.tolist(), strict=True
+        ):
+            yield decode_prefix(key), records[start:end]
+
+    def __len__(self) -> int:
+        """Returns the number of prefixes in the map"""
+
+        return len(sorted_unique(self.records["prefix"]))
+
+    def _flush(self) -> None:
+        """Merges buffered adds into the array"""
+
+        if self._pending:
+            self._records = merge_sorted(
+                self._records, np.array(self._pending, dtype=self.dtype)
+            )
+            self._pending.clear()
+
+
+def merge_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the sorted, distinct elements of a (sorted) and b
+
+    A stable sort (timsort) of the concatenation runs in about linear time
+    when a dwarfs b, since a is already one sorted run
+    """
+
+    if not len(b):
+        return a
+    return sorted_unique(np.concatenate((a, b)))
+
+
+def sorted_unique(array: np.ndarray) -> np.ndarray:
+    """Returns the sorted, distinct elements of an array"""
+
+    if not len(array):
+        return array
+    array = np.sort(array, kind="stable")
+    return array[np.concatenate(([True], array[1:] != array[:-1]))]
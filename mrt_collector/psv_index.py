@@ -0,0 +1,120 @@
+import io
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO
+
+# Types of rows (the first column), i.e. announcements and withdrawals
+PSV_TYPES: tuple[str, ...] = ("A", "W")
+
+
+def psv_index_path(psv_path: Path) -> Path:
+    """Returns the index sidecar of a parsed PSV (i.e. x.psv.index.json)"""
+
+    return psv_path.with_name(psv_path.name + ".index.json")
+
+
+@dataclass
+class PSVIndex:
+    """Row counts and sparse row offsets of a parsed PSV
+
+    Written by the parser as it writes the PSV, so the PSV never needs
+    another pass just to be counted. offsets holds (row, byte offset of the
+    start of that row) about every PSVIndexer.interval rows, starting at row
+    0 (just past the header). These are exact boundaries to read the PSV in
+    chunks from. Offsets and size are of the uncompressed PSV, so only plain
+    PSVs can be seeked to them.
+    """
+
+    # Rows, not counting the header
+    rows: int = 0
+    type_counts: dict[str, int] = field(default_factory=dict)
+    offsets: list[tuple[int, int]] = field(default_factory=list)
+    size: int = 0
+
+    def save(self, path: Path) -> None:
+        with path.open("w") as f:
+            json.dump(asdict(self), f)
+
+    @classmethod
+    def load(cls, path: Path) -> "PSVIndex":
+        with path.open() as f:
+            data = json.load(f)
+        data["offsets"] = [tuple(x) for x in data["offsets"]]
+        return cls(**data)
+
+
+class PSVIndexer(io.RawIOBase):
+    """Writes a PSV through to a binary file, indexing it as it's written
+
+    Only counts newlines and looks at line starts in each written chunk, so
+    this costs far less than rereading the PSV (i.e. with wc -l). Wrap it in
+    an io.BufferedWriter (and an io.TextIOWrapper to write strings).
+    """
+
+    def __init__(self, f: IO[bytes], interval: int = 2**14) -> None:
+        self.f: IO[bytes] = f
+        # Rows between offsets
+        self.interval: int = interval
+        self.index: PSVIndex = PSVIndex(type_counts=dict.fromkeys(PSV_TYPES, 0))
+        self._newlines: int = 0
+        self._last_byte: bytes = b""
+        self._next_offset_row: int = 0
+        # Filtered PSVs may not have the type column
+        self._has_types: bool | None = None
+        self._header_start: bytes = b""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: bytes | bytearray | memoryview) -> int:  # type: ignore[override]
+        data = bytes(b)
+        if not data:
+            return 0
+        self.f.write(data)
+
+        if self._has_types is None:
+            self._header_start += data[:5]
+            if len(self._header_start) >= 5 or b"\n" in self._header_start:
+                self._has_types = self._header_start.startswith(b"type|")
+        line_start = self._last_byte == b"\n"
+        if self._has_types:
+            for type_ in PSV_TYPES:
+                self.index.type_counts[type_] += data.count(b"\n" + type_.encode())
+                if line_start and data.startswith(type_.encode()):
+                    self.index.type_counts[type_] += 1
+
+        # Where the first row that starts in this chunk starts (-1 for none)
+        if line_start:
+            start, row = 0, self._newlines - 1
+        else:
+            start, row = data.find(b"\n") + 1, self._newlines
+            if start in (0, len(data)):
+                start = -1
+        if start >= 0:
+            self._add_offsets(data, start, row)
+
+        self._newlines += data.count(b"\n")
+        self.index.size += len(data)
+        self.index.rows = max(self._newlines - 1, 0)
+        self._last_byte = data[-1:]
+        return len(data)
+
+    def _add_offsets(self, data: bytes, start: int, row: int) -> None:
+        """Adds offsets for rows in a chunk, given where a row in it starts
+
+        Rather than finding every line, this jumps ahead by the average row
+        size to about the next row to add, and counts newlines up to there
+        """
+
+        while True:
+            if row >= self._next_offset_row:
+                self.index.offsets.append((row, self.index.size + start))
+                self._next_offset_row = row + self.interval
+            row_size = max((self.index.size + start) // (row + 1), 1)
+            target = start + (self._next_offset_row - row) * row_size
+            newline = data.find(b"\n", min(target, len(data)))
+            if newline == -1 or newline + 1 == len(data):
+                return
+            row += data.count(b"\n", start, newline + 1)
+            start = newline + 1
@@ -0,0 +1,76 @@
+"""Reads and writes parsed PSVs, plain or compressed
+
+Parsed PSVs are many times the size of the raw dumps, so they can be
+written compressed instead (see MRTCollector's parsed_compression). The
+compression is chosen by suffix (.gz for gzip, .zst for zstd), so readers
+never need to know how a PSV was written.
+
+zstd is preferred, since it compresses with every core as the PSV is
+written and decompresses several times faster than gzip. It needs the
+zstandard package (pip install zstandard).
+"""
+
+import gzip
+import io
+from pathlib import Path
+from typing import IO, Any
+
+# Suffix of a parsed PSV for each compression ("" for uncompressed)
+PSV_SUFFIXES: dict[str, str] = {"": "", "gzip": ".gz", "zstd": ".zst"}
+# Much faster than gzip's default of 9, for a slightly larger file
+GZIP_LEVEL: int = 3
+ZSTD_LEVEL: int = 3
+
+
+def psv_compression(path: Path) -> str:
+    """Returns the compression of a PSV (or its .tmp file) from its suffix"""
+
+    name = path.name.removesuffix(".tmp")
+    for compression, suffix in PSV_SUFFIXES.items():
+        if suffix and name.endswith(suffix):
+            return compression
+    return ""
+
+
+def open_psv(path: Path, mode: str = "r") -> IO[Any]:
+    """Opens a PSV that may be compressed, like open() does
+
+    Modes are r, w, rb and wb. Writes are compressed as they're made.
+    """
+
+    assert mode in ("r", "w", "rb", "wb"), f"Unsupported mode {mode}"
+
+    compression = psv_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, mode if "b" in mode else mode + "t", GZIP_LEVEL)
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        f = zstandard.open(
+            path,
+            mode,
+            # threads=-1 compresses with every core
+            cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1),
+        )
+        # zstandard's binary reader can't read lines on its own
+        return io.BufferedReader(f) if mode == "rb" else f
+    return path.open(mode)
+
+
+def count_lines(path: Path) -> int:
+    """Counts the lines of a (possibly compressed) PSV, like wc -l"""
+
+    count = 0
+    with open_psv(path, "rb") as f:
+        while chunk := f.read(16 * 2**20):
+            count += chunk.count(b"\n")
+    return count
+
+
+def _import_zstandard() -> Any:
+    try:
+        import zstandard  # noqa: PLC0415
+    except ImportError as e:
+        raise ImportError(
+            "zstd compressed PSVs need zstandard, pip install zstandard"
+        ) from e
+    return zstandard
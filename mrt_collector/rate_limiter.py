@@ -0,0 +1,214 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+import requests
+
+
+@dataclass
+class TokenBucket:
+    """Token bucket for a single host. Rate is in requests per second"""
+
+    rate: float
+    capacity: float
+    tokens: float
+    last_refill: float = field(default_factory=time.monotonic)
+
+    def refill(self, now: float) -> None:
+        """Adds the tokens accumulated since the last refill"""
+
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+
+class HostRateLimiter:
+    """Rate limits requests separately for each host
+
+    Each host (data.ris.ripe.net, archive.routeviews.org, etc) gets its own
+    token bucket, so waiting on one host never delays requests to another.
+    The rate of each bucket is adjusted with AIMD (additive increase,
+    multiplicative decrease): every successful request nudges the rate up
+    towards max_rate, and every throttling response (429/503) cuts it down.
+
+    This class is thread safe, but it is not shared across processes.
+    When multiprocessing, the parent process should acquire tokens before
+    submitting tasks and record the status codes that the tasks return.
+    """
+
+    def __init__(
+        self,
+        # Previously we slept 5s between requests to stay under rate limits
+        rate: float = 1 / 5,
+        # Rate limits are exceeded with less than 3s between requests
+        max_rate: float = 1 / 3,
+        min_rate: float = 1 / 60,
+        capacity: float = 1,
+        additive_increase: float = 1 / 100,
+        multiplicative_decrease: float = 0.5,
+        throttle_status_codes: tuple[int, ...] = (429, 503),
+        max_connections: int = 4,
+    ) -> None:
+        assert 0 < min_rate <= rate <= max_rate, "Rates must be ordered and positive"
+        assert 0 < multiplicative_decrease < 1, "Decrease must be a fraction"
+
+        self.initial_rate: float = rate
+        self.max_rate: float = max_rate
+        self.min_rate: float = min_rate
+        self.capacity: float = capacity
+        self.additive_increase: float = additive_increase
+        self.multiplicative_decrease: float = multiplicative_decrease
+        self.throttle_status_codes: tuple[int, ...] = throttle_status_codes
+        # Max simultaneous connections to a single host (i.e. download segments)
+        self.max_connections: int = max_connections
+
+        self._buckets: dict[str, TokenBucket] = dict()
+        self._open_connections: dict[str, int] = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        """Returns the host that a URL is rate limited under"""
+
+        return urlparse(url).netloc
+
+    def try_acquire(self, url: str) -> float:
+        """Takes a token for the URL's host if available
+
+        Returns 0 if a token was taken, otherwise the number of seconds
+        until the next token will be available
+        """
+
+        with self._lock:
+            bucket = self._get_bucket(url)
+            bucket.refill(time.monotonic())
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            return (1 - bucket.tokens) / bucket.rate
+
+    def acquire(self, url: str) -> None:
+        """Blocks until a token for the URL's host is available"""
+
+        while (wait := self.try_acquire(url)) > 0:
+            time.sleep(wait)
+
+    def reserve(self, url: str, tokens: float) -> None:
+        """Takes extra tokens for the URL's host, going into debt if needed
+
+        Used when a single task opens several connections, so that later
+        requests to the host wait as if each connection were a request
+        """
+
+        with self._lock:
+            bucket = self._get_bucket(url)
+            bucket.refill(time.monotonic())
+            bucket.tokens -= tokens
+
+    def try_connect(self, url: str, connections: int = 1) -> bool:
+        """Opens connections to the URL's host if under max_connections
+
+        A task with more connections than max_connections is still allowed
+        to run on its own, otherwise it would never be able to run
+        """
+
+        host = self.host(url)
+        with self._lock:
+            open_connections = self._open_connections.get(host, 0)
+            if open_connections and open_connections + connections > (
+                self.max_connections
+            ):
+                return False
+            self._open_connections[host] = open_connections + connections
+            return True
+
+    def disconnect(self, url: str, connections: int = 1) -> None:
+        """Closes connections opened with try_connect"""
+
+        host = self.host(url)
+        with self._lock:
+            self._open_connections[host] -= connections
+
+    def try_start(self, url: str, connections: int = 1) -> float | None:
+        """Tries to start a task that opens connections to the URL's host
+
+        On success, the connections are opened and a token is taken (along
+        with an extra token for each extra connection), and 0 is returned.
+        Call disconnect when the task finishes.
+
+        Otherwise, returns the seconds until a token is available, or None
+        if the host is at max_connections (so a running task must finish)
+        """
+
+        if not self.try_connect(url, connections):
+            return None
+        seconds_until_token = self.try_acquire(url)
+        if seconds_until_token == 0:
+            self.reserve(url, connections - 1)
+        else:
+            self.disconnect(url, connections)
+        return seconds_until_token
+
+    def record(self, url: str, status_code: int) -> None:
+        """Adjusts the rate of the URL's host from a response status code
+
+        A status code of 0 means that no response was received, and is ignored
+        """
+
+        if status_code == 0:
+            return
+
+        with self._lock:
+            bucket = self._get_bucket(url)
+            if status_code in self.throttle_status_codes:
+                bucket.rate = max(
+                    self.min_rate, bucket.rate * self.multiplicative_decrease
+                )
+                # Drain the bucket so that the next request waits a full interval
+                bucket.refill(time.monotonic())
+                bucket.tokens = min(bucket.tokens, 0)
+            elif status_code < 400:
+                bucket.rate = min(self.max_rate, bucket.rate + self.additive_increase)
+
+    def rate(self, url: str) -> float:
+        """Returns the current rate (requests per second) of the URL's host"""
+
+        with self._lock:
+            return self._get_bucket(url).rate
+
+    def _get_bucket(self, url: str) -> TokenBucket:
+        """Returns the bucket for a URL's host. Must be called with the lock"""
+
+        host = self.host(url)
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(
+                rate=self.initial_rate, capacity=self.capacity, tokens=self.capacity
+            )
+            self._buckets[host] = bucket
+        return bucket
+
+
+def response_status_code(response: requests.Response) -> int:
+    """Returns the status code to use for rate limiting a response
+
+    RetrySession retries 503s internally, so a response that eventually
+    succeeded may still have been throttled along the way. In that case,
+    the throttling status code from the retry history is returned.
+    """
+
+    retries = getattr(response.raw, "retries", None)
+    for history in getattr(retries, "history", ()):
+        if history.status in (429, 503):
+            return int(history.status)
+    return response.status_code
+
+
+def exception_status_code(e: Exception) -> int:
+    """Returns the status code of a failed request, or 0 if there was none"""
+
+    response = getattr(e, "response", None)
+    if response is None:
+        return 0
+    return int(response.status_code)
@@ -38,10 +38,10 @@ class RetrySession(requests.Session):
 
 """
 This is a subclass of requests.session created for
-convenience and to prevent bloating
-MRTFile.fetch_expected_file_size; within fetch... we
-use this as a context manager. This class does two
-things:
+convenience and to prevent bloating MRTFile. The
+DownloadClient keeps one of these per host, so that
+every HEAD and GET shares its connection pool and
+retry policy. This class does two things:
 
 The first is that it mounts a Retry Adapter
 to our Session in the object init, so we automatically
@@ -1,19 +1,378 @@
 """Funcs that parse rib dumps"""
 
-from subprocess import check_call
-from typing import Callable
+import errno
+import io
+import os
+import shutil
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from subprocess import PIPE, CalledProcessError, Popen
+from tempfile import TemporaryDirectory
+from typing import IO, Any, Callable
 
+from .mrt_decoder import PSV_COLUMNS, iter_mrt_rows, open_mrt, split_mrt_records
 from .mrt_file import MRTFile
+from .parse_filter import ParseFilter
+from .psv_index import PSVIndexer, psv_index_path
+from .psv_io import open_psv
 
 PARSE_FUNC = Callable[[MRTFile], None]
 
+# Each PSV (and each shard's PSV) starts with a header
+_PSV_HEADER_START = f"{PSV_COLUMNS[0]}|"
 
-def bgpkit_parser(mrt_file: MRTFile) -> None:
-    """Extracts info from raw dumps into parsed path"""
 
-    check_call(  # noqa
-        # need the single quotes for the entire string and double quotes for the paths
-        # to tell the shell to treat everything as a single path
-        f'bgpkit-parser "{mrt_file.raw_path}" --psv > "{mrt_file.parsed_path_psv}"',
-        shell=True,
+def bgpkit_parser(mrt_file: MRTFile, parse_filter: ParseFilter | None = None) -> None:
+    """Extracts info from raw dumps into parsed path
+
+    bgpkit-parser's output is indexed (and filtered with a parse_filter, and
+    compressed if the parsed path is) as it's parsed, and the parsed file
+    only appears once the whole dump was parsed
+    """
+
+    tmp_parsed_path = _tmp_path(mrt_file.parsed_path_psv)
+    process = Popen(  # noqa: S603
+        ["bgpkit-parser", str(mrt_file.raw_path), "--psv"],  # noqa: S607
+        stdout=PIPE,
+    )
+    try:
+        assert process.stdout is not None
+        with process.stdout:
+            _write_parser_output(process.stdout, tmp_parsed_path, parse_filter)
+        returncode = process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        _unlink_tmp(tmp_parsed_path)
+        raise
+    if returncode != 0:
+        _unlink_tmp(tmp_parsed_path)
+        raise CalledProcessError(returncode, process.args)
+    _replace_tmp(tmp_parsed_path)
+
+
+def bgpkit_parser_sharded(
+    mrt_file: MRTFile, shards: int, parse_filter: ParseFilter | None = None
+) -> None:
+    """Parses a single huge dump with several bgpkit-parser processes at once
+
+    The dump is decompressed once and split into shards of whole records.
+    Each shard (preceded by the PEER_INDEX_TABLE, which it needs to be
+    decoded) is piped through a named pipe into its own bgpkit-parser.
+    The parsed shards are then joined in order, so the output is the same
+    as bgpkit_parser's (parse_filter is applied while joining them).
+    Raises on failure.
+    """
+
+    tmp_parsed_path = _tmp_path(mrt_file.parsed_path_psv)
+    # Decompress next to the output, since /tmp is often too small for a RIB
+    with TemporaryDirectory(dir=mrt_file.parsed_path_psv.parent) as tmp_dir:
+        # No extension, so that bgpkit-parser reads it as uncompressed
+        decompressed_path = Path(tmp_dir) / "dump"
+        with (
+            open_mrt(mrt_file.raw_path) as src,
+            decompressed_path.open("wb") as dst,
+        ):
+            shutil.copyfileobj(src, dst, 16 * 2**20)
+        with decompressed_path.open("rb") as f:
+            peer_index_end, ranges = split_mrt_records(f, shards)
+
+        part_paths = tuple(
+            [Path(tmp_dir) / f"shard_{i}.psv" for i in range(len(ranges))]
+        )
+        processes: list[Popen[bytes]] = list()
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges) or 1) as executor:
+                futures = list()
+                for i, (start, end) in enumerate(ranges):
+                    fifo_path = Path(tmp_dir) / f"shard_{i}"
+                    os.mkfifo(fifo_path)
+                    with part_paths[i].open("wb") as part_f:
+                        process = Popen(  # noqa: S603
+                            ["bgpkit-parser", str(fifo_path), "--psv"],  # noqa: S607
+                            stdout=part_f,
+                        )
+                    processes.append(process)
+                    futures.append(
+                        executor.submit(
+                            _write_shard,
+                            fifo_path,
+                            process,
+                            decompressed_path,
+                            ((0, peer_index_end), (start, end)),
+                        )
+                    )
+                for future in futures:
+                    future.result()
+            returncodes = [x.wait() for x in processes]
+        except BaseException:
+            for process in processes:
+                process.kill()
+                process.wait()
+            raise
+        if any(returncodes):
+            raise RuntimeError(
+                f"Parsing shards of {mrt_file.url} failed, parsers exited with"
+                f" {returncodes}"
+            )
+
+        try:
+            if parse_filter is None:
+                _join_parts(part_paths, tmp_parsed_path)
+            else:
+                _write_filtered(
+                    _psv_rows(_read_parts(part_paths)), tmp_parsed_path, parse_filter
+                )
+        except BaseException:
+            _unlink_tmp(tmp_parsed_path)
+            raise
+    _replace_tmp(tmp_parsed_path)
+
+
+def _write_shard(
+    fifo_path: Path,
+    process: Popen[bytes],
+    path: Path,
+    ranges: tuple[tuple[int, int], ...],
+) -> None:
+    """Writes byte ranges of a file into the named pipe of a parser"""
+
+    with _open_fifo_for_writing(fifo_path, process) as fifo, path.open("rb") as f:
+        for start, end in ranges:
+            f.seek(start)
+            remaining = end - start
+            while remaining:
+                chunk = f.read(min(remaining, 2**20))
+                fifo.write(chunk)
+                remaining -= len(chunk)
+
+
+def _join_parts(part_paths: tuple[Path, ...], output_path: Path) -> None:
+    """Concatenates parsed parts, keeping only the first part's header"""
+
+    with _open_output(output_path, "wb") as output_f:
+        header = b""
+        for i, part_path in enumerate(part_paths):
+            with part_path.open("rb") as part_f:
+                first_line = part_f.readline()
+                if i == 0:
+                    header = first_line
+                    output_f.write(first_line)
+                elif first_line != header:
+                    output_f.write(first_line)
+                shutil.copyfileobj(part_f, output_f, 16 * 2**20)
+
+
+def _read_parts(part_paths: tuple[Path, ...]) -> Iterator[str]:
+    """Yields the lines of parsed parts, in order"""
+
+    for part_path in part_paths:
+        with part_path.open() as part_f:
+            yield from part_f
+
+
+def python_parser(mrt_file: MRTFile, parse_filter: ParseFilter | None = None) -> None:
+    """Decodes raw dumps into parsed path with the pure python decoder
+
+    Writes the same PSV as bgpkit-parser, without needing its binary.
+    Slower than bgpkit-parser under CPython, but runs well under PyPy.
+    The parsed file only appears once the whole dump was decoded.
+    """
+
+    tmp_parsed_path = _tmp_path(mrt_file.parsed_path_psv)
+    try:
+        _write_filtered(
+            iter_mrt_rows(mrt_file.raw_path),
+            tmp_parsed_path,
+            parse_filter or ParseFilter(),
+        )
+    except BaseException:
+        _unlink_tmp(tmp_parsed_path)
+        raise
+    _replace_tmp(tmp_parsed_path)
+
+
+def _write_parser_output(
+    stdout: IO[bytes], tmp_parsed_path: Path, parse_filter: ParseFilter | None
+) -> None:
+    """Writes a parser's PSV output into a parse's tmp path(s) as it comes
+
+    The output is indexed, compressed if the path is, and filtered with a
+    parse_filter
+    """
+
+    if parse_filter is None:
+        with _open_output(tmp_parsed_path, "wb") as f:
+            shutil.copyfileobj(stdout, f, 2**20)
+    else:
+        rows = _psv_rows(io.TextIOWrapper(stdout))
+        _write_filtered(rows, tmp_parsed_path, parse_filter)
+
+
+def _psv_rows(lines: Iterable[str]) -> Iterator[list[str]]:
+    """Yields the rows of bgpkit-parser PSV output, skipping headers"""
+
+    for line in lines:
+        if not line.startswith(_PSV_HEADER_START):
+            yield line.rstrip("\n").split("|")
+
+
+def _write_filtered(
+    rows: Iterable[list[str] | tuple[str, ...]],
+    tmp_parsed_path: Path,
+    parse_filter: ParseFilter,
+) -> None:
+    """Writes rows through parse_filter into a parse's tmp path(s)
+
+    With keep_full, the full PSV is written alongside as well
+    """
+
+    with ExitStack() as stack:
+        f = stack.enter_context(_open_output(tmp_parsed_path, "w"))
+        full_f = (
+            stack.enter_context(open_psv(_full_path(tmp_parsed_path), "w"))
+            if parse_filter.keep_full
+            else None
+        )
+        parse_filter.write(rows, f, full_f)
+
+
+@contextmanager
+def _open_output(tmp_parsed_path: Path, mode: str) -> Iterator[IO[Any]]:
+    """Opens a parse's tmp output for writing (mode w or wb)
+
+    The PSV is indexed as it's written, and its index is only written once
+    the PSV was written without errors (see PSVIndexer)
+    """
+
+    with open_psv(tmp_parsed_path, "wb") as f:
+        indexer = PSVIndexer(f)
+        buffered = io.BufferedWriter(indexer, 2**20)
+        with buffered if mode == "wb" else io.TextIOWrapper(buffered) as output_f:
+            yield output_f
+    indexer.index.save(_tmp_path(psv_index_path(_final_path(tmp_parsed_path))))
+
+
+def _tmp_path(path: Path) -> Path:
+    """Returns where a parse's output is written until it's complete"""
+
+    return path.with_name(path.name + ".tmp")
+
+
+def _full_path(path: Path) -> Path:
+    """Returns where the full PSV is kept alongside a (tmp) filtered PSV
+
+    i.e. x.psv -> x.full.psv and x.psv.zst.tmp -> x.full.psv.zst.tmp
+    """
+
+    name, ext, tmp = path.name.rpartition(".psv")
+    return path.with_name(f"{name}.full{ext}{tmp}")
+
+
+def _final_path(tmp_path: Path) -> Path:
+    return tmp_path.with_name(tmp_path.name.removesuffix(".tmp"))
+
+
+def _outputs(tmp_parsed_path: Path) -> tuple[tuple[Path, Path], ...]:
+    """Returns (tmp path, path) of each output of a parse, the parsed path last
+
+    parse_succeeded only checks the parsed path, so it must appear last
+    """
+
+    parsed_path = _final_path(tmp_parsed_path)
+    return tuple(
+        [
+            (_tmp_path(x), x)
+            for x in (_full_path(parsed_path), psv_index_path(parsed_path), parsed_path)
+        ]
     )
+
+
+def _replace_tmp(tmp_parsed_path: Path) -> None:
+    """Moves a parse's outputs from their tmp paths"""
+
+    for tmp_path, path in _outputs(tmp_parsed_path):
+        if tmp_path.exists():
+            tmp_path.replace(path)
+
+
+def _unlink_tmp(tmp_parsed_path: Path) -> None:
+    for tmp_path, _ in _outputs(tmp_parsed_path):
+        tmp_path.unlink(missing_ok=True)
+
+
+def bgpkit_parser_stream(
+    mrt_file: MRTFile, keep_raw: bool = False, parse_filter: ParseFilter | None = None
+) -> int:
+    """Pipes the download of a dump straight into bgpkit-parser
+
+    The HTTP body is written into a named pipe that bgpkit-parser reads from,
+    so parsing overlaps the download and the raw dump is never written to
+    (and reread from) disk. With keep_raw, the body is also written to
+    raw_path for archival. The parser's output is indexed (and filtered
+    with a parse_filter, and compressed if the parsed path is) as it's parsed.
+
+    The parsed file only appears once the whole dump was streamed and parsed.
+    Raises on failure. Returns the status code of the download
+    """
+
+    tmp_parsed_path = _tmp_path(mrt_file.parsed_path_psv)
+    with TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(max_workers=1) as executor:
+        # Keep the file name so that bgpkit-parser infers the compression
+        fifo_path = Path(tmp_dir) / mrt_file.raw_path.name
+        os.mkfifo(fifo_path)
+        command = ["bgpkit-parser", str(fifo_path), "--psv"]
+        process = Popen(command, stdout=PIPE)  # noqa: S603
+        assert process.stdout is not None
+        # Written as the parser writes, so that its output never blocks it
+        writing = executor.submit(
+            _write_parser_output, process.stdout, tmp_parsed_path, parse_filter
+        )
+        try:
+            with _open_fifo_for_writing(fifo_path, process) as fifo:
+                streamed, status_code = mrt_file.stream_raw(fifo, keep_raw=keep_raw)
+            returncode = process.wait()
+            writing.result()
+        except BaseException:
+            process.kill()
+            process.wait()
+            wait([writing])
+            _unlink_tmp(tmp_parsed_path)
+            raise
+
+        if returncode != 0 or not streamed:
+            _unlink_tmp(tmp_parsed_path)
+            raise RuntimeError(
+                f"Streaming {mrt_file.url} failed, parser exited with {returncode}"
+                f" and {'all' if streamed else 'not all'} bytes streamed"
+            )
+
+    _replace_tmp(tmp_parsed_path)
+    return status_code
+
+
+def _open_fifo_for_writing(fifo_path: Path, process: Popen[bytes]):
+    """Opens a named pipe once its reader (the parser) has opened it
+
+    A plain open() would block forever if the parser died before opening
+    the pipe, so this polls with O_NONBLOCK while checking on the parser
+    """
+
+    while True:
+        try:
+            fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            # ENXIO means that no process has the pipe open for reading yet
+            if e.errno != errno.ENXIO:
+                raise
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"Parser exited with {process.returncode} before reading"
+                ) from e
+            time.sleep(0.05)
+    os.set_blocking(fd, True)
+    return os.fdopen(fd, "wb")
@@ -1,8 +1,10 @@
+from .collector_registry import CollectorRegistry
 from .source import Source
 from .ripe import RIPE
 from .route_views import RouteViews
 
 __all__ = [
+    "CollectorRegistry",
     "Source",
     "RIPE",
     "RouteViews",
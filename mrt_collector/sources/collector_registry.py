@@ -0,0 +1,178 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from platformdirs import user_cache_path
+from requests_cache import CachedSession
+
+from mrt_collector.rate_limiter import HostRateLimiter
+
+if TYPE_CHECKING:
+    from .source import Source
+
+
+class CollectorRegistry:
+    """SQLite store of each source's collectors, and the months they have dumps
+
+    Discovering collectors means fetching and parsing each source's
+    (large) index page, so discovered collectors are reused for
+    discovery_ttl seconds instead.
+
+    Before a collector's URLs are used for a date, the listing of its
+    directory for that month is requested (into the requests cache, where
+    the listing is reused to get file sizes). Collectors without that
+    directory had no dumps that month, so they're skipped rather than
+    spending HEAD and GET requests on them. Months that had dumps are
+    recorded for good, so over time this records which collectors had
+    dumps when. Months without dumps are rechecked after missing_ttl
+    seconds, since the current month may not have started yet.
+
+    Like the Manifest, only paths are stored on this object, and each call
+    opens its own connection. The database is only created once it's used.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        discovery_ttl: float = 7 * 24 * 60 * 60,
+        missing_ttl: float = 24 * 60 * 60,
+        rate_limiter: HostRateLimiter | None = None,
+        max_workers: int = 8,
+    ) -> None:
+        self.path: Path = path or user_cache_path("mrt_collector") / "collectors.db"
+        self.discovery_ttl: float = discovery_ttl
+        self.missing_ttl: float = missing_ttl
+        # Rate limits (uncached) listing requests by host
+        self.rate_limiter: HostRateLimiter | None = rate_limiter
+        # Listings requested at once when checking collectors
+        self.max_workers: int = max_workers
+        self._created: bool = False
+
+    def get_collectors(
+        self, source: "Source", requests_cache_path: Path
+    ) -> tuple[str, ...]:
+        """Returns the URLs of a source's collectors, discovering if stale"""
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT url, discovered_at FROM collectors WHERE source = ?",
+                (repr(source),),
+            ).fetchall()
+        if rows and time.time() - min(x[1] for x in rows) < self.discovery_ttl:
+            return tuple(sorted([x[0] for x in rows]))
+
+        collectors = source.discover_collectors(requests_cache_path)
+        discovered_at = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM collectors WHERE source = ?", (repr(source),))
+            conn.executemany(
+                "INSERT INTO collectors (source, url, discovered_at) VALUES (?, ?, ?)",
+                [(repr(source), x, discovered_at) for x in collectors],
+            )
+        return collectors
+
+    def get_live_collectors(
+        self,
+        source: "Source",
+        collectors: tuple[str, ...],
+        dl_time: datetime,
+        requests_cache_path: Path,
+    ) -> tuple[str, ...]:
+        """Returns the collectors that have dumps for dl_time's month
+
+        Collectors that haven't been checked (recently) are checked
+        concurrently. Collectors that can't be checked (i.e. timeouts)
+        are kept, since they may well have dumps
+        """
+
+        month = dl_time.strftime("%Y.%m")
+        known = self.get_months(month)
+        unchecked = tuple([x for x in collectors if x not in known])
+        if unchecked:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = executor.map(
+                    lambda x: self._check_collector(
+                        source, source.get_month_url(x, dl_time), requests_cache_path
+                    ),
+                    unchecked,
+                )
+                for collector, has_dumps in zip(unchecked, results, strict=True):
+                    if has_dumps is not None:
+                        self._save_month(collector, month, has_dumps)
+                        known[collector] = has_dumps
+        return tuple([x for x in collectors if known.get(x, True)])
+
+    def get_months(self, month: str) -> dict[str, bool]:
+        """Returns {collector url: has dumps} for fresh results of a month"""
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT url, has_dumps, checked_at FROM collector_months "
+                "WHERE month = ?",
+                (month,),
+            ).fetchall()
+        return {
+            url: bool(has_dumps)
+            for url, has_dumps, checked_at in rows
+            if has_dumps or time.time() - checked_at < self.missing_ttl
+        }
+
+    def get_dump_months(self, collector_url: str) -> tuple[str, ...]:
+        """Returns the months (i.e. 2024.01) that a collector is known to have dumps"""
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT month FROM collector_months "
+                "WHERE url = ? AND has_dumps = 1 ORDER BY month",
+                (collector_url,),
+            ).fetchall()
+        return tuple([x[0] for x in rows])
+
+    def _check_collector(
+        self, source: "Source", month_url: str, requests_cache_path: Path
+    ) -> bool | None:
+        """Returns if a collector's month directory exists, or None if unknown"""
+
+        # Each thread gets its own session, since sessions aren't thread safe
+        with CachedSession(requests_cache_path) as session:
+            try:
+                resp = source.get_listing(session, month_url, self.rate_limiter)
+            except Exception as e:  # noqa: BLE001
+                print(f"Checking {month_url} failed due to {e} {type(e)}")
+                return None
+            with resp:
+                if resp.status_code in (403, 404, 410):
+                    return False
+                return True if resp.ok else None
+
+    def _save_month(self, collector_url: str, month: str, has_dumps: bool) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO collector_months "
+                "(url, month, has_dumps, checked_at) VALUES (?, ?, ?, ?)",
+                (collector_url, month, int(has_dumps), time.time()),
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._created:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Sources are discovered concurrently, so wait on locks
+        conn = sqlite3.connect(self.path, timeout=60)
+        if not self._created:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS collectors ("
+                    "source TEXT, url TEXT, discovered_at REAL, "
+                    "PRIMARY KEY (source, url))"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS collector_months ("
+                    "url TEXT, month TEXT, has_dumps INTEGER, checked_at REAL, "
+                    "PRIMARY KEY (url, month))"
+                )
+            self._created = True
+        return conn
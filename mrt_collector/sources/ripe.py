@@ -2,6 +2,9 @@ import warnings
 from datetime import datetime
 from pathlib import Path
 
+from mrt_collector.rate_limiter import HostRateLimiter
+
+from .collector_registry import CollectorRegistry
 from .source import Source
 
 
@@ -15,24 +18,48 @@ class RIPE(Source):
     # )
     URL: str = "https://ris.ripe.net/docs/route-collectors/#bgp-timer-settings"
 
-    def get_urls(self, dl_time: datetime, requests_cache_path: Path) -> tuple[str, ...]:
+    def get_urls(
+        self,
+        dl_time: datetime,
+        requests_cache_path: Path,
+        registry: CollectorRegistry | None = None,
+    ) -> tuple[str, ...]:
         """Gets URLs of MRT RIB dumps for RIPE/RIS"""
 
         assert dl_time.hour % 8 == 0, "RIPE/RIS only downloads RIBS every 8hrs"
+        links = self._get_live_collectors(dl_time, requests_cache_path, registry)
+        # Return the links to the dumps from the collector links
+        return tuple(
+            [dl_time.strftime(f"{x}/%Y.%m/bview.%Y%m%d.%H00.gz") for x in links]
+        )
+
+    def discover_collectors(self, requests_cache_path: Path) -> tuple[str, ...]:
+        """Gets links to RIPE/RIS collectors from their docs
+
+        This includes dead collectors, which the CollectorRegistry skips
+        for months that they have no dumps
+        """
+
         prepended_url = "https://data.ris.ripe.net/rrc"
-        # Links to collectors
         links = [
             x
             for x in self._get_hrefs(requests_cache_path)
             if x.startswith(prepended_url)
         ]
-        # Listed as dead links on their website
-        # TODO: don't hardcode this
-        dead_links = [prepended_url + x for x in ("02/", "08/", "09/")]
-        links = [x for x in links if x not in dead_links]
-        if len(links) != 23:
-            warnings.warn(f"Expected 23 collectors from RIPE, got {len(links)}")  # noqa
-        # Return the links to the dumps from the collector links
-        return tuple(
-            [dl_time.strftime(f"{x}/%Y.%m/bview.%Y%m%d.%H00.gz") for x in links]
-        )
+        # 23 live collectors and 3 dead ones (rrc02, rrc08 and rrc09)
+        if len(links) != 26:
+            warnings.warn(f"Expected 26 collectors from RIPE, got {len(links)}")  # noqa
+        return tuple(links)
+
+    def get_month_url(self, collector_url: str, dl_time: datetime) -> str:
+        return dl_time.strftime(f"{collector_url}/%Y.%m/")
+
+    def get_ec_file_sizes(
+        self,
+        urls: tuple[str, ...],
+        requests_cache_path: Path,
+        rate_limiter: HostRateLimiter | None = None,
+    ) -> dict[str, tuple[int, int]]:
+        """Gets sizes from the listing of each collector's month directory"""
+
+        return self._get_listing_ec_file_sizes(urls, requests_cache_path, rate_limiter)
@@ -2,6 +2,9 @@ import warnings
 from datetime import datetime
 from pathlib import Path
 
+from mrt_collector.rate_limiter import HostRateLimiter
+
+from .collector_registry import CollectorRegistry
 from .source import Source
 
 
@@ -10,11 +13,24 @@ class RouteViews(Source):
 
     URL: str = "http://archive.routeviews.org"
 
-    def get_urls(self, dl_time: datetime, requests_cache_path: Path) -> tuple[str, ...]:
+    def get_urls(
+        self,
+        dl_time: datetime,
+        requests_cache_path: Path,
+        registry: CollectorRegistry | None = None,
+    ) -> tuple[str, ...]:
         """Gets URLs of MRT RIB dumps for route views"""
 
         assert dl_time.hour % 2 == 0, "route views only downloads every two hours"
-        # Links to collectors
+        links = self._get_live_collectors(dl_time, requests_cache_path, registry)
+        # Return the links to the dumps from the collector links
+        return tuple(
+            [dl_time.strftime(f"{x}%Y.%m/RIBS/rib.%Y%m%d.%H00.bz2") for x in links]
+        )
+
+    def discover_collectors(self, requests_cache_path: Path) -> tuple[str, ...]:
+        """Gets links to route views collectors from their archive"""
+
         links = [
             f"{self.URL}{x}/"
             for x in self._get_hrefs(requests_cache_path)
@@ -22,7 +38,17 @@ class RouteViews(Source):
         ]
         if len(links) != 55:
             warnings.warn(f"Expected 55 collectors from route views, got {len(links)}")  # noqa
-        # Return the links to the dumps from the collector links
-        return tuple(
-            [dl_time.strftime(f"{x}%Y.%m/RIBS/rib.%Y%m%d.%H00.bz2") for x in links]
-        )
+        return tuple(links)
+
+    def get_month_url(self, collector_url: str, dl_time: datetime) -> str:
+        return dl_time.strftime(f"{collector_url}%Y.%m/RIBS/")
+
+    def get_ec_file_sizes(
+        self,
+        urls: tuple[str, ...],
+        requests_cache_path: Path,
+        rate_limiter: HostRateLimiter | None = None,
+    ) -> dict[str, tuple[int, int]]:
+        """Gets sizes from the listing of each collector's month directory"""
+
+        return self._get_listing_ec_file_sizes(urls, requests_cache_path, rate_limiter)
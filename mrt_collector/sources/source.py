@@ -1,16 +1,32 @@
+import re
 from abc import ABC, abstractmethod
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import unquote
 
+import requests
 from bs4 import BeautifulSoup
 from requests_cache import CachedSession
 
+from mrt_collector.rate_limiter import HostRateLimiter
+
+from .collector_registry import CollectorRegistry
+
 
 class Source(ABC):
     """Base class for a source for MRT RIB dumps"""
 
     sources: tuple[type["Source"], ...] = ()
 
+    # Sizes in directory listings, i.e. 102760448, 98M, or 1.6G
+    LISTING_SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)([KMGT]?)")
+    # i.e. the 2024.01 of .../2024.01/RIBS/
+    LISTING_MONTH_RE = re.compile(r"/(\d{4})\.(\d{2})/")
+    # Seconds that a cached listing is reused for while dumps may still be
+    # added to it (see get_listing)
+    LISTING_TTL: float = 60 * 60
+
     # https://stackoverflow.com/a/43057166/8903959
     def __init_subclass__(cls, **kwargs):
         """Overrides initializing subclasses"""
@@ -26,7 +42,7 @@ class Source(ABC):
 
         with CachedSession(requests_cache_path) as session:
             # Get the soup for the page. Mypy also doesn't see this method
-            resp = session.get(self.URL)
+            resp = self.get_listing(session, self.URL)
             resp.raise_for_status()
             soup = BeautifulSoup(resp.text, "html.parser")
             resp.close()
@@ -34,11 +50,176 @@ class Source(ABC):
         return tuple([a["href"] for a in soup.find_all("a", href=True)]) # type: ignore
 
     @abstractmethod
-    def get_urls(self, dl_time: datetime, requests_cache_path: Path) -> tuple[str, ...]:
-        """Gets URLs for MRT RIB dumps"""
+    def get_urls(
+        self,
+        dl_time: datetime,
+        requests_cache_path: Path,
+        registry: CollectorRegistry | None = None,
+    ) -> tuple[str, ...]:
+        """Gets URLs for MRT RIB dumps
+
+        Collectors come from the registry (defaults to CollectorRegistry()),
+        which skips collectors without dumps that month
+        """
 
         raise NotImplementedError
 
+    @abstractmethod
+    def discover_collectors(self, requests_cache_path: Path) -> tuple[str, ...]:
+        """Gets the URLs of this source's collectors from its website"""
+
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_month_url(self, collector_url: str, dl_time: datetime) -> str:
+        """Returns the URL of a collector's directory of dumps for dl_time's month"""
+
+        raise NotImplementedError
+
+    def _get_live_collectors(
+        self,
+        dl_time: datetime,
+        requests_cache_path: Path,
+        registry: CollectorRegistry | None,
+    ) -> tuple[str, ...]:
+        """Returns URLs of the collectors that have dumps for dl_time's month"""
+
+        registry = registry or CollectorRegistry()
+        collectors = registry.get_collectors(self, requests_cache_path)
+        return registry.get_live_collectors(
+            self, collectors, dl_time, requests_cache_path
+        )
+
+    def get_ec_file_sizes(
+        self,
+        urls: tuple[str, ...],
+        requests_cache_path: Path,
+        rate_limiter: HostRateLimiter | None = None,
+    ) -> dict[str, tuple[int, int]]:
+        """Returns {url: (expected compressed file size, tolerance)}
+
+        By default sources don't know any sizes, and every URL gets a HEAD
+        request instead. Sources with directory listings can override this
+        to use _get_listing_ec_file_sizes. URLs left out of the dict fall
+        back to HEAD requests.
+        """
+
+        return dict()
+
+    def _get_listing_ec_file_sizes(
+        self,
+        urls: tuple[str, ...],
+        requests_cache_path: Path,
+        rate_limiter: HostRateLimiter | None = None,
+    ) -> dict[str, tuple[int, int]]:
+        """Gets sizes from the directory listing that contains each URL
+
+        One listing is fetched (and cached) per directory, rather than one
+        HEAD request per file. Listings often abbreviate sizes (i.e. 98M),
+        so each size comes with a tolerance in bytes (0 if exact).
+        URLs that aren't in their listing (or whose listing is unavailable)
+        are left out, so that they fall back to a HEAD request.
+        """
+
+        urls_by_dir: defaultdict[str, list[str]] = defaultdict(list)
+        for url in urls:
+            urls_by_dir[url.rsplit("/", 1)[0] + "/"].append(url)
+
+        sizes = dict()
+        with CachedSession(requests_cache_path) as session:
+            for dir_url, dir_urls in urls_by_dir.items():
+                try:
+                    listing_sizes = self._get_listing_sizes(
+                        session, dir_url, rate_limiter
+                    )
+                except Exception as e:  # noqa: BLE001
+                    print(f"Listing {dir_url} failed due to {e} {type(e)}")
+                    continue
+                for url in dir_urls:
+                    fname = unquote(url.rsplit("/", 1)[1])
+                    if fname in listing_sizes:
+                        sizes[url] = listing_sizes[fname]
+        return sizes
+
+    def _get_listing_sizes(
+        self,
+        session: CachedSession,
+        dir_url: str,
+        rate_limiter: HostRateLimiter | None,
+    ) -> dict[str, tuple[int, int]]:
+        """Parses an Apache or nginx directory listing into {fname: (size, tol)}"""
+
+        resp = self.get_listing(session, dir_url, rate_limiter)
+        resp.raise_for_status()
+        soup = BeautifulSoup(resp.text, "html.parser")
+        resp.close()
+
+        sizes = dict()
+        for a in soup.find_all("a", href=True):
+            # Listings are either a table (one row per file) or preformatted
+            # text, with the date and size following the link
+            row = a.find_parent("tr")
+            text = row.get_text(" ") if row else str(a.next_sibling or "")
+            size_tokens = [x for x in text.split() if self.LISTING_SIZE_RE.fullmatch(x)]
+            if size_tokens:
+                fname = unquote(str(a["href"]).rsplit("/", 1)[-1])
+                sizes[fname] = self._parse_listing_size(size_tokens[-1])
+        return sizes
+
+    def get_listing(
+        self,
+        session: CachedSession,
+        url: str,
+        rate_limiter: HostRateLimiter | None = None,
+    ) -> requests.Response:
+        """Returns the listing at url, from the cache unless it may be stale
+
+        Listings of months that were over when they were cached (with a
+        month of slack, since dumps are uploaded late) never change. Any
+        other listing is refetched once it's LISTING_TTL seconds old, so
+        that dumps published since (and their sizes) show up.
+        Cached responses don't count towards rate limits.
+        """
+
+        resp = session.get(url, timeout=60, only_if_cached=True)
+        # 504 means that it isn't cached
+        if resp.status_code != 504 and not self._listing_stale(url, resp.created_at):
+            return resp
+
+        if rate_limiter is not None:
+            rate_limiter.acquire(url)
+        resp = session.get(url, timeout=60, force_refresh=True)
+        if rate_limiter is not None:
+            rate_limiter.record(url, resp.status_code)
+        return resp
+
+    def _listing_stale(self, url: str, cached_at: datetime) -> bool:
+        """Returns True if a listing cached at cached_at may have changed since"""
+
+        match = self.LISTING_MONTH_RE.search(url)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            if (cached_at.year - year) * 12 + cached_at.month - month > 1:
+                return False
+        age = datetime.now(timezone.utc) - cached_at
+        return age.total_seconds() >= self.LISTING_TTL
+
+    def _parse_listing_size(self, size_str: str) -> tuple[int, int]:
+        """Converts a listing size (i.e. 102760448, 98M or 1.6G) into (size, tol)
+
+        Abbreviated sizes are only accurate to their last digit
+        """
+
+        match = self.LISTING_SIZE_RE.fullmatch(size_str)
+        assert match, f"Not a listing size: {size_str}"
+        number, unit = match.groups()
+        multiplier = 1024 ** " KMGT".index(unit or " ")
+        if multiplier == 1:
+            return int(number), 0
+        decimals = len(number.split(".")[1]) if "." in number else 0
+        tolerance = multiplier // 10**decimals
+        return int(float(number) * multiplier), tolerance
+
     @property
     @abstractmethod
     def URL(self) -> str:
@@ -0,0 +1,75 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from mrt_collector.analyzers import AnalysisEngine, MHExportAnalyzer, PSVAnalyzer
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.sources import RouteViews
+
+URL = "http://archive.routeviews.org/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2"
+
+
+class RecordingAnalyzer(PSVAnalyzer):
+    def __init__(self, columns: tuple[str, ...]) -> None:
+        self.COLUMNS = columns
+        self.events: list[Any] = list()
+
+    def start(self) -> None:
+        self.events.append("start")
+
+    def process_row(self, row: tuple[Any, ...]) -> None:
+        self.events.append(row)
+
+    def finish(self) -> None:
+        self.events.append("finish")
+
+
+def _mrt_file(tmp_path: Path, lines: list[str]) -> MRTFile:
+    mrt_file = MRTFile(
+        URL,
+        RouteViews(),
+        raw_dir=tmp_path,
+        parsed_dir=tmp_path,
+        parsed_line_count_dir=tmp_path,
+    )
+    mrt_file.parsed_path_psv.write_text("\n".join(lines) + "\n")
+    return mrt_file
+
+
+def test_engine_projects_rows_per_analyzer(tmp_path: Path) -> None:
+    mrt_file = _mrt_file(
+        tmp_path,
+        [
+            "type|as_path|prefix|atomic",
+            "A|3356 13335|1.2.0.0/16|false",
+            "A|174|10.0.0.0/8|true",
+        ],
+    )
+    prefixes = RecordingAnalyzer(("prefix",))
+    both = RecordingAnalyzer(("atomic", "type"))
+    engine = AnalysisEngine((prefixes, both), batch_size=1)
+    assert engine.columns == ("prefix", "atomic", "type")
+
+    engine.run((mrt_file,))
+    assert prefixes.events == ["start", ("1.2.0.0/16",), ("10.0.0.0/8",), "finish"]
+    assert both.events == ["start", ("false", "A"), ("true", "A"), "finish"]
+
+
+def test_mh_analyzer_without_rows(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """MH data is loaded when started, so it's dumped even without rows"""
+
+    prefixes_path = tmp_path / "prefixes.json"
+    monkeypatch.setattr(MHExportAnalyzer, "_init_data", lambda self: {1: {2: set()}})
+    monkeypatch.setattr(MHExportAnalyzer, "create_graphs", lambda self: None)
+    monkeypatch.setattr(MHExportAnalyzer, "json_prefixes_path", prefixes_path)
+    monkeypatch.setattr(
+        MHExportAnalyzer, "json_prepending_path", tmp_path / "prepending.json"
+    )
+
+    mrt_file = _mrt_file(tmp_path, ["type|as_path|prefix"])
+    AnalysisEngine((MHExportAnalyzer(),)).run((mrt_file,))
+    assert json.loads(prefixes_path.read_text()) == {"1": {"2": []}}
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mrt_collector.analyzers import AtomicExportAnalyzer
+from mrt_collector.mrt_decoder import PSV_COLUMNS
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.sources import RouteViews
+
+pytest.importorskip("pyarrow")
+
+ROWS: tuple[dict[str, str], ...] = (
+    {"type": "A", "prefix": "1.2.0.0/16", "atomic": "true", "aggr_asn": "64512"},
+    {"type": "A", "prefix": "1.2.0.0/16", "atomic": "true", "aggr_asn": "64512"},
+    {"type": "A", "prefix": "1.2.0.0/16", "atomic": "false", "aggr_asn": "3356"},
+    {"type": "A", "prefix": "2001:db8::/32", "atomic": "true"},
+    {"type": "A", "prefix": "10.0.0.0/8", "atomic": "false", "aggr_asn": "13335"},
+    {"type": "A", "prefix": "192.0.2.0/24", "atomic": "false"},
+    {"type": "W", "prefix": "198.51.100.0/24", "atomic": "true"},
+)
+
+
+def _mrt_file(
+    tmp_path: Path, rows: tuple[dict[str, str], ...], collector: str = "route-views2"
+) -> MRTFile:
+    """Returns an MRTFile whose parsed PSV (with rows) was converted to Parquet"""
+
+    mrt_file = MRTFile(
+        f"http://archive.routeviews.org/{collector}/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2",
+        RouteViews(),
+        raw_dir=tmp_path,
+        parsed_dir=tmp_path,
+        parsed_line_count_dir=tmp_path,
+    )
+    lines = ["|".join(PSV_COLUMNS)]
+    for i, row in enumerate(rows):
+        # Numeric looking origin_asns and empty columns, as in real dumps
+        row = {"timestamp": "1704067200.0", "origin_asns": str(64496 + i), **row}  # noqa: PLW2901
+        lines.append("|".join(row.get(x, "") for x in PSV_COLUMNS))
+    mrt_file.parsed_path_psv.write_text("\n".join(lines) + "\n")
+    mrt_file.convert_to_parquet()
+    return mrt_file
+
+
+def _atomic_records(
+    tmp_path: Path, mrt_file: MRTFile, cpus: int, vectorized: bool
+) -> np.ndarray:
+    analyzer = AtomicExportAnalyzer(tmp_path, cpus=cpus, vectorized=vectorized)
+    analyzer.get_atomic_data((mrt_file,))
+    return analyzer.atomic_data.records
+
+
+def test_vectorized_parquet_matches_rows(tmp_path: Path) -> None:
+    """PSV -> Parquet -> vectorized atomic data equals the row by row data"""
+
+    mrt_file = _mrt_file(tmp_path, ROWS)
+    assert mrt_file.parquet_path.exists()
+
+    expected = _atomic_records(tmp_path, mrt_file, cpus=1, vectorized=False)
+    assert len(expected) == 4
+    actual = _atomic_records(tmp_path, mrt_file, cpus=1, vectorized=True)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_vectorized_psv_chunks_match_rows(tmp_path: Path) -> None:
+    """Without a Parquet file, PSV chunks are read into the vectorized kernel"""
+
+    mrt_file = _mrt_file(tmp_path, ROWS * 50)
+    expected = _atomic_records(tmp_path, mrt_file, cpus=1, vectorized=False)
+    mrt_file.parquet_path.unlink()
+    actual = _atomic_records(tmp_path, mrt_file, cpus=2, vectorized=True)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_atomic_prefix_sets(tmp_path: Path) -> None:
+    mrt_file = _mrt_file(tmp_path, ROWS)
+    analyzer = AtomicExportAnalyzer(tmp_path, cpus=1, vectorized=True)
+    analyzer.get_atomic_data((mrt_file,))
+
+    assert set(analyzer.atomic_prefixes) == {"1.2.0.0/16", "2001:db8::/32"}
+    assert set(analyzer.aggr_asn_prefixes) == {"1.2.0.0/16", "10.0.0.0/8"}
+    assert set(analyzer.atomic_and_aggr_asn_prefixes) == {"1.2.0.0/16"}
+
+
+def test_parallel_merge_matches_single_process(tmp_path: Path) -> None:
+    """Partial data of chunks, merged in pairs, equals one single process pass"""
+
+    # Each file is (at least) a chunk
+    mrt_files = tuple(
+        [
+            _mrt_file(
+                tmp_path,
+                (
+                    *ROWS[i:],
+                    {"type": "A", "prefix": f"10.{i}.0.0/16", "atomic": "true"},
+                ),
+                collector=f"route-views{i}",
+            )
+            for i in range(5)
+        ]
+    )
+    analyzers = [
+        AtomicExportAnalyzer(tmp_path, cpus=cpus, vectorized=False) for cpus in (1, 3)
+    ]
+    for analyzer in analyzers:
+        analyzer.get_atomic_data(mrt_files)
+    expected, actual = [x.atomic_data.records for x in analyzers]
+    assert len(expected) == 9
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,104 @@
+from collections import Counter
+from itertools import pairwise
+from pathlib import Path
+
+import pytest
+
+from mrt_collector.chunked_reader import PSVChunk, map_reduce_psvs, split_psv
+from mrt_collector.psv_index import PSVIndexer, psv_index_path
+from mrt_collector.psv_io import open_psv
+
+ROWS = 2000
+
+
+def _write_psv(path: Path, index: bool = False) -> list[str]:
+    """Writes a PSV of ROWS rows (indexed while written), returning its prefixes"""
+
+    prefixes = [f"10.{i // 256 % 256}.{i % 256}.0/24" for i in range(ROWS)]
+    lines = ["type|prefix|as_path"]
+    lines.extend(
+        f"A|{x}|{' '.join(['3356'] * (i % 5 + 1))}" for i, x in enumerate(prefixes)
+    )
+    data = ("\n".join(lines) + "\n").encode()
+    with open_psv(path, "wb") as f:
+        if index:
+            indexer = PSVIndexer(f, interval=64)
+            indexer.write(data)
+            indexer.index.save(psv_index_path(path))
+        else:
+            f.write(data)
+    return prefixes
+
+
+def count_prefixes(chunk: PSVChunk) -> Counter[str]:
+    return Counter(x for (x,) in chunk.iter_fields(("prefix",)))
+
+
+def add_counters(a: Counter[str], b: Counter[str]) -> Counter[str]:
+    a.update(b)
+    return a
+
+
+@pytest.mark.parametrize("index", [False, True])
+def test_split_psv_covers_every_row_once(tmp_path: Path, index: bool) -> None:
+    path = tmp_path / "rib.psv"
+    prefixes = _write_psv(path, index=index)
+
+    chunks = split_psv(path, chunk_size=4096)
+    assert len(chunks) > 5
+    assert chunks[0].start == len(b"type|prefix|as_path\n")
+    assert chunks[-1].end == path.stat().st_size
+    for a, b in pairwise(chunks):
+        assert a.end == b.start
+    assert [
+        x.decode().split("|")[1] for c in chunks for x in c.iter_lines()
+    ] == prefixes
+    assert chunks[0].columns == ("type", "prefix", "as_path")
+
+
+def test_split_compressed_psv(tmp_path: Path) -> None:
+    path = tmp_path / "rib.psv.gz"
+    prefixes = _write_psv(path)
+
+    (chunk,) = split_psv(path, chunk_size=4096)
+    assert chunk.end == -1
+    assert [x for (x,) in chunk.iter_fields(("prefix",))] == prefixes
+
+
+@pytest.mark.parametrize(
+    ("cpus", "tree_reduce"), [(1, False), (2, False), (2, True), (3, True)]
+)
+def test_map_reduce_equals_single_pass(
+    tmp_path: Path, cpus: int, tree_reduce: bool
+) -> None:
+    paths = [tmp_path / "a.psv", tmp_path / "b.psv.gz"]
+    expected: Counter[str] = Counter()
+    for path in paths:
+        expected.update(_write_psv(path))
+
+    result = map_reduce_psvs(
+        paths,
+        count_prefixes,
+        add_counters,
+        Counter(),
+        cpus=cpus,
+        chunk_size=4096,
+        tree_reduce=tree_reduce,
+    )
+    assert result == expected
+
+
+def test_indexer_output_matches_plain_write(tmp_path: Path) -> None:
+    """Indexed PSVs are written through unchanged"""
+
+    _write_psv(tmp_path / "a.psv")
+    _write_psv(tmp_path / "b.psv", index=True)
+    assert (tmp_path / "a.psv").read_bytes() == (tmp_path / "b.psv").read_bytes()
+
+
+def test_tree_reduce_without_chunks() -> None:
+    initial: Counter[str] = Counter({"x": 1})
+    result = map_reduce_psvs(
+        (), count_prefixes, add_counters, initial, cpus=2, tree_reduce=True
+    )
+    assert result is initial
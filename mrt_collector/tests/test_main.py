@@ -0,0 +1,56 @@
+import pytest
+
+from mrt_collector import __main__
+
+
+@pytest.mark.parametrize(
+    ("argv", "error"),
+    [
+        (["-dt", "01/01/2024/00", "--to", "01/02/2024/00"], "--to requires --from"),
+        (["--from", "01/01/2024/00"], "--from requires --to"),
+        (
+            ["--from", "01/01/2024/00", "--to", "01/02/2024/00", "--every", "0"],
+            "--every must be a positive multiple of 8",
+        ),
+        (
+            ["--from", "01/01/2024/00", "--to", "01/02/2024/00", "--every", "-8"],
+            "--every must be a positive multiple of 8",
+        ),
+        (
+            ["--from", "01/02/2024/00", "--to", "01/01/2024/00"],
+            "is after --to",
+        ),
+        (["--from", "01/01/2024/04", "--to", "01/02/2024/00"], "RIPE dumps every"),
+        (["--from", "2024-01-01", "--to", "01/02/2024/00"], "Invalid datetime"),
+    ],
+)
+def test_bad_batch_arguments(
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    argv: list[str],
+    error: str,
+) -> None:
+    """Bad batch arguments are usage errors, rather than tracebacks"""
+
+    def run_batch(*args: object) -> None:
+        raise AssertionError("Ran a batch with bad arguments")
+
+    monkeypatch.setattr(__main__, "run_batch", run_batch)
+    monkeypatch.setattr("sys.argv", ["mrt_collector", *argv])
+    with pytest.raises(SystemExit) as e:
+        __main__.main()
+    assert e.value.code == 2
+    assert error in capsys.readouterr().err
+
+
+def test_batch_arguments(monkeypatch: pytest.MonkeyPatch) -> None:
+    batches = list()
+    monkeypatch.setattr(__main__, "run_batch", lambda *args: batches.append(args))
+    monkeypatch.setattr(
+        "sys.argv",
+        ["mrt_collector", "--from", "01/01/2024/00", "--to", "01/02/2024/00"],
+    )
+    __main__.main()
+    ((_, dl_times, limit_files_to),) = batches
+    assert [x.hour for x in dl_times] == [0, 8, 16, 0]
+    assert limit_files_to == 0
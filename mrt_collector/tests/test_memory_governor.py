@@ -0,0 +1,79 @@
+from pathlib import Path
+
+from mrt_collector.memory_governor import MemoryGovernor, collector_key, run_measured
+
+RIS_URL = "https://data.ris.ripe.net/rrc00/2024.01/bview.20240101.0000.gz"
+RV_URL = "http://archive.routeviews.org/route-views2/bgpdata/2024.01/RIBS/rib.bz2"
+
+
+def _governor(tmp_path: Path) -> MemoryGovernor:
+    governor = MemoryGovernor(
+        tmp_path / "memory.db",
+        headroom=0,
+        default_estimate=100,
+        max_load_per_cpu=10**6,
+    )
+    governor.budget = 1000
+    return governor
+
+
+def test_collector_key() -> None:
+    assert collector_key(RIS_URL) == "data.ris.ripe.net/rrc00"
+    assert collector_key(RV_URL) == "archive.routeviews.org/route-views2/bgpdata"
+
+
+def test_estimates_learn_and_persist(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+    assert governor.estimate("parse_mrt", RIS_URL) == 100
+
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=400)
+    assert governor.estimate("parse_mrt", RIS_URL) == 400
+    # Other collectors fall back to the largest peak of the task
+    assert governor.estimate("parse_mrt", RV_URL) == 400
+    assert governor.estimate("count_lines", RV_URL) == 100
+
+    # Halfway down towards lower peaks, straight up to higher ones
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=200)
+    assert governor.estimate("parse_mrt", RIS_URL) == 300
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=500)
+    assert governor.estimate("parse_mrt", RIS_URL) == 500
+
+    assert _governor(tmp_path).estimate("parse_mrt", RIS_URL) == 500
+
+
+def test_estimates_for_several_processes(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+    assert governor.estimate("parse_mrt", RIS_URL, processes=4) == 400
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=300)
+    # Without previous runs for a collector, each process is estimated alone
+    assert governor.estimate("parse_mrt", RV_URL, processes=4) == 1200
+    assert governor.estimate("parse_mrt", RIS_URL, processes=4) == 300
+    assert governor.try_admit(1, "parse_mrt", RIS_URL, processes=4)
+    assert not governor.try_admit(2, "parse_mrt", RV_URL, processes=4)
+
+
+def test_try_admit_within_budget(tmp_path: Path) -> None:
+    governor = _governor(tmp_path)
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=400)
+
+    assert governor.try_admit(1, "parse_mrt", RIS_URL)
+    assert governor.try_admit(2, "parse_mrt", RIS_URL)
+    assert not governor.try_admit(3, "parse_mrt", RIS_URL)
+    assert governor.try_admit(3, "count_lines", RIS_URL)
+    governor.release(1, "parse_mrt", RIS_URL)
+    assert governor.try_admit(4, "parse_mrt", RIS_URL)
+
+
+def test_try_admit_alone_over_budget(tmp_path: Path) -> None:
+    """A task runs when nothing else is, even if its estimate is over budget"""
+
+    governor = _governor(tmp_path)
+    governor.release(0, "parse_mrt", RIS_URL, peak_rss=5000)
+    assert governor.try_admit(1, "parse_mrt", RIS_URL)
+    assert not governor.try_admit(2, "count_lines", RIS_URL)
+
+
+def test_run_measured() -> None:
+    result, peak = run_measured(sum, [1, 2, 3])
+    assert result == 6
+    assert peak > 0
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+from mrt_collector import head_cache, memory_governor, mrt_collector
+from mrt_collector.head_cache import HeadCache
+from mrt_collector.memory_governor import MemoryGovernor
+from mrt_collector.mrt_collector import MRTCollector
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.sources import RouteViews, collector_registry
+
+
+def test_init_leaves_user_cache_alone(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Shared SQLite caches are only created once they're used"""
+
+    cache_dir = tmp_path / "cache"
+    for module in (head_cache, memory_governor, collector_registry):
+        monkeypatch.setattr(module, "user_cache_path", lambda _: cache_dir)
+
+    collector = MRTCollector(cpus=1, base_dir=tmp_path / "base")
+    assert not cache_dir.exists()
+    assert collector.manifest_path.exists()
+
+    assert collector.head_cache.get("http://example.com/rib.bz2") is None
+    assert (cache_dir / "head_cache.db").exists()
+    assert collector.memory_governor.estimate("parse_mrt", "http://example.com") > 0
+    assert (cache_dir / "memory.db").exists()
+    assert not (cache_dir / "collectors.db").exists()
+
+
+def test_stream_failures_are_downloaded_by_the_pipeline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Failed streams don't download on their own, bypassing the rate limiter"""
+
+    def fail(*args: object, **kwargs: object) -> int:
+        raise RuntimeError("parser exited with 1")
+
+    def download_raw(*args: object, **kwargs: object) -> int:
+        raise AssertionError("Downloaded outside of the download stage")
+
+    monkeypatch.setattr(mrt_collector, "bgpkit_parser_stream", fail)
+    monkeypatch.setattr(MRTFile, "download_raw", download_raw)
+    mrt_file = MRTFile(
+        "http://archive.routeviews.org/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2",
+        RouteViews(),
+        raw_dir=tmp_path,
+        parsed_dir=tmp_path,
+        parsed_line_count_dir=tmp_path,
+    )
+    assert mrt_collector.stream_parse_mrt(mrt_file) == 0
+    assert not mrt_file.parse_succeeded
+
+    collector = MRTCollector(
+        cpus=2,
+        base_dir=tmp_path / "base",
+        stream_parse=True,
+        memory_governor=MemoryGovernor(tmp_path / "memory.db"),
+        head_cache=HeadCache(tmp_path / "head_cache.db"),
+    )
+    stages = collector.get_pipeline_stages()
+    assert [x.func for x in stages[:3]] == [
+        mrt_collector.stream_parse_mrt,
+        mrt_collector.download_mrt,
+        mrt_collector.parse_mrt,
+    ]
+    assert stages[0].optional
+    assert stages[1].rate_limited
+    # Raw files of failed streams are deleted once parsed, unless keep_raw
+    assert stages[2].args(mrt_file)[-1] is False
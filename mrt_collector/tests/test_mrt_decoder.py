@@ -0,0 +1,162 @@
+import io
+import struct
+from socket import AF_INET, AF_INET6, inet_pton
+
+import pytest
+
+from mrt_collector.mrt_decoder import (
+    PEER_INDEX_TABLE,
+    PSV_COLUMNS,
+    RIB_IPV4_UNICAST,
+    RIB_IPV6_UNICAST,
+    TABLE_DUMP,
+    TABLE_DUMP_V2,
+    TableDumpV2Decoder,
+)
+
+TIMESTAMP = 1704067200
+
+
+def _record(type_: int, subtype: int, message: bytes) -> bytes:
+    return struct.pack("!IHHI", TIMESTAMP, type_, subtype, len(message)) + message
+
+
+def _peer_index_table(peers: list[tuple[str, int]]) -> bytes:
+    """Returns a PEER_INDEX_TABLE record of (peer ip, peer asn) peers"""
+
+    message = inet_pton(AF_INET, "192.0.2.1") + struct.pack("!H", 0)
+    message += struct.pack("!H", len(peers))
+    for peer_ip, peer_asn in peers:
+        ipv6 = ":" in peer_ip
+        # 4 byte ASNs, and IPv6 addresses if needed
+        message += bytes([2 | ipv6]) + inet_pton(AF_INET, "192.0.2.1")
+        message += inet_pton(AF_INET6 if ipv6 else AF_INET, peer_ip)
+        message += struct.pack("!I", peer_asn)
+    return _record(TABLE_DUMP_V2, PEER_INDEX_TABLE, message)
+
+
+def _attribute(type_: int, value: bytes, flags: int = 0x40) -> bytes:
+    return bytes([flags, type_, len(value)]) + value
+
+
+def _as_path(*segments: tuple[int, tuple[int, ...]]) -> bytes:
+    value = b"".join(
+        bytes([segment_type, len(asns)]) + struct.pack(f"!{len(asns)}I", *asns)
+        for segment_type, asns in segments
+    )
+    return _attribute(2, value)
+
+
+def _rib(subtype: int, prefix: str, entries: list[tuple[int, bytes]]) -> bytes:
+    """Returns a RIB record of (peer index, attributes) entries for a prefix"""
+
+    address, length = prefix.split("/")
+    family = AF_INET6 if subtype == RIB_IPV6_UNICAST else AF_INET
+    prefix_bytes = (int(length) + 7) // 8
+    message = struct.pack("!IB", 0, int(length))
+    message += inet_pton(family, address)[:prefix_bytes]
+    message += struct.pack("!H", len(entries))
+    for peer_index, attributes in entries:
+        message += struct.pack("!HIH", peer_index, TIMESTAMP, len(attributes))
+        message += attributes
+    return _record(TABLE_DUMP_V2, subtype, message)
+
+
+def _decode(data: bytes) -> list[dict[str, str]]:
+    rows = TableDumpV2Decoder().iter_rows(io.BytesIO(data))
+    return [dict(zip(PSV_COLUMNS, row, strict=True)) for row in rows]
+
+
+def test_decode_ipv4_and_ipv6_ribs() -> None:
+    ipv4_attributes = (
+        _attribute(1, b"\x00")
+        + _as_path((2, (3356, 13335)))
+        + _attribute(3, inet_pton(AF_INET, "198.51.100.1"))
+        + _attribute(4, struct.pack("!I", 10))
+        + _attribute(8, struct.pack("!HH", 3356, 100) + struct.pack("!HH", 65535, 1))
+    )
+    aggregated_attributes = (
+        _attribute(1, b"\x02")
+        + _as_path((2, (174,)), (1, (64512, 64513)))
+        + _attribute(6, b"")
+        + _attribute(7, struct.pack("!I", 174) + inet_pton(AF_INET, "203.0.113.9"))
+        + _attribute(32, struct.pack("!III", 174, 1, 2))
+    )
+    ipv6_attributes = (
+        _attribute(1, b"\x01")
+        + _as_path((2, (6939, 3356, 15169)))
+        + _attribute(5, struct.pack("!I", 200))
+        + _attribute(14, bytes([16]) + inet_pton(AF_INET6, "2001:db8::1"), 0x80)
+        + _attribute(35, struct.pack("!I", 6939))
+    )
+    data = (
+        _peer_index_table([("192.0.2.10", 3356), ("2001:db8::10", 6939)])
+        + _rib(
+            RIB_IPV4_UNICAST,
+            "1.2.0.0/16",
+            # The same attributes twice, the second from the cache
+            [(0, ipv4_attributes), (0, aggregated_attributes), (0, ipv4_attributes)],
+        )
+        + _rib(RIB_IPV6_UNICAST, "2001:db8:8000::/33", [(1, ipv6_attributes)])
+    )
+
+    rows = _decode(data)
+    common = {"type": "A", "timestamp": str(TIMESTAMP), "peer_asn": "3356"}
+    ipv4_row = {
+        **common,
+        "peer_ip": "192.0.2.10",
+        "prefix": "1.2.0.0/16",
+        "as_path": "3356 13335",
+        "origin_asns": "13335",
+        "origin": "IGP",
+        "next_hop": "198.51.100.1",
+        "local_pref": "",
+        "med": "10",
+        "communities": "3356:100 65535:1",
+        "atomic": "false",
+        "aggr_asn": "",
+        "aggr_ip": "",
+        "only_to_customer": "",
+    }
+    assert rows == [
+        ipv4_row,
+        {
+            **ipv4_row,
+            "as_path": "174 {64512,64513}",
+            "origin_asns": "64512 64513",
+            "origin": "INCOMPLETE",
+            "next_hop": "",
+            "med": "",
+            "communities": "lg:174:1:2",
+            "atomic": "true",
+            "aggr_asn": "174",
+            "aggr_ip": "203.0.113.9",
+        },
+        ipv4_row,
+        {
+            **ipv4_row,
+            "peer_ip": "2001:db8::10",
+            "peer_asn": "6939",
+            "prefix": "2001:db8:8000::/33",
+            "as_path": "6939 3356 15169",
+            "origin_asns": "15169",
+            "origin": "EGP",
+            "next_hop": "2001:db8::1",
+            "local_pref": "200",
+            "med": "",
+            "communities": "",
+            "only_to_customer": "6939",
+        },
+    ]
+
+
+def test_table_dump_v1_is_rejected() -> None:
+    data = _record(TABLE_DUMP, 1, bytes(20))
+    with pytest.raises(ValueError, match="subtype 1"):
+        _decode(data)
+
+
+def test_truncated_record() -> None:
+    data = _peer_index_table([("192.0.2.10", 3356)])
+    with pytest.raises(ValueError, match="truncated"):
+        _decode(data[:-1])
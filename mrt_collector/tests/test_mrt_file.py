@@ -0,0 +1,220 @@
+import json
+import re
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+
+from mrt_collector import mrt_file as mrt_file_module
+from mrt_collector.manifest import Manifest
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.sources import RouteViews
+
+URL = "http://archive.routeviews.org/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2"
+DATA = bytes(range(256)) * 64
+
+
+class FakeRaw:
+    def __init__(self, body: bytes) -> None:
+        self.body: bytes = body
+
+    def stream(self, size: int, decode_content: bool = True) -> Iterator[bytes]:
+        for i in range(0, len(self.body), size):
+            yield self.body[i : i + size]
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: bytes, headers: dict[str, str]) -> None:
+        self.status_code: int = status_code
+        self.raw: FakeRaw = FakeRaw(body)
+        self.headers: dict[str, str] = headers
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+    def __enter__(self) -> "FakeResponse":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+class FakeClient:
+    """Serves DATA, honoring Range headers unless ranges is False"""
+
+    def __init__(self, ranges: bool = True) -> None:
+        self.ranges: bool = ranges
+        self.requests: list[dict[str, str]] = list()
+
+    def get(self, url: str, headers: dict[str, str], **kwargs: Any) -> FakeResponse:
+        self.requests.append(headers)
+        common = {"ETag": '"v1"'}
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", headers.get("Range", ""))
+        if not self.ranges or match is None:
+            return FakeResponse(200, DATA, {**common, "Content-Length": str(len(DATA))})
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(DATA) - 1
+        return FakeResponse(
+            206,
+            DATA[start : end + 1],
+            {**common, "Content-Range": f"bytes {start}-{end}/{len(DATA)}"},
+        )
+
+
+@pytest.fixture
+def mrt_file(tmp_path: Path) -> MRTFile:
+    mrt_file = MRTFile(
+        URL,
+        RouteViews(),
+        raw_dir=tmp_path,
+        parsed_dir=tmp_path,
+        parsed_line_count_dir=tmp_path,
+        expected_compressed_file_size=len(DATA),
+    )
+    mrt_file.DOWNLOAD_CHUNK_SIZE = 1000
+    return mrt_file
+
+
+def _use_client(monkeypatch: pytest.MonkeyPatch, client: FakeClient) -> None:
+    monkeypatch.setattr(mrt_file_module, "get_download_client", lambda: client)
+    monkeypatch.setattr(mrt_file_module.time, "sleep", lambda _: None)
+
+
+def test_segmented_download(mrt_file: MRTFile, monkeypatch: pytest.MonkeyPatch) -> None:
+    client = FakeClient()
+    _use_client(monkeypatch, client)
+
+    mrt_file.download_raw(segments=4)
+    assert mrt_file.raw_path.read_bytes() == DATA
+    assert not mrt_file.download_progress_path.exists()
+    assert len(client.requests) == 4
+
+
+def test_segmented_download_without_ranges(
+    mrt_file: MRTFile, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A 200 to a Range request never leaves a preallocated file behind"""
+
+    _use_client(monkeypatch, FakeClient(ranges=False))
+
+    succeeded, status_code = mrt_file.attempt_download_raw_segmented(4)
+    assert (succeeded, status_code) == (False, 200)
+    assert not mrt_file.raw_path.exists()
+    assert not mrt_file.download_progress_path.exists()
+    assert not mrt_file.download_succeeded
+
+    # Falls back to a single connection
+    mrt_file.download_raw(segments=4)
+    assert mrt_file.raw_path.read_bytes() == DATA
+
+
+def test_failed_download_cleans_up(
+    mrt_file: MRTFile, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Files without progress are removed even when the last retry raises"""
+
+    def fail(**kwargs: Any) -> tuple[bool, int]:
+        mrt_file.raw_path.write_bytes(bytes(len(DATA)))
+        raise requests.ConnectionError("reset")
+
+    _use_client(monkeypatch, FakeClient())
+    monkeypatch.setattr(mrt_file, "attempt_download_raw", fail)
+
+    with pytest.raises(requests.ConnectionError):
+        mrt_file.download_raw(retries=2)
+    assert not mrt_file.raw_path.exists()
+    assert not mrt_file.download_succeeded
+
+
+def test_range_resume_from_progress_file(
+    mrt_file: MRTFile, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A partial download resumes from its checkpoint, not from the file's end"""
+
+    client = FakeClient()
+    _use_client(monkeypatch, client)
+    checkpoint = 5000
+    # Bytes past the checkpoint may not have been flushed before a crash
+    mrt_file.raw_path.write_bytes(DATA[:checkpoint] + bytes(1000))
+    progress = mrt_file._new_download_progress()
+    progress.update(bytes=checkpoint, etag='"v1"', crc32=zlib.crc32(DATA[:checkpoint]))
+    with mrt_file.download_progress_path.open("w") as f:
+        json.dump(progress, f)
+
+    succeeded, status_code = mrt_file.attempt_download_raw()
+    assert (succeeded, status_code) == (True, 206)
+    assert client.requests == [{"Range": f"bytes={checkpoint}-", "If-Range": '"v1"'}]
+    assert mrt_file.raw_path.read_bytes() == DATA
+    assert not mrt_file.download_progress_path.exists()
+    assert mrt_file.record.raw_checksum == f"crc32:{zlib.crc32(DATA):08x}"
+
+
+def test_range_resume_ignores_other_urls(
+    mrt_file: MRTFile, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = FakeClient()
+    _use_client(monkeypatch, client)
+    mrt_file.raw_path.write_bytes(DATA[:5000])
+    progress = mrt_file._new_download_progress()
+    progress.update(url=URL + ".other", bytes=5000)
+    with mrt_file.download_progress_path.open("w") as f:
+        json.dump(progress, f)
+
+    assert mrt_file.attempt_download_raw() == (True, 200)
+    assert client.requests == [{}]
+    assert mrt_file.raw_path.read_bytes() == DATA
+
+
+def _manifest_mrt_file(tmp_path: Path, parsed_compression: str = "") -> MRTFile:
+    return MRTFile(
+        URL,
+        RouteViews(),
+        raw_dir=tmp_path,
+        parsed_dir=tmp_path,
+        parsed_line_count_dir=tmp_path,
+        expected_compressed_file_size=len(DATA),
+        manifest=Manifest(tmp_path / "manifest.db"),
+        parsed_compression=parsed_compression,
+    )
+
+
+def test_manifest_drops_records_of_changed_files(tmp_path: Path) -> None:
+    mrt_file = _manifest_mrt_file(tmp_path)
+    mrt_file.raw_path.write_bytes(DATA)
+    mrt_file.parsed_path_psv.write_text("type|prefix\nA|1.2.0.0/16\n")
+    assert mrt_file.download_succeeded
+    assert mrt_file.parse_succeeded
+    assert mrt_file.count_parsed_lines() == 1
+
+    # A new MRTFile trusts the manifest, as long as the files are unchanged
+    mrt_file = _manifest_mrt_file(tmp_path)
+    assert mrt_file.download_succeeded
+    assert mrt_file.parse_succeeded
+    assert mrt_file.parsed_lines_counted
+
+    # Truncated raw file
+    mrt_file.raw_path.write_bytes(DATA[:-1])
+    mrt_file = _manifest_mrt_file(tmp_path)
+    assert not mrt_file.download_succeeded
+    assert not mrt_file.record.raw_size
+
+    # Deleted parsed file, which also drops its line count
+    mrt_file.parsed_path_psv.unlink()
+    mrt_file = _manifest_mrt_file(tmp_path)
+    assert not mrt_file.parse_succeeded
+    assert mrt_file.manifest is not None
+    record = mrt_file.manifest.get(URL)
+    assert record is not None
+    assert record.status == "new"
+
+
+def test_manifest_drops_records_of_other_compressions(tmp_path: Path) -> None:
+    mrt_file = _manifest_mrt_file(tmp_path)
+    mrt_file.parsed_path_psv.write_text("type|prefix\nA|1.2.0.0/16\n")
+    assert mrt_file.parse_succeeded
+
+    assert not _manifest_mrt_file(tmp_path, parsed_compression="zstd").parse_succeeded
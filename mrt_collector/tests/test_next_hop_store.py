@@ -0,0 +1,108 @@
+import random
+from collections import defaultdict
+from itertools import pairwise
+
+import numpy as np
+import pytest
+
+from mrt_collector.analyzers import next_hop_store
+from mrt_collector.analyzers.next_hop_store import NextHopStore, asn_slices
+
+NextHops = dict[int, dict[str, set[tuple[int, bool]]]]
+
+
+def _as_paths(count: int) -> list[tuple[list[int], str]]:
+    """Returns count (reversed as path, prefix)s, some prepended or too short"""
+
+    rng = random.Random(count)  # noqa: S311
+    as_paths = list()
+    for _ in range(count):
+        as_path = [rng.randrange(1, 20) for _ in range(rng.randrange(1, 6))]
+        if rng.random() < 0.2:
+            as_path.insert(1, as_path[0])
+        as_paths.append((as_path, f"10.{rng.randrange(30)}.0.0/16"))
+    return as_paths
+
+
+def _reference(as_paths: list[tuple[list[int], str]]) -> NextHops:
+    """{asn: {prefix: set of (next_asn, prepending)}} as the dicts used to be"""
+
+    next_hops: NextHops = defaultdict(lambda: defaultdict(set))
+    for as_path, prefix in as_paths:
+        prepending = len(set(as_path)) != len(as_path)
+        for asn, next_asn in pairwise(as_path):
+            next_hops[asn][prefix].add((next_asn, prepending))
+    return next_hops
+
+
+def _to_dict(store: NextHopStore) -> NextHops:
+    prefixes = store.prefixes
+    next_hops: NextHops = defaultdict(dict)
+    for group in store.groups.tolist():
+        next_hops[group >> 32][prefixes[group & 0xFFFFFFFF]] = set()
+    for group, hop in store.records.tolist():
+        next_hops[group >> 32][prefixes[group & 0xFFFFFFFF]].add(
+            (hop >> 1, bool(hop & 1))
+        )
+    return next_hops
+
+
+@pytest.mark.parametrize("pending_size", [1, 50, 10**6])
+def test_matches_dict_reference(
+    monkeypatch: pytest.MonkeyPatch, pending_size: int
+) -> None:
+    # Small pending sizes merge many batches into the records
+    monkeypatch.setattr(next_hop_store, "PENDING_SIZE", pending_size)
+    as_paths = _as_paths(2000)
+    store = NextHopStore()
+    for i in range(0, len(as_paths), 100):
+        batch = as_paths[i : i + 100]
+        store.add_as_paths([x for x, _ in batch], [x for _, x in batch])
+
+    expected = _reference(as_paths)
+    assert _to_dict(store) == expected
+    assert len(store) == len(expected)
+    records = store.records
+    assert np.all(np.diff(records["group"].astype(np.int64)) >= 0)
+    assert len(np.unique(records)) == len(records)
+
+
+def test_asn_slices() -> None:
+    as_paths = _as_paths(500)
+    store = NextHopStore()
+    store.add_as_paths([x for x, _ in as_paths], [x for _, x in as_paths])
+    expected = _reference(as_paths)
+
+    records = store.records
+    asns, starts, ends = asn_slices(records["group"])
+    assert asns == sorted(expected)
+    for asn, start, end in zip(asns, starts, ends, strict=True):
+        assert set((records["group"][start:end] >> np.uint64(32)).tolist()) == {asn}
+        assert end - start == sum(len(x) for x in expected[asn].values())
+
+
+def test_filter_keeps_emptied_groups() -> None:
+    as_paths = _as_paths(500)
+    store = NextHopStore()
+    store.add_as_paths([x for x, _ in as_paths], [x for _, x in as_paths])
+    expected = _reference(as_paths)
+
+    # Only the odd next hops of asns 1 to 9
+    mask = (store.records["hop"] >> np.uint64(1)) % np.uint64(2) == 1
+    filtered = store.filter(mask, range(1, 10))
+    assert _to_dict(filtered) == {
+        asn: {
+            prefix: {x for x in hops if x[0] % 2 == 1}
+            for prefix, hops in expected[asn].items()
+        }
+        for asn in range(1, 10)
+        if asn in expected
+    }
+    assert len(filtered) == len([x for x in range(1, 10) if x in expected])
+
+
+def test_short_as_paths_are_ignored() -> None:
+    store = NextHopStore()
+    store.add_as_paths([[3356], []], ["1.2.0.0/16", "1.3.0.0/16"])
+    assert len(store) == 0
+    assert len(store.records) == 0
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+
+from mrt_collector.mrt_decoder import PSV_COLUMNS
+from mrt_collector.parquet_io import (
+    iter_psv_batches,
+    psv_to_parquet,
+    read_parquet,
+)
+
+pa = pytest.importorskip("pyarrow")
+
+
+def _write_psv(path: Path, rows: list[dict[str, str]]) -> None:
+    """Writes rows (missing columns are empty) as a parsed PSV"""
+
+    lines = ["|".join(PSV_COLUMNS)]
+    lines.extend("|".join(row.get(x, "") for x in PSV_COLUMNS) for row in rows)
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_psv_to_parquet_fixed_types(tmp_path: Path) -> None:
+    """Numeric looking strings and empty columns keep their PSV types"""
+
+    psv_path = tmp_path / "rib.psv"
+    _write_psv(
+        psv_path,
+        [
+            {
+                "type": "A",
+                "timestamp": "1700000000.0",
+                "peer_asn": "3356",
+                "prefix": "1.2.0.0/16",
+                "as_path": "3356 13335",
+                "origin_asns": "13335",
+                "atomic": "false",
+            },
+            {
+                "type": "A",
+                "timestamp": "1700000000.0",
+                "peer_asn": "174",
+                "prefix": "2001:db8::/32",
+                "as_path": "174 {64512,64513}",
+                "origin_asns": "64512 64513",
+                "atomic": "true",
+                "aggr_asn": "174",
+                "aggr_ip": "10.0.0.1",
+            },
+        ],
+    )
+    parquet_path = tmp_path / "rib.parquet"
+    psv_to_parquet(psv_path, parquet_path)
+
+    table = read_parquet([parquet_path])
+    assert table.schema.field("origin_asns").type == pa.string()
+    assert table.schema.field("aggr_ip").type == pa.string()
+    assert table.schema.field("peer_asn").type == pa.uint32()
+    assert table.column("origin_asns").to_pylist() == ["13335", "64512 64513"]
+    assert table.column("aggr_ip").to_pylist() == [None, "10.0.0.1"]
+    assert table.column("aggr_asn").to_pylist() == [None, 174]
+    assert table.column("atomic").to_pylist() == [False, True]
+
+
+def test_psv_to_parquet_without_rows(tmp_path: Path) -> None:
+    psv_path = tmp_path / "rib.psv"
+    _write_psv(psv_path, [])
+    parquet_path = tmp_path / "rib.parquet"
+    psv_to_parquet(psv_path, parquet_path)
+
+    table = read_parquet([parquet_path])
+    assert table.num_rows == 0
+    assert table.schema.field("prefix").type == pa.string()
+
+
+def test_iter_psv_batches_byte_range(tmp_path: Path) -> None:
+    psv_path = tmp_path / "rib.psv"
+    _write_psv(
+        psv_path,
+        [
+            {"type": "A", "prefix": f"10.{i}.0.0/16", "peer_asn": str(i)}
+            for i in range(4)
+        ],
+    )
+    with psv_path.open("rb") as f:
+        f.readline()
+        f.readline()
+        start = f.tell()
+    end = psv_path.stat().st_size
+
+    batches = list(iter_psv_batches(psv_path, ("prefix", "peer_asn"), start, end))
+    table = pa.Table.from_batches(batches)
+    assert table.column("prefix").to_pylist() == [
+        "10.1.0.0/16",
+        "10.2.0.0/16",
+        "10.3.0.0/16",
+    ]
+    assert table.column("peer_asn").to_pylist() == [1, 2, 3]
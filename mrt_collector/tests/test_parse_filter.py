@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+from mrt_collector.mrt_decoder import PSV_COLUMNS
+from mrt_collector.parse_filter import ParseFilter
+
+
+def _row(**columns: str) -> list[str]:
+    return [columns.get(x, "") for x in PSV_COLUMNS]
+
+
+ROWS: tuple[list[str], ...] = (
+    _row(
+        prefix="1.2.0.0/16", peer_asn="3356", as_path="3356 64512", origin_asns="64512"
+    ),
+    _row(
+        prefix="2001:db8::/32",
+        peer_asn="174",
+        as_path="174 {64513,64514}",
+        origin_asns="{64513,64514}",
+        atomic="true",
+    ),
+    _row(
+        prefix="10.0.0.0/8",
+        peer_asn="174",
+        as_path="174 (65000 65001) 13335",
+        origin_asns="13335",
+        aggr_asn="13335",
+    ),
+)
+
+
+def _kept(parse_filter: ParseFilter) -> list[str]:
+    return [x[PSV_COLUMNS.index("prefix")] for x in ROWS if parse_filter.matches(x)]
+
+
+@pytest.mark.parametrize(
+    ("parse_filter", "prefixes"),
+    [
+        (ParseFilter(), ["1.2.0.0/16", "2001:db8::/32", "10.0.0.0/8"]),
+        (ParseFilter(ip_version=4), ["1.2.0.0/16", "10.0.0.0/8"]),
+        (ParseFilter(ip_version=6), ["2001:db8::/32"]),
+        (ParseFilter(atomic_or_aggregator=True), ["2001:db8::/32", "10.0.0.0/8"]),
+        (ParseFilter(prefixes=frozenset({"10.0.0.0/8"})), ["10.0.0.0/8"]),
+        (ParseFilter(peer_asns=frozenset({174})), ["2001:db8::/32", "10.0.0.0/8"]),
+        # ASNs inside of AS sets and confederations count
+        (ParseFilter(origin_asns=frozenset({64514})), ["2001:db8::/32"]),
+        (ParseFilter(path_asns=frozenset({65001})), ["10.0.0.0/8"]),
+        (ParseFilter(path_asns=frozenset({3356, 13335})), ["1.2.0.0/16", "10.0.0.0/8"]),
+        # Predicates are combined
+        (ParseFilter(ip_version=4, peer_asns=frozenset({174})), ["10.0.0.0/8"]),
+        (ParseFilter(ip_version=6, peer_asns=frozenset({3356})), []),
+    ],
+)
+def test_matches(parse_filter: ParseFilter, prefixes: list[str]) -> None:
+    assert _kept(parse_filter) == prefixes
+
+
+def test_write_projects_kept_rows() -> None:
+    parse_filter = ParseFilter(columns=("prefix", "as_path"), ip_version=4)
+    f = io.StringIO()
+    full_f = io.StringIO()
+    assert parse_filter.write(ROWS, f, full_f) == 2
+    assert f.getvalue() == (
+        "prefix|as_path\n1.2.0.0/16|3356 64512\n10.0.0.0/8|174 (65000 65001) 13335\n"
+    )
+    assert full_f.getvalue().splitlines() == [
+        "|".join(PSV_COLUMNS),
+        *["|".join(x) for x in ROWS],
+    ]
+
+
+def test_default_filter_keeps_rows_as_is() -> None:
+    f = io.StringIO()
+    assert ParseFilter().write(ROWS, f) == 3
+    assert f.getvalue().splitlines()[1:] == ["|".join(x) for x in ROWS]
+
+
+def test_unknown_columns() -> None:
+    with pytest.raises(AssertionError, match="Unknown columns"):
+        ParseFilter(columns=("prefix", "nexthop"))
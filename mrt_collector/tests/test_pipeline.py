@@ -0,0 +1,189 @@
+import time
+from dataclasses import replace
+from itertools import combinations
+from pathlib import Path
+
+import pytest
+
+from mrt_collector.memory_governor import MemoryGovernor
+from mrt_collector.mrt_file import MRTFile
+from mrt_collector.pipeline import Pipeline, PipelineStage
+from mrt_collector.rate_limiter import HostRateLimiter
+from mrt_collector.sources import RouteViews
+
+
+def fake_download(mrt_file: MRTFile) -> int:
+    mrt_file.raw_path.write_text(mrt_file.url)
+    return 200
+
+
+def fake_parse(mrt_file: MRTFile) -> None:
+    # Parses of route-views3 fail
+    if "route-views3" not in mrt_file.url:
+        mrt_file.parsed_path_psv.write_text(mrt_file.raw_path.read_text())
+
+
+def timed_parse(mrt_file: MRTFile) -> None:
+    """Records when it ran, as start and end times in the parsed file"""
+
+    start = time.time()
+    time.sleep(0.2)
+    mrt_file.parsed_path_psv.write_text(f"{start} {time.time()}")
+
+
+def _mrt_files(tmp_path: Path) -> tuple[MRTFile, ...]:
+    return tuple(
+        [
+            MRTFile(
+                f"http://archive.routeviews.org/route-views{i}/bgpdata/2024.01/RIBS/"
+                "rib.20240101.0000.bz2",
+                RouteViews(),
+                raw_dir=tmp_path,
+                parsed_dir=tmp_path,
+                parsed_line_count_dir=tmp_path,
+            )
+            for i in range(6)
+        ]
+    )
+
+
+def _stages() -> tuple[PipelineStage, ...]:
+    return (
+        PipelineStage(
+            desc="Downloading",
+            func=fake_download,
+            workers=2,
+            done=lambda x: x.raw_path.exists(),
+            priority=lambda x: len(x.url),
+            rate_limited=True,
+            connections=lambda x: 2,
+        ),
+        PipelineStage(
+            desc="Parsing",
+            func=fake_parse,
+            workers=3,
+            done=lambda x: x.parsed_path_psv.exists(),
+        ),
+    )
+
+
+def test_pipeline_runs_every_stage(tmp_path: Path) -> None:
+    mrt_files = _mrt_files(tmp_path)
+    # Already downloaded, so only parsed
+    mrt_files[1].raw_path.write_text(mrt_files[1].url)
+    rate_limiter = HostRateLimiter(capacity=100, max_connections=4)
+    memory_governor = MemoryGovernor(tmp_path / "memory.db")
+
+    completed = Pipeline(_stages(), rate_limiter, memory_governor).run(mrt_files)
+
+    # Failed files are dropped, and the rest keep their order
+    assert completed == tuple([x for i, x in enumerate(mrt_files) if i != 3])
+    for mrt_file in completed:
+        assert mrt_file.parsed_path_psv.read_text() == mrt_file.url
+    # Every connection was closed and every reservation released
+    assert rate_limiter._open_connections == {"archive.routeviews.org": 0}
+    assert not memory_governor._reserved
+    assert memory_governor.estimate("fake_parse", mrt_files[0].url) > 0
+
+
+def test_pipeline_skips_done_files(tmp_path: Path) -> None:
+    mrt_files = _mrt_files(tmp_path)[:3]
+    for mrt_file in mrt_files:
+        fake_download(mrt_file)
+        fake_parse(mrt_file)
+    rate_limiter = HostRateLimiter(capacity=100)
+
+    assert Pipeline(_stages(), rate_limiter).run(mrt_files) == mrt_files
+    assert not rate_limiter._open_connections
+
+
+def test_multi_worker_tasks_take_up_workers(tmp_path: Path) -> None:
+    """Tasks that run several processes don't oversubscribe a stage"""
+
+    mrt_files = _mrt_files(tmp_path)
+    stage = PipelineStage(
+        desc="Parsing",
+        func=timed_parse,
+        workers=4,
+        done=lambda x: x.parsed_path_psv.exists(),
+        # A 5 worker task (more than the stage has) still runs alone
+        task_workers=lambda x: 5 if x is mrt_files[0] else 2,
+    )
+
+    assert Pipeline((stage,), HostRateLimiter()).run(mrt_files) == mrt_files
+    times = [
+        tuple(map(float, x.parsed_path_psv.read_text().split())) for x in mrt_files
+    ]
+    overlapping = [
+        (i, j)
+        for (i, (a_start, a_end)), (j, (b_start, b_end)) in combinations(
+            enumerate(times), 2
+        )
+        if a_start < b_end and b_start < a_end
+    ]
+    # Only two tasks of 2 workers run at once
+    assert overlapping
+    assert all(0 not in x for x in overlapping)
+    for i, j in overlapping:
+        assert not any(
+            k not in (i, j) and (i, k) in overlapping and (j, k) in overlapping
+            for k in range(len(times))
+        )
+
+
+def raising_parse(mrt_file: MRTFile) -> None:
+    if "route-views2" in mrt_file.url:
+        raise ValueError("corrupt dump")
+    fake_parse(mrt_file)
+
+
+def test_pipeline_drops_files_that_raise(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    mrt_files = _mrt_files(tmp_path)
+    download_stage, parse_stage = _stages()
+    stages = (download_stage, replace(parse_stage, func=raising_parse))
+    memory_governor = MemoryGovernor(tmp_path / "memory.db")
+
+    completed = Pipeline(stages, HostRateLimiter(capacity=100), memory_governor).run(
+        mrt_files
+    )
+
+    assert completed == tuple([x for i, x in enumerate(mrt_files) if i not in (2, 3)])
+    assert not memory_governor._reserved
+    assert (
+        f"Parsing failed for {mrt_files[2].url}: ValueError" in capsys.readouterr().out
+    )
+
+
+def failing_stream(mrt_file: MRTFile) -> int:
+    # Streams of route-views1 fail, so they're downloaded instead
+    if "route-views1" not in mrt_file.url:
+        mrt_file.parsed_path_psv.write_text(mrt_file.url)
+    return 200
+
+
+def test_optional_stage_failures_move_on(tmp_path: Path) -> None:
+    mrt_files = _mrt_files(tmp_path)
+    download_stage, parse_stage = _stages()
+    stream_stage = PipelineStage(
+        desc="Streaming",
+        func=failing_stream,
+        workers=2,
+        done=lambda x: x.parsed_path_psv.exists(),
+        rate_limited=True,
+        optional=True,
+    )
+    stages = (
+        stream_stage,
+        replace(
+            download_stage,
+            done=lambda x: x.raw_path.exists() or x.parsed_path_psv.exists(),
+        ),
+        parse_stage,
+    )
+    rate_limiter = HostRateLimiter(capacity=100)
+
+    assert Pipeline(stages, rate_limiter).run(mrt_files) == mrt_files
+    assert [x.raw_path.exists() for x in mrt_files] == [False, True, *[False] * 4]
+    assert rate_limiter._open_connections == {"archive.routeviews.org": 0}
@@ -0,0 +1,103 @@
+import ipaddress
+
+import numpy as np
+import pytest
+
+from mrt_collector import prefix_codec
+from mrt_collector.prefix_codec import (
+    PrefixMap,
+    PrefixSet,
+    decode_prefix,
+    encode_prefix,
+    encode_prefixes,
+)
+
+PREFIXES = (
+    "1.2.0.0/16",
+    "1.2.0.0/24",
+    "10.0.0.0/8",
+    "0.0.0.0/0",
+    "2001:db8::/32",
+    "2001:db8:8000::/33",
+    "::/0",
+    "192.0.2.0/24",
+)
+
+
+def _sort_key(prefix: str) -> tuple[int, int, int]:
+    network = ipaddress.ip_network(prefix)
+    return network.version, int(network.network_address), network.prefixlen
+
+
+@pytest.mark.parametrize("prefix", PREFIXES)
+def test_round_trip(prefix: str) -> None:
+    assert decode_prefix(encode_prefix(prefix)) == prefix
+    # numpy strips trailing null bytes, which decode_prefix pads back
+    (key,) = encode_prefixes([prefix]).tolist()
+    assert decode_prefix(key) == prefix
+
+
+def test_prefix_set_membership_and_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Flushes pending adds every few prefixes
+    monkeypatch.setattr(prefix_codec, "PENDING_SIZE", 3)
+    prefix_set = PrefixSet(PREFIXES + PREFIXES[:3])
+
+    assert len(prefix_set) == len(PREFIXES)
+    assert list(prefix_set) == sorted(PREFIXES, key=_sort_key)
+    for prefix in PREFIXES:
+        assert prefix in prefix_set
+    assert "1.2.0.0/17" not in prefix_set
+    assert "2001:db8::/48" not in prefix_set
+    assert "255.255.255.255/32" not in prefix_set
+
+
+def test_prefix_set_operators() -> None:
+    a = PrefixSet(PREFIXES[:5])
+    b = PrefixSet(PREFIXES[3:])
+    assert set(a & b) == set(PREFIXES[3:5])
+
+    a |= b
+    assert set(a) == set(PREFIXES)
+    assert set(PrefixSet.from_keys(encode_prefixes(PREFIXES * 2))) == set(PREFIXES)
+
+
+def test_prefix_map(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prefix_codec, "PENDING_SIZE", 2)
+    prefix_map = PrefixMap([("atomic", "?"), ("aggr_asn", "i8")])
+    expected: dict[str, set[tuple[bool, int]]] = dict()
+    for i, prefix in enumerate(PREFIXES * 3):
+        values = (i % 2 == 0, i % 4 - 1)
+        prefix_map.add(prefix, *values)
+        expected.setdefault(prefix, set()).add(values)
+
+    other = PrefixMap([("atomic", "?"), ("aggr_asn", "i8")])
+    other.add("198.51.100.0/24", True, 64512)
+    prefix_map.update(other)
+    expected["198.51.100.0/24"] = {(True, 64512)}
+
+    assert len(prefix_map) == len(expected)
+    items = list(prefix_map.items())
+    assert [x for x, _ in items] == sorted(expected, key=_sort_key)
+    for prefix, records in items:
+        values = list(
+            zip(records["atomic"].tolist(), records["aggr_asn"].tolist(), strict=True)
+        )
+        # Distinct and sorted
+        assert values == sorted(expected[prefix])
+
+    atomic = prefix_map.prefix_set(prefix_map.records["atomic"])
+    assert set(atomic) == {x for x, v in expected.items() if any(a for a, _ in v)}
+
+
+def test_prefix_map_add_records() -> None:
+    prefix_map = PrefixMap([("asn", "i8")])
+    records = np.empty(3, dtype=prefix_map.dtype)
+    records["prefix"] = encode_prefixes(["10.0.0.0/8", "1.2.0.0/16", "10.0.0.0/8"])
+    records["asn"] = [2, 1, 2]
+    prefix_map.add_records(records)
+    prefix_map.add("10.0.0.0/8", 1)
+
+    assert [(p, r["asn"].tolist()) for p, r in prefix_map.items()] == [
+        ("1.2.0.0/16", [1]),
+        ("10.0.0.0/8", [1, 2]),
+    ]
@@ -0,0 +1,76 @@
+import io
+import random
+from itertools import pairwise
+from pathlib import Path
+
+import pytest
+
+from mrt_collector.psv_index import PSVIndex, PSVIndexer, psv_index_path
+
+
+def _psv(rows: int, types: bool = True) -> bytes:
+    rng = random.Random(rows)  # noqa: S311
+    lines = ["type|prefix|as_path" if types else "prefix|as_path"]
+    for i in range(rows):
+        # Rows of varying lengths, so offsets can't just be guessed
+        as_path = " ".join(
+            str(rng.randrange(1, 70000)) for _ in range(rng.randrange(1, 9))
+        )
+        row = f"10.{i % 256}.0.0/16|{as_path}"
+        lines.append(f"{'W' if i % 7 == 0 else 'A'}|{row}" if types else row)
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _index(data: bytes, interval: int, write_sizes: tuple[int, ...]) -> PSVIndex:
+    """Writes data through a PSVIndexer in writes of write_sizes (cycled)"""
+
+    f = io.BytesIO()
+    indexer = PSVIndexer(f, interval=interval)
+    i = 0
+    pos = 0
+    while pos < len(data):
+        size = write_sizes[i % len(write_sizes)]
+        indexer.write(data[pos : pos + size])
+        pos += size
+        i += 1
+    assert f.getvalue() == data
+    return indexer.index
+
+
+@pytest.mark.parametrize("write_sizes", [(1,), (7, 1, 64), (4096,), (10**6,)])
+def test_offsets_and_counts(write_sizes: tuple[int, ...]) -> None:
+    data = _psv(1000)
+    index = _index(data, interval=50, write_sizes=write_sizes)
+
+    lines = data.split(b"\n")[1:-1]
+    row_starts = [len(data.split(b"\n")[0]) + 1]
+    for line in lines[:-1]:
+        row_starts.append(row_starts[-1] + len(line) + 1)
+
+    assert index.rows == 1000
+    assert index.size == len(data)
+    assert index.type_counts == {
+        "A": sum(not x.startswith(b"W") for x in lines),
+        "W": sum(x.startswith(b"W") for x in lines),
+    }
+    assert index.offsets[0] == (0, row_starts[0])
+    # Every offset is an exact row boundary, about every interval rows
+    for row, offset in index.offsets:
+        assert row_starts[row] == offset
+    rows = [x[0] for x in index.offsets]
+    assert all(50 <= b - a < 100 for a, b in pairwise(rows))
+    assert rows[-1] >= 1000 - 100
+
+
+def test_without_type_column() -> None:
+    index = _index(_psv(100, types=False), interval=10, write_sizes=(33,))
+    assert index.rows == 100
+    assert index.type_counts == {"A": 0, "W": 0}
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    psv_path = tmp_path / "rib.psv"
+    index = _index(_psv(100), interval=10, write_sizes=(100,))
+    index.save(psv_index_path(psv_path))
+    assert psv_index_path(psv_path).name == "rib.psv.index.json"
+    assert PSVIndex.load(psv_index_path(psv_path)) == index
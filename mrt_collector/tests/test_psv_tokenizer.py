@@ -0,0 +1,73 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from mrt_collector import psv_tokenizer
+from mrt_collector.psv_io import open_psv
+from mrt_collector.psv_tokenizer import iter_psv_fields, read_psv_columns
+
+COLUMNS = ("type", "prefix", "as_path", "atomic")
+
+
+def _write_psv(path: Path, rows: int = 500) -> None:
+    with open_psv(path, "w") as f:
+        f.write("|".join(COLUMNS) + "\n")
+        for i in range(rows):
+            as_path = " ".join(["3356"] * (i % 50 + 1))
+            f.write(f"A|10.{i % 256}.0.0/16|{as_path}|{'true' if i % 3 else 'false'}\n")
+
+
+def _dict_reader_fields(path: Path, columns: tuple[str, ...]) -> list[tuple[str, ...]]:
+    with open_psv(path) as f:
+        return [
+            tuple(row[x] for x in columns) for row in csv.DictReader(f, delimiter="|")
+        ]
+
+
+@pytest.mark.parametrize("suffix", [".psv", ".psv.gz", ".psv.zst"])
+def test_fields_match_dict_reader(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, suffix: str
+) -> None:
+    if suffix == ".psv.zst":
+        pytest.importorskip("zstandard")
+    # Small blocks, so rows span blocks
+    monkeypatch.setattr(psv_tokenizer, "BLOCK_SIZE", 100)
+    path = tmp_path / f"rib{suffix}"
+    _write_psv(path)
+
+    assert read_psv_columns(path) == COLUMNS
+    for columns in (("prefix",), ("atomic", "type"), COLUMNS):
+        assert list(iter_psv_fields(path, columns)) == _dict_reader_fields(
+            path, columns
+        )
+
+
+def test_undecoded_fields(tmp_path: Path) -> None:
+    path = tmp_path / "rib.psv"
+    _write_psv(path, rows=3)
+    assert list(iter_psv_fields(path, ("atomic",), decode=False)) == [
+        (b"false",),
+        (b"true",),
+        (b"true",),
+    ]
+
+
+def test_byte_range(tmp_path: Path) -> None:
+    path = tmp_path / "rib.psv"
+    _write_psv(path, rows=4)
+    with path.open("rb") as f:
+        lines = f.readlines()
+    start = len(lines[0]) + len(lines[1])
+    end = start + len(lines[2]) + len(lines[3])
+
+    assert list(iter_psv_fields(path, ("prefix",), start, end)) == [
+        ("10.1.0.0/16",),
+        ("10.2.0.0/16",),
+    ]
+
+
+def test_without_rows(tmp_path: Path) -> None:
+    path = tmp_path / "rib.psv"
+    _write_psv(path, rows=0)
+    assert list(iter_psv_fields(path, ("prefix",))) == []
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from mrt_collector import rate_limiter
+from mrt_collector.rate_limiter import HostRateLimiter, TokenBucket
+
+URL = "http://archive.routeviews.org/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2"
+OTHER_URL = "https://data.ris.ripe.net/rrc00/2024.01/bview.20240101.0000.gz"
+
+
+class Clock:
+    """A monotonic clock that only moves when told to"""
+
+    def __init__(self) -> None:
+        # Ahead of the real clock, which new buckets are timestamped with
+        self.now: float = time.monotonic() + 60 * 60
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_refill() -> None:
+    bucket = TokenBucket(rate=2, capacity=3, tokens=0, last_refill=10)
+    bucket.refill(10.5)
+    assert bucket.tokens == 1
+    # Never more than the capacity
+    bucket.refill(100)
+    assert bucket.tokens == 3
+    assert bucket.last_refill == 100
+
+
+def test_try_acquire_waits_per_host(clock: Clock) -> None:
+    limiter = HostRateLimiter(rate=1 / 5)
+    assert limiter.try_acquire(URL) == 0
+    assert limiter.try_acquire(URL) == pytest.approx(5)
+    # Other hosts have their own bucket
+    assert limiter.try_acquire(OTHER_URL) == 0
+
+    clock.now += 2
+    assert limiter.try_acquire(URL) == pytest.approx(3)
+    clock.now += 3
+    assert limiter.try_acquire(URL) == 0
+
+
+def test_aimd(clock: Clock) -> None:
+    limiter = HostRateLimiter(
+        rate=1 / 5,
+        max_rate=1 / 3,
+        min_rate=1 / 60,
+        additive_increase=1 / 100,
+        multiplicative_decrease=0.5,
+    )
+    limiter.record(URL, 200)
+    assert limiter.rate(URL) == pytest.approx(1 / 5 + 1 / 100)
+    for _ in range(100):
+        limiter.record(URL, 200)
+    assert limiter.rate(URL) == pytest.approx(1 / 3)
+
+    # Throttling halves the rate and drains the bucket
+    limiter.record(URL, 429)
+    assert limiter.rate(URL) == pytest.approx(1 / 6)
+    assert limiter.try_acquire(URL) == pytest.approx(6)
+    for _ in range(10):
+        limiter.record(URL, 503)
+    assert limiter.rate(URL) == pytest.approx(1 / 60)
+
+    # Errors other than throttling, and no response at all, change nothing
+    limiter.record(URL, 404)
+    limiter.record(URL, 0)
+    assert limiter.rate(URL) == pytest.approx(1 / 60)
+    assert limiter.rate(OTHER_URL) == pytest.approx(1 / 5)
+
+
+def test_reserve_goes_into_debt(clock: Clock) -> None:
+    limiter = HostRateLimiter(rate=1, max_rate=1)
+    limiter.reserve(URL, 3)
+    assert limiter.try_acquire(URL) == pytest.approx(3)
+    clock.now += 3
+    assert limiter.try_acquire(URL) == 0
+
+
+def test_try_start_connection_accounting(clock: Clock) -> None:
+    limiter = HostRateLimiter(rate=1, max_rate=1, capacity=10, max_connections=4)
+    # A token per connection
+    assert limiter.try_start(URL, connections=3) == 0
+    assert [limiter.try_acquire(URL) == 0 for _ in range(8)] == [True] * 7 + [False]
+
+    # At max_connections, until the running task disconnects
+    clock.now += 10
+    assert limiter.try_start(URL, connections=2) is None
+    assert limiter.try_start(OTHER_URL, connections=2) == 0
+    assert limiter.try_start(URL) == 0
+    assert limiter.try_start(URL) is None
+    limiter.disconnect(URL, 3)
+    assert limiter.try_start(URL, connections=2) == 0
+    limiter.disconnect(URL, 2)
+    limiter.disconnect(URL)
+
+    # Tasks with more connections than allowed still run on their own
+    assert limiter.try_start(URL, connections=6) == 0
+    assert limiter.try_start(URL) is None
+    limiter.disconnect(URL, 6)
+
+
+def test_try_start_without_token_opens_nothing(clock: Clock) -> None:
+    limiter = HostRateLimiter(rate=1 / 5, max_connections=1)
+    assert limiter.try_start(URL) == 0
+    limiter.disconnect(URL)
+    # No token, so the connection isn't kept open
+    assert limiter.try_start(URL) == pytest.approx(5)
+    assert limiter.try_connect(URL)
@@ -0,0 +1,101 @@
+import http.server
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from mrt_collector.sources import RouteViews
+
+
+class ListingServer(http.server.ThreadingHTTPServer):
+    """Serves directory listings, whose sizes change with every request"""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), ListingHandler)
+        self.requests: list[str] = list()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class ListingHandler(http.server.BaseHTTPRequestHandler):
+    server: ListingServer
+
+    def do_GET(self) -> None:
+        self.server.requests.append(self.path)
+        size = 1000 * len(self.server.requests)
+        body = (
+            "<html><body><pre>"
+            f'<a href="rib.20240101.0000.bz2">rib.20240101.0000.bz2</a>'
+            f"  01-Jan-2024 00:20  {size}\n"
+            "</pre></body></html>"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[ListingServer]:
+    server = ListingServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_listing_size() -> None:
+    source = RouteViews()
+    assert source._parse_listing_size("102760448") == (102760448, 0)
+    assert source._parse_listing_size("98M") == (98 * 2**20, 2**20)
+    assert source._parse_listing_size("1.6G") == (int(1.6 * 2**30), 2**30 // 10)
+
+
+def test_listing_stale() -> None:
+    source = RouteViews()
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(seconds=source.LISTING_TTL + 1)
+    month_url = now.strftime("http://example.com/bgpdata/%Y.%m/RIBS/")
+
+    assert not source._listing_stale(month_url, now)
+    assert source._listing_stale(month_url, old)
+    # Cached long after the month ended, so it's final
+    cached_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert not source._listing_stale("http://example.com/2024.01/RIBS/", cached_at)
+    # Cached while the month's dumps were still being added
+    cached_at = datetime(2024, 1, 15, tzinfo=timezone.utc)
+    assert source._listing_stale("http://example.com/2024.01/RIBS/", cached_at)
+
+
+def test_listing_sizes_refresh(server: ListingServer, tmp_path: Path) -> None:
+    source = RouteViews()
+    cache_path = tmp_path / "requests_cache.db"
+    month = datetime.now(timezone.utc).strftime("%Y.%m")
+    url = f"{server.url}/bgpdata/{month}/RIBS/rib.20240101.0000.bz2"
+
+    sizes = source._get_listing_ec_file_sizes((url,), cache_path)
+    assert sizes == {url: (1000, 0)}
+    # Fresh listings are reused
+    assert source._get_listing_ec_file_sizes((url,), cache_path) == sizes
+    assert len(server.requests) == 1
+
+    # Stale listings of the current month are fetched again
+    source.LISTING_TTL = 0
+    sizes = source._get_listing_ec_file_sizes((url,), cache_path)
+    assert sizes == {url: (2000, 0)}
+    assert len(server.requests) == 2
+
+    # Listings of months that are long over never change
+    old_url = f"{server.url}/bgpdata/2024.01/RIBS/rib.20240101.0000.bz2"
+    assert source._get_listing_ec_file_sizes((old_url,), cache_path)
+    assert source._get_listing_ec_file_sizes((old_url,), cache_path)
+    assert len(server.requests) == 3